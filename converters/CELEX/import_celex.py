@@ -8,7 +8,7 @@ import sys
 from derinet import Lexicon
 from derinet.utils import DerinetMorphError
 from useg import SegLex
-from useg.infer_bounds import infer_bounds
+from useg.infer_bounds import AlignmentCache, infer_bounds_many
 
 logging.basicConfig(level=logging.DEBUG,
                     format='%(asctime)s %(levelname)-8s %(message)s',
@@ -22,6 +22,9 @@ def parse_args():
         formatter_class=argparse.ArgumentDefaultsHelpFormatter
     )
     parser.add_argument("--lang", required=True, choices=("deu", "eng", "nld"), help="The language code of the resource to convert.")
+    parser.add_argument("--alignment-cache", help="A file to keep the inferred morph boundaries in between runs, to avoid recomputing them.")
+    parser.add_argument("--workers", type=int, default=1, help="The number of processes to infer morph boundaries in.")
+    parser.add_argument("--ambiguity-margin", type=float, help="Warn about mappings whose second best alternative costs at most this much more than the best one.")
     return parser.parse_args()
 
 hier_extract_regex = re.compile("\((.*)\)\[([^][]*)\]")
@@ -116,6 +119,7 @@ def hier_to_morphemes(s):
 
 def main(args):
     seg_lex = SegLex()
+    cache = AlignmentCache(path=args.alignment_cache)
 
     lexicon = Lexicon()
     lexicon.load(sys.stdin)
@@ -124,6 +128,11 @@ def main(args):
                   "eng": "eCELEX",
                   "nld": "dCELEX"}[args.lang]
 
+    # The lexemes whose morph boundaries are to be inferred, with their
+    #  morphemes, and the corresponding (morphs, lemma) pairs to align.
+    to_align = []
+    pairs = []
+
     for lexeme in lexicon.iter_lexemes():
         feats = dict(lexeme.misc, **lexeme.feats)
         if "segmentation" in feats:
@@ -184,7 +193,24 @@ def main(args):
                     flat_morphemes.append({"type": "suffix", "morpheme": "er"})
                     hier_morphemes.append(["er"])
 
-        bounds, cost = infer_bounds([m["morph"] if "morph" in m else m["morpheme"] for m in flat_morphemes], lemma)
+        to_align.append((lexeme, lex_id, lemma, flat_morphemes))
+        pairs.append(([m["morph"] if "morph" in m else m["morpheme"] for m in flat_morphemes], lemma))
+
+    # Align all lexemes at once, which can be done in parallel. To look
+    #  for ambiguous mappings, get the two best alignments of each.
+    k = None if args.ambiguity_margin is None else 2
+    results = infer_bounds_many(pairs, workers=args.workers, cache=cache, k=k)
+
+    for (lexeme, lex_id, lemma, flat_morphemes), result in zip(to_align, results):
+        if isinstance(result, Exception):
+            logger.error("Couldn't map {} to {}: {}".format(lexeme.misc["segmentation_hierarch"], lemma, result))
+            continue
+        if k is None:
+            bounds, cost = result
+            alternatives = []
+        else:
+            best, *alternatives = result
+            bounds, cost = best.bounds, best.cost
 
         assert len(bounds) == len(flat_morphemes) + 1
 
@@ -205,7 +231,18 @@ def main(args):
                 logger.error("Missed morpheme nr. {} '{}' in {} segmented as {}".format(i+1, morpheme["morpheme"], lemma, lexeme.misc["segmentation_hierarch"]))
 
         if cost > 0.0:
-            logger.info("Fuzziness {} needed when mapping {} to {} as {}".format(cost, lexeme.misc["segmentation_hierarch"], lemma, " + ".join(seg_lex._simple_seg(lex_id, annot_name))))
+            if k is None:
+                logger.info("Fuzziness {} needed when mapping {} to {} as {}".format(cost, lexeme.misc["segmentation_hierarch"], lemma, " + ".join(seg_lex._simple_seg(lex_id, annot_name))))
+            else:
+                logger.info("Fuzziness {} needed when mapping {} to {} as {}, edits: {}".format(cost, lexeme.misc["segmentation_hierarch"], lemma, " + ".join(seg_lex._simple_seg(lex_id, annot_name)), best.edits))
+
+        # Even exact mappings may have a close second best alternative.
+        if alternatives and alternatives[0].cost - cost <= args.ambiguity_margin:
+            logger.warning("Ambiguous mapping of {} to {}: bounds {} cost {}, bounds {} cost {}".format(lexeme.misc["segmentation_hierarch"], lemma, bounds, cost, alternatives[0].bounds, alternatives[0].cost))
+
+    logger.info("Alignment cache: {} hits, {} misses".format(cache.hits, cache.misses))
+    if args.alignment_cache is not None:
+        cache.save()
 
     seg_lex.save(sys.stdout)
 
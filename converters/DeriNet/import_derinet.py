@@ -38,26 +38,34 @@ upos_tags = {'ADJ',
              'VERB',
              'X'}
 
-def main(args):
-    der_lexicon = Lexicon()
-    der_lexicon.load(sys.stdin, on_err="continue")
-
-    seg_lexicon = SegLex()
-
+def iter_rows(der_lexicon):
+    """
+    Yield rows for `SegLex.add_lexemes_bulk` with the lexemes of
+    `der_lexicon` and their segmentation.
+    """
     for der_lexeme in der_lexicon.iter_lexemes(sort=False):
         if der_lexeme.pos in upos_tags:
             pos = der_lexeme.pos
         else:
             pos = "X"
 
-        seg_lexeme = seg_lexicon.add_lexeme(der_lexeme.lemma, der_lexeme.lemma, pos=pos, features=der_lexeme.feats)
+        morphemes = []
         for morpheme in der_lexeme.segmentation:
             features = {k: v for k, v in morpheme.items() if k not in {"Start", "End", "Type", "Morph"}}
 
             if "Type" in morpheme:
                 features["type"] = morpheme["Type"].lower()
 
-            seg_lexicon.add_contiguous_morpheme(seg_lexeme, args.annot_name, morpheme["Start"], morpheme["End"], features=features)
+            morphemes.append((morpheme["Start"], morpheme["End"], features))
+
+        yield der_lexeme.lemma, der_lexeme.lemma, pos, der_lexeme.feats, morphemes
+
+def main(args):
+    der_lexicon = Lexicon()
+    der_lexicon.load(sys.stdin, on_err="continue")
+
+    seg_lexicon = SegLex()
+    seg_lexicon.add_lexemes_bulk(iter_rows(der_lexicon), args.annot_name)
 
     seg_lexicon.save(sys.stdout)
 
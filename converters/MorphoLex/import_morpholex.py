@@ -12,7 +12,7 @@ import re
 import sys
 
 from useg import SegLex
-from useg.infer_bounds import infer_bounds
+from useg.infer_bounds import AlignmentCache, infer_bounds_many
 
 def parse_args():
     parser = argparse.ArgumentParser(
@@ -22,6 +22,8 @@ def parse_args():
     parser.add_argument("morpholex", type=argparse.FileType("rb"), help="The name to use for storing the segmentation annotation.")
     parser.add_argument("--annot-name", required=True, help="The name to use for storing the segmentation annotation.")
     parser.add_argument("--allomorphs", required=True, type=argparse.FileType("rt", encoding="utf-8", errors="strict"), help="A file to load allomorphy information from.")
+    parser.add_argument("--alignment-cache", help="A file to keep the inferred morph boundaries in between runs, to avoid recomputing them.")
+    parser.add_argument("--workers", type=int, default=1, help="The number of processes to infer morph boundaries in.")
     return parser.parse_args()
 
 def parse_segmentation_eng(s):
@@ -276,8 +278,8 @@ def convert_pos_eng(poses):
 
     return "X"
 
-def record_morphemes(seg_lex, lex_id, annot_name, form, morphemes):
-    # First, generate all allomorph combinations to map.
+def gen_parses(morphemes):
+    # Generate all allomorph combinations to map.
     # Generate the initial state.
     parses = []
     morphs, t = morphemes[0]
@@ -295,15 +297,26 @@ def record_morphemes(seg_lex, lex_id, annot_name, form, morphemes):
 
         parses = next_parses
 
-    # Map each combination to the form and select the best one.
+    return parses
+
+def record_morphemes(seg_lex, lex_id, annot_name, form, morphemes, mappings):
+    # Select the best of the mappings of all allomorph combinations,
+    #  as generated by gen_parses().
     best_cost = float("inf")
     best_mapping = None
-    for parse in parses:
-        mapping, cost = infer_bounds(parse, form)
+    for result in mappings:
+        if isinstance(result, Exception):
+            print("Couldn't map a parse of {}: {}".format(form, result), file=sys.stderr)
+            continue
+        mapping, cost = result
         if cost < best_cost:
             best_cost = cost
             best_mapping = mapping
 
+    if best_mapping is None:
+        print("No parse of {} could be mapped".format(form), file=sys.stderr)
+        return
+
     if best_mapping[0] != 0:
         print("Ignored prefix '{}' of {}".format(form[:best_mapping[0]], form), file=sys.stderr)
     if best_mapping[-1] != len(form):
@@ -323,6 +336,12 @@ def record_morphemes(seg_lex, lex_id, annot_name, form, morphemes):
 def main(args):
     lexicon = SegLex()
     allomorphs = load_allomorphs(args.allomorphs)
+    cache = AlignmentCache(path=args.alignment_cache)
+
+    # The lexemes to record the morphemes of once all their allomorph
+    #  combinations are mapped, and the (parse, form) pairs to map.
+    to_align = []
+    pairs = []
 
     sheets = pd.read_excel(args.morpholex, sheet_name=None, header=0, dtype=str, engine="openpyxl", na_filter=False)
     for sheet_name, sheet in sheets.items():
@@ -395,7 +414,9 @@ def main(args):
                 if lang == "eng":
                     morphemes = add_endings_eng(lform, joined_segmentation, morphemes)
 
-                record_morphemes(lexicon, lex_id, args.annot_name, lform, morphemes)
+                parses = gen_parses(morphemes)
+                to_align.append((lex_id, lform, morphemes, len(pairs), len(pairs) + len(parses)))
+                pairs.extend((parse, lform) for parse in parses)
 
                 # If NN, then it may end in plural "s" or "es".
                 # If VB, it may end in 3rd person present singular "s" or "es".
@@ -445,6 +466,16 @@ def main(args):
                 # intermediaries (18 in 1-2-1) and following
                 #  and several others in that sheet
 
+    # Map the parses of all lexemes at once, which can be done in
+    #  parallel.
+    results = infer_bounds_many(pairs, workers=args.workers, cache=cache)
+    for lex_id, lform, morphemes, start, end in to_align:
+        record_morphemes(lexicon, lex_id, args.annot_name, lform, morphemes, results[start:end])
+
+    print("Alignment cache: {} hits, {} misses".format(cache.hits, cache.misses), file=sys.stderr)
+    if args.alignment_cache is not None:
+        cache.save()
+
     lexicon.save(sys.stdout)
 
 if __name__ == "__main__":
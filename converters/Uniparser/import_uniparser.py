@@ -19,6 +19,7 @@ def parse_args():
     parser.add_argument("--annot-name", required=True, help="The name to use for storing the segmentation annotation.")
     parser.add_argument("--affixes", type=argparse.FileType("rt", encoding="utf-8", errors="strict"), help="A file to load allowed affixes from; all other morphemes will be considered to be stems.")
     parser.add_argument("--multi-stem-infixation", action="store_true", help="When encountering multiple STEM morphemes, consider them to be a single STEM with infixes instead of a compound.")
+    parser.add_argument("--unsorted", action="store_true", help="Print the lexemes in the order they were read instead of sorting them, which is faster and takes less memory.")
     return parser.parse_args()
 
 gr_upos_table = {
@@ -133,17 +134,18 @@ def parse_infixation(morph, morpheme):
     assert len(morphs) == len(spans) == len(features)
     return morphs, spans, features, i
 
-def main(args):
-    lexicon = SegLex()
-    annot_name = args.annot_name
-
+def iter_rows(lines, args):
+    """
+    Parse the analyses in `lines` and yield rows for
+    `SegLex.add_lexemes_bulk`, one for each analysis.
+    """
     if args.affixes is not None:
         fixup_gloss = True
         affixes = load_affixes(args.affixes)
     else:
         fixup_gloss = False
 
-    for line in sys.stdin:
+    for line in lines:
         line = line.rstrip()
         try:
             w = ET.fromstring(line)
@@ -229,7 +231,7 @@ def main(args):
 
             features["morpho_tags"] = morpho_tags
 
-            lexeme = lexicon.add_lexeme(form, lex, pos=pos, features=features)
+            segmentation = []
 
             end = 0
             # There is some infixation, in which case there are multiple
@@ -254,16 +256,14 @@ def main(args):
                     #  a connector. The dash is not part of the
                     #  segmentation, and should not be (at least in the
                     #  first case). Skip it.
-                    lexicon.add_contiguous_morpheme(
-                        lexeme,
-                        annot_name,
+                    segmentation.append((
                         end,
                         end + 1,
                         # FIXME the type should be different when it is
                         #  at the beginning or end of the word – attachment
                         #  point, maybe?
-                        features={"morpheme": "-", "type": "connector"}
-                    )
+                        {"morpheme": "-", "type": "connector"}
+                    ))
                     start = end + 1
                 else:
                     start = end
@@ -274,12 +274,7 @@ def main(args):
 
                     # Process the non-stem morphemes.
                     for infix_morph, infix_span, infix_feature in zip(infix_morphs[:-1], infix_spans[:-1], infix_features[:-1]):
-                        lexicon.add_morpheme(
-                            lexeme,
-                            annot_name,
-                            [start + i for i in infix_span],
-                            features=infix_feature
-                        )
+                        segmentation.append(([start + i for i in infix_span], infix_feature))
 
                     # Record the stem for processing downstream.
                     seen_stems += 1
@@ -289,12 +284,7 @@ def main(args):
                     else:
                         # Add the stem morpheme now; don't merge it with
                         #  adjacent stems.
-                        lexicon.add_morpheme(
-                            lexeme,
-                            annot_name,
-                            [start + i for i in infix_spans[-1]],
-                            features={"type": "stem"}
-                        )
+                        segmentation.append(([start + i for i in infix_spans[-1]], {"type": "stem"}))
 
                     end = start + length
                     continue
@@ -312,13 +302,7 @@ def main(args):
                     else:
                         # Add the stem morpheme now; don't merge it with
                         #  adjacent stems.
-                        lexicon.add_contiguous_morpheme(
-                            lexeme,
-                            annot_name,
-                            start,
-                            end,
-                            features={"type": "stem"}
-                        )
+                        segmentation.append((start, end, {"type": "stem"}))
 
                     continue
                 elif seen_stems == nr_stems:
@@ -328,22 +312,11 @@ def main(args):
                 else:
                     morpheme_type = "infix"
 
-                lexicon.add_contiguous_morpheme(
-                    lexeme,
-                    annot_name,
-                    start,
-                    end,
-                    features={"morpheme": morpheme, "type": morpheme_type}
-                )
+                segmentation.append((start, end, {"morpheme": morpheme, "type": morpheme_type}))
 
             if stem_morph_span:
                 # Add the (potentially discontiguous) stem morpheme.
-                lexicon.add_morpheme(
-                    lexeme,
-                    annot_name,
-                    stem_morph_span,
-                    features={"type": "stem"}
-                )
+                segmentation.append((stem_morph_span, {"type": "stem"}))
             elif args.multi_stem_infixation:
                 # We were asked to combine multiple stem spans together,
                 #  but the span is empty.
@@ -353,22 +326,25 @@ def main(args):
             if end == len(form) - 1 and form[end] == "-":
                 # The word ends with a dash, which we didn't process before.
                 #  Add it as a connector now.
-                lexicon.add_contiguous_morpheme(
-                    lexeme,
-                    annot_name,
+                segmentation.append((
                     end,
                     end + 1,
                     # FIXME the type should be different when it is
                     #  at the beginning or end of the word – attachment
                     #  point, maybe?
-                    features={"morpheme": "-", "type": "connector"}
-                )
+                    {"morpheme": "-", "type": "connector"}
+                ))
 
                 end += 1
 
             assert end == len(form), "We didn't process the whole word '{}'".format(form)
 
-    lexicon.save(sys.stdout)
+            yield form, lex, pos, features, segmentation
+
+def main(args):
+    lexicon = SegLex()
+    lexicon.add_lexemes_bulk(iter_rows(sys.stdin, args), args.annot_name)
+    lexicon.save(sys.stdout, sort=not args.unsorted)
 
 if __name__ == "__main__":
     main(parse_args())
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+
+"""
+Convert a USeg file into the binary format of `useg.seg_bin` or back.
+The direction is given by the extension of the input file: files ending
+in .usegb are converted to USeg, anything else to the binary format.
+"""
+
+import argparse
+
+from useg import SegLex
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        allow_abbrev=False,
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("input", help="The USeg or binary (.usegb) file to convert")
+    parser.add_argument("output", help="The file to write the result into")
+    parser.add_argument("--unsorted", action="store_true", help="When converting to USeg, write the lexemes in their stored order instead of sorting them")
+    return parser.parse_args()
+
+def main(args):
+    lexicon = SegLex()
+
+    if args.input.endswith(".usegb"):
+        lexicon.load_binary(args.input)
+        lexicon.save(args.output, sort=not args.unsorted)
+    else:
+        lexicon.load(args.input)
+        lexicon.save_binary(args.output)
+
+if __name__ == "__main__":
+    main(parse_args())
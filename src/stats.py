@@ -5,10 +5,14 @@ if __name__ == "__main__":
     multiprocessing.set_start_method('forkserver')
 
 import argparse
+import functools
+import hashlib
+import math
 from os import path
 import sys
 
-from useg import SegLex
+from useg import seg_tsv
+from useg.seg_lex import LexemeMerger, merge_key
 
 def parse_args():
     parser = argparse.ArgumentParser(
@@ -19,14 +23,106 @@ def parse_args():
     parser.add_argument("--printer", choices=("tex", "tsv"), default="tex", help="The format to use for printing")
     parser.add_argument("--only", choices=("both", "left", "right"), default="both", help="Which parts of the table to print")
     parser.add_argument("--threads", type=int, default=1, help="The number of worker threads to run in parallel")
+    parser.add_argument("--approx-types", action="store_true", help="Estimate the numbers of types using HyperLogLog sketches instead of storing all of them, to save memory")
+    parser.add_argument("--approx-error", type=float, default=0.01, help="The relative standard error of the type counts estimated with --approx-types")
     return parser.parse_args()
 
 
+class HyperLogLog(object):
+    """
+    An estimate of the number of distinct strings added to it, which
+    takes a fixed amount of memory regardless of their number. The
+    relative standard error of the estimate is about `error`; the memory
+    needed grows with 1 / error ** 2, e.g. 16 kB for 1 %.
+
+    The strings are hashed deterministically, so the estimates are the
+    same in every run.
+    """
+    __slots__ = ("_precision", "_registers")
+
+    def __init__(self, error=0.01):
+        if not 0.0 < error < 1.0:
+            raise ValueError("The error of the estimate must be between 0 and 1, not {}".format(error))
+
+        # The standard error is 1.04 / sqrt(m) for m registers.
+        precision = max(4, math.ceil(math.log2((1.04 / error) ** 2)))
+        if precision > 24:
+            raise ValueError("The error {} is too small to estimate".format(error))
+
+        self._precision = precision
+        self._registers = bytearray(1 << precision)
+
+    def add(self, string):
+        h = int.from_bytes(hashlib.blake2b(string.encode("utf-8"), digest_size=8).digest(), "little")
+
+        # The first bits of the hash select the register, which records
+        #  the highest position of the first 1 bit in the rest of them.
+        bits = 64 - self._precision
+        index = h >> bits
+        rank = bits - (h & ((1 << bits) - 1)).bit_length() + 1
+        if rank > self._registers[index]:
+            self._registers[index] = rank
+
+    def __len__(self):
+        # The improved estimator of O. Ertl, "New cardinality estimation
+        #  algorithms for HyperLogLog sketches" (2017), which is unbiased
+        #  over the whole range, unlike the raw HyperLogLog estimate with
+        #  linear counting, which overestimates by up to 2 % for 2.5 to 5
+        #  times the number of registers.
+        m = len(self._registers)
+        q = 64 - self._precision
+        counts = [0] * (q + 2)
+        for r in self._registers:
+            counts[r] += 1
+
+        z = m * _tau(1.0 - counts[q + 1] / m)
+        for k in range(q, 0, -1):
+            z = 0.5 * (z + counts[k])
+        z += m * _sigma(counts[0] / m)
+
+        return round(m * m / (2.0 * math.log(2.0) * z))
+
+
+def _sigma(x):
+    if x == 1.0:
+        return math.inf
+    y = 1.0
+    z = x
+    while True:
+        x *= x
+        last_z = z
+        z += x * y
+        y += y
+        if z == last_z:
+            return z
+
+
+def _tau(x):
+    if x == 0.0 or x == 1.0:
+        return 0.0
+    y = 1.0
+    z = 1.0 - x
+    while True:
+        x = math.sqrt(x)
+        last_z = z
+        y *= 0.5
+        z -= (1.0 - x) ** 2 * y
+        if z == last_z:
+            return z / 3.0
+
+
 class TypeTokenStats(object):
     __slots__ = ("_types", "_tokens", "_min", "_max", "_length", "_length_counts")
 
-    def __init__(self):
-        self._types = set()
+    def __init__(self, approx_error=None):
+        """
+        Count the types exactly, or estimate their number with the
+        relative standard error `approx_error` using a HyperLogLog.
+        """
+        if approx_error is None:
+            self._types = set()
+        else:
+            self._types = HyperLogLog(approx_error)
         self._tokens = 0
 
         self._min = float('inf')
@@ -104,12 +200,13 @@ class TypeTokenStats(object):
         return self.count_of_length_ge(min_l) / tokens
 
 
-def morph(form, morpheme):
+def morph(form, span):
     """
-    Return the string form of `morpheme`.
+    Return the string form of the morpheme spanning the indices `span`
+    of `form`.
     """
-    if morpheme.span:
-        span = sorted(morpheme.span)
+    if span:
+        span = sorted(span)
 
         last_idx = span[0]
         morph = form[last_idx]
@@ -127,27 +224,86 @@ def morph(form, morpheme):
         # Empty morpheme spans are weird, but support them anyway.
         return ""
 
-def process_file(filename):
-    seg_lex = SegLex()
+class _Unsorted(Exception):
+    """
+    Raised by `iter_lexeme_records` when told to expect sorted records
+    and finding them not to be.
+    """
+    pass
+
+def iter_lexeme_records(records, assume_sorted=False):
+    """
+    Iterate over SegRecords from `records` and yield them along with a
+    bool saying whether the record starts a new lexeme or is another
+    segmentation of an earlier one, as decided by `SegLex.load`.
+
+    Records of the same lexeme need not be adjacent, so the annotation
+    layers of all lexemes seen are remembered. If `assume_sorted` is
+    True, the records are expected to be sorted by lemma, POS and form,
+    as saved by `SegLex`, and only the lexemes with the current lemma,
+    POS and form are kept; `_Unsorted` is raised if they turn out not to
+    be sorted.
+    """
+    # The lexemes are represented by the sets of their layers.
+    merger = LexemeMerger(lambda layers, annot_name: bool(layers) and annot_name not in layers)
+    last_group = None
+
+    for record in records:
+        if assume_sorted:
+            group = (record.lemma, record.pos, record.form)
+            if group != last_group:
+                if last_group is not None and group < last_group:
+                    raise _Unsorted()
+                merger.clear()
+                last_group = group
+
+        features, annot_name, segmentation = LexemeMerger.split_record(record)
+        key = merge_key(record.form, record.lemma, record.pos, features)
+        layers = merger.target(key, annot_name)
+        is_new_lexeme = layers is None
+        if is_new_lexeme:
+            layers = set()
+            merger.add(key, layers)
+
+        # Empty segmentations don't add the layer.
+        if segmentation:
+            layers.add(annot_name)
+
+        yield record, is_new_lexeme
+
+def process_file(filename, approx_error=None):
+    # Saved files are sorted, which keeps the memory needed for
+    #  grouping the records into lexemes low. Other ones have to be
+    #  read again without that assumption.
     try:
-        seg_lex.load(filename)
+        try:
+            return process_records(filename, seg_tsv.iter_records(filename), assume_sorted=True, approx_error=approx_error)
+        except _Unsorted:
+            return process_records(filename, seg_tsv.iter_records(filename), assume_sorted=False, approx_error=approx_error)
     except Exception as exc:
         print("Cannot load file {}".format(filename), file=sys.stderr)
         raise exc
 
+def process_records(filename, records, assume_sorted=False, approx_error=None):
+    """
+    Compute the statistics of the resource `filename` from its SegRecords
+    `records`, going through them only once and keeping only the counters
+    in memory. If `approx_error` is given, the numbers of types are only
+    estimated with that relative error, see `TypeTokenStats`.
+    """
     lexeme_cnt = 0
     segmented_lexeme_cnt = 0
 
-    form_stats = TypeTokenStats()
-    segmented_form_stats = TypeTokenStats()
-    lemma_stats = TypeTokenStats()
-    pos_stats = TypeTokenStats()
-    morpheme_stats = TypeTokenStats()
-    morph_stats = TypeTokenStats()
-    root_stats = TypeTokenStats()
-    prefix_stats = TypeTokenStats()
-    suffix_stats = TypeTokenStats()
-    annot_stats = TypeTokenStats()
+    form_stats = TypeTokenStats(approx_error)
+    segmented_form_stats = TypeTokenStats(approx_error)
+    lemma_stats = TypeTokenStats(approx_error)
+    pos_stats = TypeTokenStats(approx_error)
+    morpheme_stats = TypeTokenStats(approx_error)
+    morph_stats = TypeTokenStats(approx_error)
+    root_stats = TypeTokenStats(approx_error)
+    prefix_stats = TypeTokenStats(approx_error)
+    suffix_stats = TypeTokenStats(approx_error)
+    annot_stats = TypeTokenStats(approx_error)
 
     morph_stats_types = {"root": root_stats,
                          "prefix": prefix_stats,
@@ -158,45 +314,47 @@ def process_file(filename):
     # Whether the resource contains only lemmas, or inflected forms as well.
     only_lemmas = True
 
-    for lex_id in seg_lex.iter_lexemes():
-        lexeme_cnt += 1
-        form_stats.record(seg_lex.form(lex_id))
-        lemma_stats.record(seg_lex.lemma(lex_id))
-        pos_stats.record(seg_lex.pos(lex_id))
+    for record, is_new_lexeme in iter_lexeme_records(records, assume_sorted):
+        # Each record holds at most one annotation layer of a lexeme; an
+        #  empty segmentation doesn't create the layer.
+        morphemes = record.annot.get("segmentation", [])
 
-        if seg_lex.form(lex_id) != seg_lex.lemma(lex_id):
-            # The resource lists inflected forms in addition to pure lemmas.
-            only_lemmas = False
+        if is_new_lexeme:
+            lexeme_cnt += 1
+            form_stats.record(record.form)
+            lemma_stats.record(record.lemma)
+            pos_stats.record(record.pos)
 
-        is_segmented = False
-
-        for annot_name in seg_lex.annot_names(lex_id):
-            annot_stats.record(annot_name)
-
-            morphemes = seg_lex.morphemes(lex_id, annot_name)
+            if record.form != record.lemma:
+                # The resource lists inflected forms in addition to pure lemmas.
+                only_lemmas = False
 
+            # A lexeme which isn't segmented when it is created never
+            #  gets other segmentations merged into it.
             if morphemes:
-                is_segmented = True
+                segmented_form_stats.record(record.form)
+                segmented_lexeme_cnt += 1
 
-            for morpheme in morphemes:
-                morph_string = morph(seg_lex.form(lex_id), morpheme)
-                morph_stats.record(morph_string)
+        if not morphemes:
+            continue
 
-                if "morpheme" in morpheme.features:
-                    morpheme_stats.record(morpheme.features["morpheme"])
+        annot_stats.record(record.annot["annot_name"])
 
-                if "type" in morpheme.features and isinstance(morpheme.features["type"], str) and morpheme.features["type"] in morph_stats_types:
-                    morph_stats_types[morpheme.features["type"]].record(morph_string)
+        for morpheme in morphemes:
+            morph_string = morph(record.form, morpheme["span"])
+            morph_stats.record(morph_string)
 
-            morph_count = len(morphemes)
-            if morph_count in morph_count_counts:
-                morph_count_counts[morph_count] += 1
-            else:
-                morph_count_counts[morph_count] = 1
+            if "morpheme" in morpheme:
+                morpheme_stats.record(morpheme["morpheme"])
 
-        if is_segmented:
-            segmented_form_stats.record(seg_lex.form(lex_id))
-            segmented_lexeme_cnt += 1
+            if "type" in morpheme and isinstance(morpheme["type"], str) and morpheme["type"] in morph_stats_types:
+                morph_stats_types[morpheme["type"]].record(morph_string)
+
+        morph_count = len(morphemes)
+        if morph_count in morph_count_counts:
+            morph_count_counts[morph_count] += 1
+        else:
+            morph_count_counts[morph_count] = 1
 
     resource_name = filename
     dirname = path.basename(path.dirname(resource_name))
@@ -360,7 +518,8 @@ def main(args):
         prn(*to_print)
 
     with multiprocessing.Pool(args.threads) as pool:
-        for ret in pool.imap(process_file, args.seg_lex, 1):
+        approx_error = args.approx_error if args.approx_types else None
+        for ret in pool.imap(functools.partial(process_file, approx_error=approx_error), args.seg_lex, 1):
             if args.only == "both":
                 prn(*ret)
             elif args.only == "left":
@@ -1,6 +1,17 @@
+from collections import OrderedDict, namedtuple
+import functools
+from itertools import chain
+import multiprocessing
+import os
+import pickle
 import sys
 from unidecode import unidecode
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 l_ctg = {
     "a": "vowel",
     "e": "vowel",
@@ -134,7 +145,7 @@ l_ctg = {
 }
 
 def letter_category(l):
-    return l_ctg.get(l, "other")
+    return default_cost_model.category(l)
 
 def bound_indices(xs):
     """
@@ -162,10 +173,11 @@ def bound_indices(xs):
 #  5. insert or delete a consonant
 #  6. subst consonant for consonant
 #  7. subst consonant for vowel or vice versa
-def subst_cost(sa, ia, sb, ib):
-    ca = sa[ia]
-    cb = sb[ib]
-
+def _subst_cost(ca, cb, info_a, info_b):
+    """
+    Return the cost of substituting character `cb` for `ca`, given the
+    (accent-stripped form, category) tuples of both.
+    """
     if ca == cb:
         # Exact match.
         return 0.0
@@ -174,42 +186,182 @@ def subst_cost(sa, ia, sb, ib):
         # Change of i -> y or vice versa, usually harmless.
         return 0.2
 
-    da = unidecode(ca)
-    db = unidecode(cb)
-
-    if da == db:
+    if info_a[0] == info_b[0]:
         # The characters differ only in accent marks.
         return 0.1
 
-    lca = letter_category(sa[ia])
-    lcb = letter_category(sb[ib])
-
-    if lca == lcb == "vowel":
+    if info_a[1] == info_b[1] == "vowel":
         # Substitution of one vowel for another.
         return 0.5
 
     return 1.5
 
-def insert_cost(s, i):
-    lc = letter_category(s[i])
-    if lc == "punct":
+def _insert_cost(category):
+    if category == "punct":
         return 0.1
-    if lc == "vowel":
+    if category == "vowel":
         return 0.3
 
     return 1.0
 
-def delete_cost(s, i):
-    lc = letter_category(s[i])
-    if lc == "vowel":
+def _delete_cost(category):
+    if category == "vowel":
         return 0.3
 
     return 1.0
 
-def infer_bounds(morphs, form):
+class CostModel:
+    """
+    The costs of substituting, inserting and deleting characters used
+    when aligning morphs with forms. The costs depend on the category
+    of each character (vowel, consonant, punctuation or other) and on
+    its form with accent marks stripped; both are precomputed for the
+    characters of the alphabets known to the model, given by a dict
+    `categories` mapping characters to their categories. Costs of pairs
+    with other characters are computed on demand and kept in an LRU
+    cache of `cache_size` entries.
+    """
+
+    def __init__(self, categories=l_ctg, cache_size=65536):
+        self._chars = {}
+        self._insert = {}
+        self._delete = {}
+        self._cache_size = cache_size
+        self.add_alphabet(categories)
+
+    def add_alphabet(self, categories=None, vowels="", consonants="", punctuation=""):
+        """
+        Add characters to the alphabet of the model, either as a dict
+        `categories` mapping them to "vowel", "cons" or "punct", or as
+        strings of `vowels`, `consonants` and `punctuation`. Already
+        known characters get their category changed.
+        """
+        categories = dict(categories or {})
+        categories.update(dict.fromkeys(vowels, "vowel"))
+        categories.update(dict.fromkeys(consonants, "cons"))
+        categories.update(dict.fromkeys(punctuation, "punct"))
+
+        for char, category in categories.items():
+            self._chars[char] = (unidecode(char), category)
+            self._insert[char] = _insert_cost(category)
+            self._delete[char] = _delete_cost(category)
+
+        # The cached costs may have used the old categories.
+        self._cached_subst = functools.lru_cache(maxsize=self._cache_size)(self._compute_subst)
+
+    def __reduce__(self):
+        # The cache can't be pickled, so the model is created anew from
+        #  its alphabet, e.g. in worker processes.
+        return (CostModel, ({char: info[1] for char, info in self._chars.items()}, self._cache_size))
+
+    def _info(self, char):
+        info = self._chars.get(char)
+        if info is None:
+            info = (unidecode(char), "other")
+        return info
+
+    def _compute_subst(self, ca, cb):
+        return _subst_cost(ca, cb, self._info(ca), self._info(cb))
+
+    def cache_info(self):
+        """
+        Return the statistics of the cache of costs of pairs outside the
+        alphabet, as returned by `functools.lru_cache`.
+        """
+        return self._cached_subst.cache_info()
+
+    def category(self, char):
+        """
+        Return the category of `char`: "vowel", "cons", "punct" or
+        "other".
+        """
+        info = self._chars.get(char)
+        return "other" if info is None else info[1]
+
+    def subst(self, ca, cb):
+        """
+        Return the cost of substituting character `cb` for `ca`.
+        """
+        if ca == cb:
+            return 0.0
+        info_a = self._chars.get(ca)
+        info_b = self._chars.get(cb)
+        if info_a is None or info_b is None:
+            return self._cached_subst(ca, cb)
+        return _subst_cost(ca, cb, info_a, info_b)
+
+    def insert(self, char):
+        """
+        Return the cost of inserting `char` into the form.
+        """
+        return self._insert.get(char, 1.0)
+
+    def delete(self, char):
+        """
+        Return the cost of deleting `char` from the morphs.
+        """
+        return self._delete.get(char, 1.0)
+
+    def subst_costs(self, sa, sb):
+        """
+        Return a NumPy matrix of the costs of substituting each character
+        of the string (or sequence of characters) `sb` for each one of
+        `sa`, indexed by the positions in `sa` and `sb`.
+        """
+        subst = self.subst
+        costs = np.empty((len(sa), len(sb)), dtype=np.float64)
+        for ia, ca in enumerate(sa):
+            costs[ia] = [subst(ca, cb) for cb in sb]
+        return costs
+
+    def insert_costs(self, s):
+        """
+        Return a NumPy array of the costs of inserting each character of
+        `s`.
+        """
+        insert = self._insert
+        return np.array([insert.get(char, 1.0) for char in s], dtype=np.float64)
+
+    def delete_costs(self, s):
+        """
+        Return a NumPy array of the costs of deleting each character of
+        `s`.
+        """
+        delete = self._delete
+        return np.array([delete.get(char, 1.0) for char in s], dtype=np.float64)
+
+# The model used when no other is given. Converters may add their
+#  alphabets to it using `register_alphabet`.
+default_cost_model = CostModel()
+
+def register_alphabet(categories=None, vowels="", consonants="", punctuation=""):
+    """
+    Add an alphabet to the default cost model; see
+    `CostModel.add_alphabet`.
+    """
+    default_cost_model.add_alphabet(categories, vowels, consonants, punctuation)
+
+def subst_cost(sa, ia, sb, ib):
+    return default_cost_model.subst(sa[ia], sb[ib])
+
+def insert_cost(s, i):
+    return default_cost_model.insert(s[i])
+
+def delete_cost(s, i):
+    return default_cost_model.delete(s[i])
+
+def infer_bounds(morphs, form, cost_model=None, band=None):
     """
     Use the list of strings `morphs` to infer boundaries in the string
     `form`. Return a list of boundary indices and the cost of the mapping.
+    The costs of edits are given by `cost_model`, by default
+    `default_cost_model`.
+
+    If `band` is given, only alignments which stray at most `band`
+    characters from the diagonal are searched at first, which is much
+    faster for long words. The band is widened until no alignment
+    outside of it could be cheaper than the one found, so the result
+    is always the same as without it.
     >>> infer_bounds(["pes", "vést"], "psovod")
     [0, 3, 6]
     """
@@ -218,25 +370,87 @@ def infer_bounds(morphs, form):
     for morph in morphs:
         assert morph, "No morph may be empty"
 
-    verbose = False
-
     m_bounds = bound_indices(morphs)
     m_form = "".join(morphs)
 
+    if m_form == form:
+        # The morphs match the form exactly, which is the only way to get
+        #  zero cost.
+        return sorted(m_bounds), 0.0
+
     f_len = len(form)
     m_len = len(m_form)
 
-    # Create the search space.
-    ss = [[None] * (m_len + 1) for i in range(f_len + 1)]
+    if cost_model is None:
+        cost_model = default_cost_model
+    insert_costs = [cost_model.insert(char) for char in form]
+    delete_costs = [cost_model.delete(char) for char in m_form]
+
+    if band is None:
+        bounds, cost = _align(m_form, m_bounds, form, cost_model.subst, insert_costs, delete_costs, -m_len, f_len)
+    else:
+        # The band covers offsets (form position minus morph position)
+        #  from `lo` to `hi`, including the ends of both strings.
+        extra_inserts = max(0, f_len - m_len)
+        extra_deletes = max(0, m_len - f_len)
+        min_insert = min(insert_costs)
+        min_delete = min(delete_costs)
+        while True:
+            lo = -band - extra_deletes
+            hi = band + extra_inserts
+            bounds, cost = _align(m_form, m_bounds, form, cost_model.subst, insert_costs, delete_costs, lo, hi)
+            if lo <= -m_len and hi >= f_len:
+                break
+
+            # Getting outside the band takes at least `hi + 1` inserts or
+            #  `1 - lo` deletes. If that is costlier than the alignment
+            #  found, no cell on its path could have been reached more
+            #  cheaply from outside, so it is the same as without a band.
+            #  The margin guards against rounding in the sums.
+            outside_cost = min((hi + 1) * min_insert, (1 - lo) * min_delete)
+            if cost < outside_cost - 1e-9:
+                break
+
+            # Widen the band enough for the outside to be costlier than
+            #  the alignment found; the next one can only be cheaper.
+            if min_insert <= 0.0 or min_delete <= 0.0:
+                band = max(f_len, m_len)
+            else:
+                band = max(band + 1, int(cost / min_insert) - extra_inserts, int(cost / min_delete) - extra_deletes)
+
+    assert len(bounds) == len(morphs) + 1, "Wrong number of bounds {} when segmenting {} by {}".format(bounds, form, morphs)
+    assert bounds[0] >= 0
+    assert bounds[-1] <= len(form)
+    for i in range(1, len(bounds)):
+        assert bounds[i-1] <= bounds[i], "Bounds {} not strictly ascending when segmenting {} by {}".format(bounds, form, morphs)
+
+    return bounds, cost
+
+def _align(m_form, m_bounds, form, subst, insert_costs, delete_costs, lo, hi):
+    """
+    Find the cheapest alignment of `m_form` with `form` for
+    `infer_bounds`, only considering cells of the search space whose
+    offset, i.e. the position in the form minus the position in
+    `m_form`, is between `lo` and `hi`. Return the bounds of the morphs
+    and the cost.
+    """
+    verbose = False
+
+    f_len = len(form)
+    m_len = len(m_form)
+    missing = {"bounds": None, "cost": float("inf")}
+
+    # Create the search space. Cells outside of the band stay empty.
+    ss = [[missing] * (m_len + 1) for i in range(f_len + 1)]
     ss[0][0] = {"bounds": [0], "cost": 0.0}
 
     # Initialize the first row of the search space.
     # FIXME don't include the 0 boundary when starting out, the 0 may be
     #  mapped to another place in the form.
-    for j in range(m_len):
+    for j in range(min(m_len, -lo)):
         prev = ss[0][j]
 
-        cost = prev["cost"] + delete_cost(m_form, j)
+        cost = prev["cost"] + delete_costs[j]
 
         if j + 1 in m_bounds:
             if verbose:
@@ -256,15 +470,16 @@ def infer_bounds(morphs, form):
     # Process the rest of the search space.
     for i in range(f_len):
         # Process the first column.
-        cost = ss[i][0]["cost"] + insert_cost(form, i)
-        if verbose:
-            print("i{}-{}".format(form[i], cost), file=sys.stderr, end="")
-        ss[i+1][0] = {"bounds": [i+1], "cost": cost}
+        if i + 1 <= hi:
+            cost = ss[i][0]["cost"] + insert_costs[i]
+            if verbose:
+                print("i{}-{}".format(form[i], cost), file=sys.stderr, end="")
+            ss[i+1][0] = {"bounds": [i+1], "cost": cost}
 
-        for j in range(m_len):
-            s_cost = ss[ i ][ j ]["cost"] + subst_cost(m_form, j, form, i)
-            d_cost = ss[i+1][ j ]["cost"] + delete_cost(m_form, j)
-            i_cost = ss[ i ][j+1]["cost"] + insert_cost(form, i)
+        for j in range(max(0, i - hi), min(m_len, i + 1 - lo)):
+            s_cost = ss[ i ][ j ]["cost"] + subst(m_form[j], form[i])
+            d_cost = ss[i+1][ j ]["cost"] + delete_costs[j]
+            i_cost = ss[ i ][j+1]["cost"] + insert_costs[i]
 
             cost = min(s_cost, d_cost, i_cost)
             if cost == s_cost:
@@ -297,11 +512,539 @@ def infer_bounds(morphs, form):
         if verbose:
             print(file=sys.stderr)
 
-    bounds = ss[f_len][m_len]["bounds"]
-    assert len(bounds) == len(morphs) + 1, "Wrong number of bounds {} when segmenting {} by {}".format(bounds, form, morphs)
-    assert bounds[0] >= 0
-    assert bounds[-1] <= len(form)
-    for i in range(1, len(bounds)):
-        assert bounds[i-1] <= bounds[i], "Bounds {} not strictly ascending when segmenting {} by {}".format(bounds, form, morphs)
+    return ss[f_len][m_len]["bounds"], ss[f_len][m_len]["cost"]
+
+Alignment = namedtuple("Alignment", ["bounds", "cost", "edits"])
+Alignment.__doc__ = """
+One of the alignments found by `infer_bounds_top_k`: the boundary
+indices in the form, the total cost and the edits made to each morph.
+"""
+
+def infer_bounds_top_k(morphs, form, k=3, cost_model=None):
+    """
+    Like `infer_bounds`, but return up to `k` best alignments of the
+    list of strings `morphs` with `form` as `Alignment` tuples, sorted
+    by their cost, each with different bounds. The first one is the
+    same as the result of `infer_bounds`.
+
+    All of them are found in a single pass of the search, which keeps
+    the `k` best partial alignments in each cell instead of one. The
+    `edits` of each alignment are a list with an item per morph, which
+    lists the operations needed to turn the morph into its part of the
+    form as (operation, morph character, form character) tuples, with
+    the operation being "subst", "insert" or "delete" and the missing
+    character None. Exact matches are not listed. Characters inserted
+    at a boundary are counted to the following morph, and those at the
+    end of the form to the last one.
+
+    This allows telling apart segmentations which are clearly the best
+    from ambiguous ones, where another one costs about the same.
+    >>> [a.bounds for a in infer_bounds_top_k(["pes", "vést"], "psovod", k=2)]
+    [[0, 2, 6], [0, 2, 5]]
+    """
+    assert morphs, "Morphs must not be empty"
+    assert form,   "Form must not be empty"
+    for morph in morphs:
+        assert morph, "No morph may be empty"
+    if k < 1:
+        raise ValueError("At least one alignment has to be requested, not {}".format(k))
+
+    m_bounds = bound_indices(morphs)
+    m_form = "".join(morphs)
+
+    f_len = len(form)
+    m_len = len(m_form)
+
+    if cost_model is None:
+        cost_model = default_cost_model
+    subst = cost_model.subst
+    insert_costs = [cost_model.insert(char) for char in form]
+    delete_costs = [cost_model.delete(char) for char in m_form]
+
+    # Each cell of the search space holds a list of up to `k` partial
+    #  alignments with different bounds, sorted by their cost. Each of
+    #  them is a (cost, bounds, operation, previous partial alignment)
+    #  tuple, so that the edits can be recovered at the end. Alignments
+    #  which share bounds up to a cell are the same from there on, so
+    #  keeping only the best of them loses none of the `k` best.
+    ss = [[None] * (m_len + 1) for i in range(f_len + 1)]
+    ss[0][0] = [(0.0, (0, ), None, None)]
+
+    # The first row and column have only one alignment each, as in
+    #  `_align`.
+    for j in range(m_len):
+        cost, bounds, op, prev = ss[0][j][0]
+        if j + 1 in m_bounds:
+            bounds = bounds + (0, )
+        ss[0][j+1] = [(cost + delete_costs[j], bounds, _DELETE, ss[0][j][0])]
+
+    for i in range(f_len):
+        ss[i+1][0] = [(ss[i][0][0][0] + insert_costs[i], (i+1, ), _INSERT, ss[i][0][0])]
+
+        for j in range(m_len):
+            at_bound = j + 1 in m_bounds
+            s_cost = subst(m_form[j], form[i])
+            d_cost = delete_costs[j]
+            i_cost = insert_costs[i]
+
+            # List the candidates in the order of preference used by
+            #  `_align`, which the stable sort keeps for equal costs.
+            candidates = []
+            for prev in ss[i][j]:
+                candidates.append((prev[0] + s_cost, prev[1] + (i+1, ) if at_bound else prev[1], _SUBST, prev))
+            for prev in ss[i][j+1]:
+                candidates.append((prev[0] + i_cost, prev[1], _INSERT, prev))
+            for prev in ss[i+1][j]:
+                candidates.append((prev[0] + d_cost, prev[1] + (i+1, ) if at_bound else prev[1], _DELETE, prev))
+            candidates.sort(key=lambda candidate: candidate[0])
+
+            cell = []
+            seen = set()
+            for candidate in candidates:
+                if candidate[1] not in seen:
+                    seen.add(candidate[1])
+                    cell.append(candidate)
+                    if len(cell) == k:
+                        break
+            ss[i+1][j+1] = cell
+
+    # The index of the morph which each character of `m_form` belongs to.
+    morph_indices = [n for n, morph in enumerate(morphs) for char in morph]
+
+    alignments = []
+    for entry in ss[f_len][m_len]:
+        cost, bounds = entry[0], list(entry[1])
+        assert len(bounds) == len(morphs) + 1, "Wrong number of bounds {} when segmenting {} by {}".format(bounds, form, morphs)
+
+        # Walk back from the end, noting the edits made to each morph.
+        edits = [[] for morph in morphs]
+        i = f_len
+        j = m_len
+        while entry[3] is not None:
+            op = entry[2]
+            if op == _SUBST:
+                i -= 1
+                j -= 1
+                if m_form[j] != form[i]:
+                    edits[morph_indices[j]].append(("subst", m_form[j], form[i]))
+            elif op == _INSERT:
+                i -= 1
+                edits[morph_indices[min(j, m_len - 1)]].append(("insert", None, form[i]))
+            else:
+                j -= 1
+                edits[morph_indices[j]].append(("delete", m_form[j], None))
+            entry = entry[3]
+        for morph_edits in edits:
+            morph_edits.reverse()
+
+        alignments.append(Alignment(bounds, cost, edits))
+
+    return alignments
+
+class AlignmentCache:
+    """
+    A bounded LRU cache of the results of `infer_bounds`, keyed by the
+    morphs and the form, which saves time when the same alignment is
+    needed repeatedly, e.g. for homographs. Call the cache instead of
+    `infer_bounds`; the `cost_model` and `band` are passed to it.
+
+    The `k` best alignments found by `infer_bounds_top_k` can be cached
+    as well, using `top_k`, separately for each `k`.
+
+    At most `maxsize` results are kept; `hits` and `misses` count the
+    lookups. If `path` is given, the cache is loaded from that file if
+    it exists, and `save` writes it back there, so that the alignments
+    are kept between runs.
+    """
+
+    # The version of the file format written by `save`.
+    _VERSION = 1
+
+    def __init__(self, maxsize=1000000, cost_model=None, band=None, path=None):
+        self.maxsize = maxsize
+        self.cost_model = default_cost_model if cost_model is None else cost_model
+        self.band = band
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._results = OrderedDict()
+
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self):
+        return len(self._results)
+
+    def __call__(self, morphs, form):
+        result = self.get(morphs, form)
+        if result is None:
+            result = infer_bounds(morphs, form, cost_model=self.cost_model, band=self.band)
+            self.add(morphs, form, result)
+        return result
+
+    def top_k(self, morphs, form, k=3):
+        """
+        Return the result of `infer_bounds_top_k` for `morphs` and
+        `form`, computing it only if it isn't cached yet.
+        """
+        result = self.get(morphs, form, k)
+        if result is None:
+            result = infer_bounds_top_k(morphs, form, k=k, cost_model=self.cost_model)
+            self.add(morphs, form, result, k)
+        return result
+
+    def get(self, morphs, form, k=None):
+        """
+        Return the cached result of aligning `morphs` with `form`, or None
+        if there is none. If `k` is given, look up the list of the `k`
+        best alignments instead.
+        """
+        key = (tuple(morphs), form) if k is None else (tuple(morphs), form, k)
+        result = self._results.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._results.move_to_end(key)
+        return _thaw_result(result)
+
+    def add(self, morphs, form, result, k=None):
+        """
+        Store the `result` of aligning `morphs` with `form`, which is the
+        list of the `k` best alignments if `k` is given.
+        """
+        key = (tuple(morphs), form) if k is None else (tuple(morphs), form, k)
+        self._results[key] = _freeze_result(result)
+        if len(self._results) > self.maxsize:
+            self._results.popitem(last=False)
+
+    def clear(self):
+        """
+        Remove all results and reset the counters.
+        """
+        self._results.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def _alphabet(self):
+        return {char: info[1] for char, info in self.cost_model._chars.items()}
+
+    def save(self, path=None):
+        """
+        Save the cached results to `path`, by default the path the cache
+        was created with. The file is replaced atomically.
+        """
+        if path is None:
+            path = self.path
+        if path is None:
+            raise ValueError("No path to save the alignment cache to")
+
+        data = {
+            "version": self._VERSION,
+            "alphabet": self._alphabet(),
+            "results": list(self._results.items()),
+        }
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        """
+        Add the results saved in `path` to the cache. Results saved with
+        a different alphabet in the cost model may differ, so they are
+        ignored. Returns the number of results loaded.
+        """
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+        if data.get("version") != self._VERSION:
+            raise ValueError("Unsupported alignment cache version {} in '{}'".format(data.get("version"), path))
+        if data["alphabet"] != self._alphabet():
+            return 0
+
+        results = data["results"]
+        for key, result in results[max(0, len(results) - self.maxsize):]:
+            self._results[key] = result
+            self._results.move_to_end(key)
+        while len(self._results) > self.maxsize:
+            self._results.popitem(last=False)
+        return min(len(results), self.maxsize)
+
+def _freeze_result(result):
+    """
+    Convert the result of `infer_bounds` or `infer_bounds_top_k` into an
+    immutable form, to be shared by caches.
+    """
+    if isinstance(result[0], Alignment):
+        return tuple([Alignment(tuple(a.bounds), a.cost, tuple([tuple(edits) for edits in a.edits])) for a in result])
+    bounds, cost = result
+    return tuple(bounds), cost
+
+def _thaw_result(result):
+    """
+    Return a mutable copy of the `result` frozen by `_freeze_result`.
+    """
+    if isinstance(result[0], Alignment):
+        return [Alignment(list(a.bounds), a.cost, [list(edits) for edits in a.edits]) for a in result]
+    bounds, cost = result
+    return list(bounds), cost
+
+# The operations recorded in the backpointer matrix of `_align_batch`,
+#  in the order of preference when their costs are equal.
+_SUBST, _INSERT, _DELETE = 0, 1, 2
+
+def infer_bounds_batch(pairs, batch_size=256, cost_model=None):
+    """
+    Run `infer_bounds` on each (morphs, form) tuple in `pairs` and
+    return a list of the results, in the same order. The results are
+    exactly the same, but the pairs are aligned in batches of up to
+    `batch_size` using NumPy arrays, which is much faster when there
+    are many of them. Requires the numpy package.
+    """
+    if np is None:
+        raise ImportError("The numpy package is required for batched alignment")
+
+    pairs = [(list(morphs), form) for morphs, form in pairs]
+    for morphs, form in pairs:
+        assert morphs, "Morphs must not be empty"
+        assert form,   "Form must not be empty"
+        for morph in morphs:
+            assert morph, "No morph may be empty"
+
+    # Exactly matching pairs don't need aligning.
+    results = [None] * len(pairs)
+    inexact = []
+    for k, (morphs, form) in enumerate(pairs):
+        if "".join(morphs) == form:
+            results[k] = (sorted(bound_indices(morphs)), 0.0)
+        else:
+            inexact.append(k)
+
+    # The costs only depend on the characters, so they are computed
+    #  once for every character (pair) of the pairs.
+    alphabet = {}
+    for k in inexact:
+        morphs, form = pairs[k]
+        for string in chain(morphs, (form, )):
+            for char in string:
+                if char not in alphabet:
+                    alphabet[char] = len(alphabet)
+    if cost_model is None:
+        cost_model = default_cost_model
+    chars = list(alphabet)
+    subst_table = cost_model.subst_costs(chars, chars)
+    insert_table = cost_model.insert_costs(chars)
+    delete_table = cost_model.delete_costs(chars)
+
+    # Pairs of similar lengths are aligned together, so that little
+    #  space is wasted on padding.
+    order = sorted(inexact, key=lambda k: (len(pairs[k][1]), sum(len(morph) for morph in pairs[k][0])))
+    for start in range(0, len(order), batch_size):
+        batch = order[start:start + batch_size]
+        batch_results = _align_batch([pairs[k] for k in batch], alphabet, subst_table, insert_table, delete_table)
+        for k, result in zip(batch, batch_results):
+            results[k] = result
+    return results
+
+def _align_batch(pairs, alphabet, subst_table, insert_table, delete_table):
+    """
+    Align all (morphs, form) `pairs` at once. The costs of the
+    characters, whose indices are given by `alphabet`, are looked up in
+    the cost tables.
+
+    The DP matrices of all pairs are padded to the same size and stored
+    skewed, by anti-diagonals: the cell for position `i` in the form and
+    `j` in the morphs is at `[d, i]` with `d = i + j`. All cells on an
+    anti-diagonal only depend on the previous two, so each diagonal is
+    computed at once for the whole batch using array slices. Only the
+    cost and the chosen operation is stored for each cell; the bounds
+    are recovered by following the operations back from the end.
+    """
+    m_forms = ["".join(morphs) for morphs, form in pairs]
+    size = len(pairs)
+    f_max = max(len(form) for morphs, form in pairs)
+    m_max = max(len(m_form) for m_form in m_forms)
+    d_max = f_max + m_max
+
+    f_codes = np.zeros((size, f_max), dtype=np.intp)
+    m_codes = np.zeros((size, m_max), dtype=np.intp)
+    for b, ((morphs, form), m_form) in enumerate(zip(pairs, m_forms)):
+        f_codes[b, :len(form)] = [alphabet[char] for char in form]
+        m_codes[b, :len(m_form)] = [alphabet[char] for char in m_form]
+
+    # Look the costs of each cell up in the skewed layout. The cell
+    #  [d, i] is entered from the form position i - 1 and the morph
+    #  position j - 1 = d - i - 1; out-of-range cells get clipped
+    #  indices and are never used.
+    diagonals = np.arange(d_max + 1)[:, None]
+    f_positions = np.arange(f_max + 1)[None, :]
+    f_index = np.clip(f_positions - 1, 0, max(f_max - 1, 0))
+    m_index = np.clip(diagonals - f_positions - 1, 0, max(m_max - 1, 0))
+    subst = subst_table[m_codes[:, m_index], f_codes[:, f_index]]
+    delete = delete_table[m_codes[:, m_index]]
+    insert = insert_table[f_codes]
+
+    costs = np.full((size, d_max + 1, f_max + 1), np.inf)
+    ops = np.zeros((size, d_max + 1, f_max + 1), dtype=np.int8)
+
+    # The first row and column only delete morph characters or insert
+    #  form characters, respectively. The sums are accumulated in the
+    #  same order as in `infer_bounds`, to get the same rounding.
+    costs[:, 0, 0] = 0.0
+    if m_max:
+        costs[:, 1:m_max + 1, 0] = np.add.accumulate(delete_table[m_codes], axis=1)
+        ops[:, 1:m_max + 1, 0] = _DELETE
+    first_column = np.add.accumulate(insert, axis=1)
+    for i in range(1, f_max + 1):
+        costs[:, i, i] = first_column[:, i - 1]
+        ops[:, i, i] = _INSERT
+
+    for d in range(2, d_max + 1):
+        lo = max(1, d - m_max)
+        hi = min(d - 1, f_max)
+        if lo > hi:
+            continue
+        s_cost = costs[:, d - 2, lo - 1:hi] + subst[:, d, lo:hi + 1]
+        d_cost = costs[:, d - 1, lo:hi + 1] + delete[:, d, lo:hi + 1]
+        i_cost = costs[:, d - 1, lo - 1:hi] + insert[:, lo - 1:hi]
+
+        cost = np.minimum(np.minimum(s_cost, d_cost), i_cost)
+        costs[:, d, lo:hi + 1] = cost
+        ops[:, d, lo:hi + 1] = np.where(s_cost == cost, _SUBST, np.where(i_cost == cost, _INSERT, _DELETE))
+
+    results = []
+    for b, (morphs, form) in enumerate(pairs):
+        f_len = len(form)
+        m_len = len(m_forms[b])
+        m_bounds = bound_indices(morphs)
+        pair_ops = ops[b].tolist()
+
+        # Walk back from the end, noting where the path crosses morph
+        #  boundaries, until reaching the first column; the inserts
+        #  above that only shift the starting boundary.
+        i = f_len
+        j = m_len
+        bounds = []
+        while j > 0:
+            op = pair_ops[i + j][i]
+            if op == _INSERT:
+                i -= 1
+            else:
+                if j in m_bounds:
+                    bounds.append(i)
+                if op == _SUBST:
+                    i -= 1
+                j -= 1
+        bounds.append(i)
+        bounds.reverse()
+
+        results.append((bounds, float(costs[b, f_len + m_len, f_len])))
+    return results
+
+def infer_bounds_many(pairs, workers=None, chunksize=256, cost_model=None, band=None, cache=None, k=None):
+    """
+    Run `infer_bounds` on each (morphs, form) tuple in `pairs` and
+    return a list of the results, in the same order. If an alignment
+    fails, the exception it raised is returned in place of its result,
+    so that the other ones are not lost. If `k` is given, run
+    `infer_bounds_top_k` instead, returning lists of up to `k` best
+    alignments, whose first item is the result of `infer_bounds`.
+
+    The pairs are aligned in chunks of `chunksize`, in `workers`
+    separate processes if it is more than 1, using the batched engine
+    when numpy is installed. Repeated pairs are only aligned once. If
+    an `AlignmentCache` is given as `cache`, the results are looked up
+    in it and the new ones are added to it; its cost model and band are
+    used then instead of `cost_model` and `band`. The top-k search
+    uses neither the batched engine nor the band.
+    """
+    if cache is not None:
+        cost_model = cache.cost_model
+        band = cache.band
+    elif cost_model is None:
+        # Passed explicitly, so that the workers get the alphabets
+        #  registered in this process.
+        cost_model = default_cost_model
+
+    results = []
+    todo = {}
+    for morphs, form in pairs:
+        key = (tuple(morphs), form)
+        result = None if cache is None else cache.get(morphs, form, k)
+        if result is None:
+            # Remember where to put the result.
+            result = todo.setdefault(key, [])
+            result.append(len(results))
+        results.append(result)
+
+    keys = list(todo)
+    chunks = [keys[i:i + chunksize] for i in range(0, len(keys), chunksize)]
+    if workers is not None and workers > 1 and len(chunks) > 1:
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(cost_model, band, k)) as pool:
+            chunk_results = pool.imap(_align_chunk, chunks)
+            _store_results(chunks, chunk_results, todo, results, cache, k)
+    else:
+        _init_worker(cost_model, band, k)
+        _store_results(chunks, map(_align_chunk, chunks), todo, results, cache, k)
+
+    return results
+
+def _store_results(chunks, chunk_results, todo, results, cache, k):
+    """
+    Put the results of aligning the keys in `chunks` to all positions
+    in `results` given by `todo`, and to the `cache`.
+    """
+    for chunk, chunk_result in zip(chunks, chunk_results):
+        for key, result in zip(chunk, chunk_result):
+            if isinstance(result, Exception):
+                for position in todo[key]:
+                    results[position] = result
+                continue
+
+            result = _freeze_result(result)
+            if cache is not None:
+                cache.add(key[0], key[1], result, k)
+            for position in todo[key]:
+                # Each position gets its own lists of bounds.
+                results[position] = _thaw_result(result)
+
+# The settings of `_align_chunk`, set in each worker process.
+_worker_cost_model = None
+_worker_band = None
+_worker_k = None
+
+def _init_worker(cost_model, band, k):
+    global _worker_cost_model, _worker_band, _worker_k
+    _worker_cost_model = cost_model
+    _worker_band = band
+    _worker_k = k
+
+def _align_chunk(keys):
+    """
+    Align the (morphs, form) `keys`, returning a list of results or
+    exceptions.
+    """
+    if _worker_k is not None:
+        results = []
+        for morphs, form in keys:
+            try:
+                results.append(infer_bounds_top_k(morphs, form, k=_worker_k, cost_model=_worker_cost_model))
+            except Exception as exc:
+                results.append(exc)
+        return results
+
+    if np is not None:
+        try:
+            return infer_bounds_batch(keys, cost_model=_worker_cost_model)
+        except Exception:
+            # Find out which of the pairs failed below.
+            pass
 
-    return bounds, ss[f_len][m_len]["cost"]
+    results = []
+    for morphs, form in keys:
+        try:
+            results.append(infer_bounds(morphs, form, cost_model=_worker_cost_model, band=_worker_band))
+        except Exception as exc:
+            results.append(exc)
+    return results
@@ -0,0 +1,366 @@
+"""
+A compact binary serialization of SegLex lexicons, which is much faster
+to load than the TSV format. Use `SegLex.save_binary` and
+`SegLex.load_binary` to work with it.
+
+All integers are unsigned and little-endian. The file starts with
+a header (the magic bytes `USEGBIN\\0`, u32 version and u32 number of
+sections), followed by a table of sections, each described by its
+8-byte NUL-padded name, u64 offset and u64 size in bytes. Sections start
+at offsets divisible by 8. They are:
+
+strings:
+    u64 number of strings N, N + 1 u64 offsets into the data and
+    the UTF-8 data of all strings. The strings are unique and sorted.
+    All strings are referred to by their index in this table.
+lexemes:
+    Fixed-width records of six u32 each: the strings of the form,
+    lemma, POS and features (as JSON) and the index of the first
+    morpheme of the lexeme and the number of its morphemes. Lexemes
+    are stored in the order of their IDs.
+morphs:
+    Fixed-width records of four u32 each: the strings of the annotation
+    name and features (as JSON) and the start (inclusive) and end
+    (exclusive) of the span. Morphemes of each lexeme are stored
+    together, each layer in the order the morphemes were added.
+    Discontiguous spans have the start set to 0xFFFFFFFF and the end
+    to the index of the span in the `runs` section.
+runs:
+    u32 values of discontiguous spans. Each is stored as the number
+    of its contiguous runs, followed by the start and end of each run.
+
+The following sections index the lexemes for lookups without loading
+the lexicon (see `useg.seg_mapped.MappedSegLex`):
+
+byform:
+    u32 IDs of all lexemes, sorted by their form and ID.
+bypos:
+    u32 IDs of all lexemes, grouped by POS in the order the POS tags
+    first occur in the lexicon, then by lemma in the order the lemmas
+    first occur with the POS, sorted by ID within the groups. This is
+    the order in which `SegLex.iter_lexemes` returns them.
+posidx:
+    Records of three u32 for each POS tag in the order of `bypos`: the
+    string of the POS and the start and end of its group in `bypos`.
+lemmaidx:
+    Records of four u32 for each group of lexemes with the same POS
+    and lemma, sorted by the POS string and the lemma string: the
+    strings of the POS and lemma and the start and end of the group
+    in `bypos`.
+"""
+
+from array import array
+import json
+import struct
+import sys
+
+from useg.seg_lex import Span
+
+MAGIC = b"USEGBIN\0"
+VERSION = 1
+
+# Field counts of the fixed-width records.
+LEXEME_FIELDS = 6
+MORPHEME_FIELDS = 4
+
+# The start of a span that is stored in the runs section.
+DISCONTIGUOUS = 0xFFFFFFFF
+
+_header = struct.Struct("<8sII")
+_section_entry = struct.Struct("<8sQQ")
+
+if sys.byteorder != "little":
+    raise ImportError("The binary USeg format is only supported on little-endian machines")
+
+# Used for encoding all features, so that equal features share a string.
+_features_encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+def _encode_string(string):
+    # Lone surrogates may come from JSON escapes in the TSV files.
+    return string.encode("utf-8", "surrogatepass")
+
+def _decode_string(data):
+    return str(data, "utf-8", "surrogatepass")
+
+class BinaryData:
+    """
+    The parsed contents of a binary lexicon: `strings` is the list of
+    all strings and `lexemes`, `morphemes` and `runs` are flat sequences
+    of the u32 fields of the respective sections.
+    """
+
+    __slots__ = ("strings", "lexemes", "morphemes", "runs")
+
+    def __init__(self, strings, lexemes, morphemes, runs):
+        self.strings = strings
+        self.lexemes = lexemes
+        self.morphemes = morphemes
+        self.runs = runs
+
+    def span(self, start, end):
+        """
+        Return the Span of a morpheme with the stored `start` and `end`.
+        """
+        return make_span(self.runs, start, end)
+
+def make_span(runs, start, end):
+    """
+    Return the Span of a morpheme with the stored `start` and `end`,
+    where `runs` is the runs section.
+    """
+    if start != DISCONTIGUOUS:
+        return Span.contiguous(start, end)
+
+    run_count = runs[end]
+    positions = []
+    for i in range(end + 1, end + 1 + 2 * run_count, 2):
+        positions.extend(range(runs[i], runs[i + 1]))
+    return Span(positions)
+
+def read_sections(data):
+    """
+    Parse the header of the binary lexicon `data` (a bytes-like object)
+    and return a dict mapping section names to memoryviews of them.
+    """
+    data = memoryview(data)
+    if len(data) < _header.size:
+        raise ValueError("Not a binary USeg file: too short")
+
+    magic, version, section_count = _header.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a binary USeg file: wrong magic bytes")
+    if version != VERSION:
+        raise ValueError("Unsupported binary USeg version {}".format(version))
+
+    sections = {}
+    for i in range(section_count):
+        name, offset, size = _section_entry.unpack_from(data, _header.size + i * _section_entry.size)
+        if offset + size > len(data):
+            raise ValueError("Truncated binary USeg file")
+        sections[name.rstrip(b"\0").decode("ascii")] = data[offset:offset + size]
+    return sections
+
+def string_offsets(section):
+    """
+    Return the number of strings in the strings `section` (a memoryview),
+    a memoryview of their offsets and a memoryview of their data.
+    """
+    count = section[:8].cast("Q")[0]
+    offsets = section[8:8 * (count + 2)].cast("Q")
+    return count, offsets, section[8 * (count + 2):]
+
+class StringTable:
+    """
+    The strings section of a binary lexicon, which decodes strings only
+    when they are requested.
+    """
+
+    __slots__ = ("_offsets", "_data", "_count")
+
+    def __init__(self, section):
+        self._count, self._offsets, self._data = string_offsets(section)
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, string_id):
+        """
+        Return the string with ID `string_id`.
+        """
+        if not 0 <= string_id < self._count:
+            raise IndexError("String ID {} out of range".format(string_id))
+        return _decode_string(self._data[self._offsets[string_id]:self._offsets[string_id + 1]])
+
+    def find(self, string):
+        """
+        Return the ID of `string`, or None if it is not in the table.
+        """
+        if not isinstance(string, str):
+            return None
+
+        # UTF-8 sorts the same as the code points, so the table can be
+        #  searched by comparing the encoded strings.
+        encoded = _encode_string(string)
+        offsets = self._offsets
+        data = self._data
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            candidate = bytes(data[offsets[middle]:offsets[middle + 1]])
+            if candidate < encoded:
+                low = middle + 1
+            elif candidate == encoded:
+                return middle
+            else:
+                high = middle
+        return None
+
+    def release(self):
+        """
+        Release the views of the underlying buffer.
+        """
+        self._offsets.release()
+        self._data.release()
+
+def read_binary(data):
+    """
+    Parse the binary lexicon `data` (a bytes-like object) into
+    a BinaryData object.
+    """
+    sections = read_sections(data)
+    for name in ("strings", "lexemes", "morphs", "runs"):
+        if name not in sections:
+            raise ValueError("Binary USeg file is missing the {} section".format(name))
+
+    count, offsets, string_data = string_offsets(sections["strings"])
+    offsets = offsets.tolist()
+    strings = [_decode_string(string_data[offsets[i]:offsets[i + 1]]) for i in range(count)]
+
+    return BinaryData(
+        strings,
+        sections["lexemes"].cast("I"),
+        sections["morphs"].cast("I"),
+        sections["runs"].cast("I"),
+    )
+
+def write_binary(lexicon, f):
+    """
+    Write the whole `lexicon` (a SegLex) into the binary file-like
+    object `f` open for writing.
+    """
+    # Collect all strings with provisional IDs in the order they are
+    #  found, and renumber them once they can be sorted.
+    string_ids = {}
+    def string_id(string):
+        i = string_ids.get(string)
+        if i is None:
+            i = len(string_ids)
+            string_ids[string] = i
+        return i
+
+    lexemes = array("I")
+    morphemes = array("I")
+    runs = array("I")
+
+    for lex_id in lexicon.iter_lexemes():
+        form = lexicon.form(lex_id)
+        lemma = lexicon.lemma(lex_id)
+        pos = lexicon.pos(lex_id)
+        for value in (form, lemma, pos):
+            if not isinstance(value, str):
+                raise ValueError("Lexeme {} has a non-string form, lemma or POS tag, which can't be saved".format(lex_id))
+
+        first_morpheme = len(morphemes) // MORPHEME_FIELDS
+        for annot_name, layer in lexicon._layers(lex_id).items():
+            if not isinstance(annot_name, str):
+                raise ValueError("Lexeme {} has a non-string annotation name {!r}, which can't be saved".format(lex_id, annot_name))
+            annot_id = string_id(annot_name)
+
+            for morpheme in layer:
+                span = Span(morpheme.span)
+                if span.is_contiguous:
+                    start, end = span.start, span.end
+                else:
+                    # Find the runs of the span by iterating over it.
+                    start, end = DISCONTIGUOUS, len(runs)
+                    bounds = []
+                    for position in span:
+                        if bounds and bounds[-1] == position:
+                            bounds[-1] = position + 1
+                        else:
+                            bounds.append(position)
+                            bounds.append(position + 1)
+                    runs.append(len(bounds) // 2)
+                    runs.extend(bounds)
+
+                morphemes.extend((annot_id, string_id(_features_encoder.encode(morpheme.features)), start, end))
+
+        morpheme_count = len(morphemes) // MORPHEME_FIELDS - first_morpheme
+        lexemes.extend((
+            string_id(form),
+            string_id(lemma),
+            string_id(pos),
+            string_id(_features_encoder.encode(lexicon._lexeme_features(lex_id))),
+            first_morpheme,
+            morpheme_count,
+        ))
+
+    # Sort the strings and renumber all references to them.
+    strings = sorted(string_ids.keys())
+    new_ids = array("I", bytes(4 * len(strings)))
+    for new_id, string in enumerate(strings):
+        new_ids[string_ids[string]] = new_id
+    for i in range(0, len(lexemes), LEXEME_FIELDS):
+        for j in range(i, i + 4):
+            lexemes[j] = new_ids[lexemes[j]]
+    for i in range(0, len(morphemes), MORPHEME_FIELDS):
+        morphemes[i] = new_ids[morphemes[i]]
+        morphemes[i + 1] = new_ids[morphemes[i + 1]]
+
+    # Index the lexemes. Strings are sorted, so ordering by string IDs
+    #  orders by the strings.
+    lexeme_count = len(lexemes) // LEXEME_FIELDS
+    by_form = array("I", sorted(range(lexeme_count), key=lambda i: lexemes[i * LEXEME_FIELDS]))
+
+    groups = {}
+    for i in range(lexeme_count):
+        lemma_id = lexemes[i * LEXEME_FIELDS + 1]
+        pos_id = lexemes[i * LEXEME_FIELDS + 2]
+        lemmas = groups.setdefault(pos_id, {})
+        if lemma_id in lemmas:
+            lemmas[lemma_id].append(i)
+        else:
+            lemmas[lemma_id] = [i]
+
+    by_pos = array("I")
+    pos_index = array("I")
+    lemma_index = []
+    for pos_id, lemmas in groups.items():
+        pos_start = len(by_pos)
+        for lemma_id, group in lemmas.items():
+            lemma_index.append((pos_id, lemma_id, len(by_pos), len(by_pos) + len(group)))
+            by_pos.extend(group)
+        pos_index.extend((pos_id, pos_start, len(by_pos)))
+    lemma_index.sort()
+    lemma_index = array("I", [value for entry in lemma_index for value in entry])
+
+    encoded = [_encode_string(string) for string in strings]
+    offsets = array("Q", [len(strings)])
+    offset = 0
+    for data in encoded:
+        offsets.append(offset)
+        offset += len(data)
+    offsets.append(offset)
+    string_section = offsets.tobytes() + b"".join(encoded)
+
+    _write_sections(f, [
+        ("strings", string_section),
+        ("lexemes", lexemes.tobytes()),
+        ("morphs", morphemes.tobytes()),
+        ("runs", runs.tobytes()),
+        ("byform", by_form.tobytes()),
+        ("bypos", by_pos.tobytes()),
+        ("posidx", pos_index.tobytes()),
+        ("lemmaidx", lemma_index.tobytes()),
+    ])
+
+def _write_sections(f, sections):
+    """
+    Write the header and the list of (name, bytes) `sections` into `f`.
+    """
+    offset = _header.size + len(sections) * _section_entry.size
+    entries = []
+    for name, data in sections:
+        offset += -offset % 8
+        entries.append((name, offset, len(data)))
+        offset += len(data)
+
+    f.write(_header.pack(MAGIC, VERSION, len(sections)))
+    for name, offset, size in entries:
+        f.write(_section_entry.pack(name.encode("ascii"), offset, size))
+
+    position = _header.size + len(sections) * _section_entry.size
+    for (name, data), (_, offset, size) in zip(sections, entries):
+        f.write(b"\0" * (offset - position))
+        f.write(data)
+        position = offset + size
@@ -0,0 +1,515 @@
+from array import array
+
+from useg import seg_tsv
+from useg.seg_lex import SegLex, Morpheme, Span, _copy_features, _span_sort_key, _split_form, merge_key
+
+# Indices of the string columns of lexemes.
+_FORM = 0
+_LEMMA = 1
+_POS = 2
+
+def _intern_key(value):
+    """
+    Convert a JSON-like `value` into a hashable object which compares
+    equal only for values which are not only equal, but also serialize
+    the same: unlike in `seg_lex._hashable`, 1, 1.0 and True (or 0.0 and
+    -0.0) are all different keys.
+    """
+    if isinstance(value, str):
+        return value
+    if isinstance(value, dict):
+        return frozenset([(k, v if isinstance(v, str) else _intern_key(v)) for k, v in value.items()])
+    if isinstance(value, list):
+        return tuple([v if isinstance(v, str) else _intern_key(v) for v in value])
+    return (type(value), repr(value))
+
+class ColumnarSegLex(SegLex):
+    """
+    A memory-lean variant of SegLex, which stores the lexicon in flat
+    columns instead of one object per lexeme and morpheme. Create it
+    using `SegLex(storage="columnar")` or `ColumnarSegLex()`; the API
+    is the same as that of SegLex.
+
+    Forms, lemmas, POS tags and annotation names are interned in a
+    single value table and the lexemes only store their integer IDs,
+    in arrays. Feature dicts of lexemes and morphemes are interned in
+    the same way, so each distinct set of features is stored only once.
+    Morphemes are stored in flat parallel arrays (annotation layer,
+    span start and end, features) and the morphemes of a lexeme are
+    chained together in the order they were added, starting at the
+    offset recorded for the lexeme. Lexemes with the same form, lemma
+    or POS are chained in the same way, which replaces the lookup dicts
+    of SegLex.
+
+    There are some differences to keep in mind:
+     - Morpheme objects are created on each query, so the same morpheme
+       retrieved twice compares equal, but is not the same object.
+       Changes to the features of a returned morpheme are not stored.
+     - The features passed to `add_lexeme` and `add_morpheme` are
+       copied and must be hashable after converting dicts and lists to
+       frozensets and tuples, which any JSON-like features are.
+     - The dict returned by `features` is still shared with the
+       lexicon, but only after it has been requested for the first time;
+       until then, the lexeme shares its features with all the others
+       which have the same ones.
+    """
+
+    __slots__ = (
+        "_values", "_value_ids",
+        "_feature_dicts", "_feature_ids", "_lexeme_feature_dicts",
+        "_columns", "_next", "_heads", "_tails", "_pos_order",
+        "_l_features", "_first_morpheme", "_last_morpheme",
+        "_m_annot", "_m_start", "_m_end", "_m_features", "_m_next", "_m_spans",
+        "_deleted",
+    )
+
+    def __init__(self, storage="columnar"):
+        # The table of interned strings (and other hashable values) and
+        #  a dict mapping them back to their IDs.
+        self._values = []
+        self._value_ids = {}
+        # Interned feature dicts, keyed by their `_intern_key`. ID 0
+        #  is reserved for the empty dict, which is the most common one.
+        self._feature_dicts = [{}]
+        self._feature_ids = {_intern_key({}): 0}
+        # Feature dicts handed out by `features`, keyed by lexeme ID.
+        self._lexeme_feature_dicts = {}
+
+        # Value IDs of the form, lemma and POS of each lexeme.
+        self._columns = (array("i"), array("i"), array("i"))
+        # For each of the three columns, the ID of the next lexeme with
+        #  the same value, or -1. The first and last lexeme of each chain
+        #  are stored in `_heads` and `_tails`, indexed by value ID.
+        self._next = (array("i"), array("i"), array("i"))
+        self._heads = (array("i"), array("i"), array("i"))
+        self._tails = (array("i"), array("i"), array("i"))
+        # Value IDs of POS tags in the order they were first seen.
+        self._pos_order = []
+
+        # Feature IDs of lexemes.
+        self._l_features = array("i")
+        # The first and last morpheme of each lexeme, or -1.
+        self._first_morpheme = array("i")
+        self._last_morpheme = array("i")
+
+        # Morphemes: the value ID of their annotation layer, their span,
+        #  features ID and the next morpheme of the same lexeme, or -1.
+        #  Only the start and end of spans are stored in the arrays; the
+        #  rare discontiguous spans are kept whole in `_m_spans`.
+        self._m_annot = array("i")
+        self._m_start = array("i")
+        self._m_end = array("i")
+        self._m_features = array("i")
+        self._m_next = array("i")
+        self._m_spans = {}
+
+        # IDs of deleted lexemes, which stay in the arrays and chains
+        #  until `compact` is called.
+        self._deleted = set()
+
+    def _value_id(self, value):
+        """
+        Return the ID of `value` in the value table, or None if it is not
+        there.
+        """
+        return self._value_ids.get(value if type(value) is str else (type(value), value))
+
+    def _intern(self, value):
+        """
+        Return the ID of `value` in the value table, adding it if needed.
+        """
+        key = value if type(value) is str else (type(value), value)
+        value_id = self._value_ids.get(key)
+        if value_id is None:
+            value_id = len(self._values)
+            self._values.append(value)
+            self._value_ids[key] = value_id
+            for heads in self._heads:
+                heads.append(-1)
+            for tails in self._tails:
+                tails.append(-1)
+        return value_id
+
+    def _intern_features(self, features):
+        """
+        Return the ID of the `features` dict in the features table,
+        adding a copy of it if needed.
+        """
+        if not features:
+            return 0
+
+        key = _intern_key(features)
+        features_id = self._feature_ids.get(key)
+        if features_id is None:
+            features_id = len(self._feature_dicts)
+            self._feature_dicts.append(_copy_features(features))
+            self._feature_ids[key] = features_id
+        return features_id
+
+    def _lexeme_features(self, lex_id):
+        """
+        Return the features of lexeme `lex_id` without handing them out.
+        The returned dict must not be modified.
+        """
+        features = self._lexeme_feature_dicts.get(lex_id)
+        if features is None:
+            features = self._feature_dicts[self._l_features[lex_id]]
+        return features
+
+    def _layers(self, lex_id):
+        values = self._values
+        m_annot = self._m_annot
+        layers = {}
+        for m in self._morpheme_indices(lex_id):
+            annot_name = values[m_annot[m]]
+            if annot_name in layers:
+                layers[annot_name].append(self._make_morpheme(m))
+            else:
+                layers[annot_name] = [self._make_morpheme(m)]
+        return layers
+
+    def _morpheme_indices(self, lex_id):
+        """
+        Iterate over the indices of all morphemes of lexeme `lex_id` in
+        the morpheme arrays, in the order they were added.
+        """
+        if self._deleted:
+            self._check_deleted(lex_id)
+        m = self._first_morpheme[lex_id]
+        m_next = self._m_next
+        while m != -1:
+            yield m
+            m = m_next[m]
+
+    def _make_morpheme(self, m):
+        """
+        Create a Morpheme object for the morpheme with index `m`.
+        """
+        span = self._m_spans.get(m)
+        if span is None:
+            span = Span.contiguous(self._m_start[m], self._m_end[m])
+        return Morpheme(span, dict(self._feature_dicts[self._m_features[m]]))
+
+    def _layer_morphemes(self, lex_id, annot_name):
+        """
+        Return the list of morphemes of lexeme `lex_id` on layer
+        `annot_name`, or None if the layer doesn't exist.
+        """
+        annot_id = self._value_id(annot_name)
+        if annot_id is None:
+            # Check that lex_id is valid anyway.
+            self._first_morpheme[lex_id]
+            return None
+
+        m_annot = self._m_annot
+        morphemes = [self._make_morpheme(m) for m in self._morpheme_indices(lex_id) if m_annot[m] == annot_id]
+        return morphemes if morphemes else None
+
+    def _check_deleted(self, lex_id):
+        """
+        Raise an IndexError if lexeme `lex_id` has been deleted.
+        """
+        if lex_id in self._deleted:
+            raise IndexError("Lexeme {} has been deleted".format(lex_id))
+
+    def _has_form(self, form):
+        return next(self._iter_chain(_FORM, form), None) is not None
+
+    def _merge_key(self, lex_id):
+        return merge_key(self.form(lex_id), self.lemma(lex_id), self.pos(lex_id), self._lexeme_features(lex_id))
+
+    def _is_merge_candidate(self, lex_id, annot_name):
+        if self._first_morpheme[lex_id] == -1:
+            return False
+        annot_id = self._value_id(annot_name)
+        m_annot = self._m_annot
+        return all(m_annot[m] != annot_id for m in self._morpheme_indices(lex_id))
+
+    def _as_records(self):
+        for lex_id in self.iter_lexemes():
+            form = self.form(lex_id)
+            lemma = self.lemma(lex_id)
+            pos = self.pos(lex_id)
+            features = self._lexeme_features(lex_id)
+
+            layers = self._layers(lex_id)
+            if not layers:
+                assert "segmentation" not in features and "annot_name" not in features
+                yield seg_tsv.SegRecord(form, lemma, pos, [], features)
+
+            for annot_name in sorted(layers.keys()):
+                morphemes = layers[annot_name]
+                annot = features.copy()
+                assert "segmentation" not in annot and "annot_name" not in annot
+                annot["annot_name"] = annot_name
+                annot["segmentation"] = [{**morpheme.features, "span": morpheme.span}
+                                         for morpheme in sorted(morphemes, key=_span_sort_key)]
+
+                yield seg_tsv.SegRecord(form, lemma, pos, _split_form(form, morphemes), annot)
+
+    def add_lexeme(self, form, lemma, pos, features=None):
+        lex_id = len(self._l_features)
+
+        for column, value in ((_FORM, form), (_LEMMA, lemma), (_POS, pos)):
+            value_id = self._intern(value)
+            heads = self._heads[column]
+            tails = self._tails[column]
+
+            if heads[value_id] == -1:
+                heads[value_id] = lex_id
+                if column == _POS:
+                    self._pos_order.append(value_id)
+            else:
+                self._next[column][tails[value_id]] = lex_id
+            tails[value_id] = lex_id
+
+            self._columns[column].append(value_id)
+            self._next[column].append(-1)
+
+        self._l_features.append(self._intern_features(features))
+        self._first_morpheme.append(-1)
+        self._last_morpheme.append(-1)
+
+        return lex_id
+
+    def _add_bulk_row(self, form, lemma, pos, features, annot_name, morphemes):
+        lex_id = self.add_lexeme(form, lemma, pos, features)
+        if morphemes:
+            annot_id = self._intern(annot_name)
+            for span, m_features in morphemes:
+                self._append_morpheme(lex_id, annot_id, span, m_features)
+        return lex_id
+
+    def _add_binary(self, data):
+        from useg.seg_bin import LEXEME_FIELDS, MORPHEME_FIELDS
+
+        strings = data.strings
+        lexemes = data.lexemes.tolist()
+        morphemes = data.morphemes.tolist()
+
+        # Intern each distinct features string once.
+        features_ids = {}
+        def features_id_of(string_id):
+            features_id = features_ids.get(string_id)
+            if features_id is None:
+                features_id = self._intern_features(seg_tsv.decode_json(strings[string_id]))
+                features_ids[string_id] = features_id
+            return features_id
+
+        for i in range(0, len(lexemes), LEXEME_FIELDS):
+            form_id, lemma_id, pos_id, features_id, first_morpheme, morpheme_count = lexemes[i:i + LEXEME_FIELDS]
+            lex_id = self.add_lexeme(strings[form_id], strings[lemma_id], strings[pos_id])
+            self._l_features[lex_id] = features_id_of(features_id)
+
+            last = -1
+            first = MORPHEME_FIELDS * first_morpheme
+            for m in range(first, first + MORPHEME_FIELDS * morpheme_count, MORPHEME_FIELDS):
+                annot_id, m_features_id, start, end = morphemes[m:m + MORPHEME_FIELDS]
+                span = data.span(start, end)
+
+                new_m = len(self._m_annot)
+                self._m_annot.append(self._intern(strings[annot_id]))
+                self._m_start.append(span.start)
+                self._m_end.append(span.end)
+                self._m_features.append(features_id_of(m_features_id))
+                self._m_next.append(-1)
+                if not span.is_contiguous:
+                    self._m_spans[new_m] = span
+
+                if last == -1:
+                    self._first_morpheme[lex_id] = new_m
+                else:
+                    self._m_next[last] = new_m
+                last = new_m
+            self._last_morpheme[lex_id] = last
+
+    def _iter_chain(self, column, value, include_deleted=False):
+        """
+        Iterate over IDs of lexemes with `value` in `column`.
+        """
+        value_id = self._value_id(value)
+        if value_id is None:
+            return
+
+        lex_id = self._heads[column][value_id]
+        next_ids = self._next[column]
+        deleted = self._deleted
+        while lex_id != -1:
+            if include_deleted or lex_id not in deleted:
+                yield lex_id
+            lex_id = next_ids[lex_id]
+
+    def iter_lexemes(self, form=None, lemma=None, pos=None):
+        # Lexemes are returned in the same order as SegLex returns them.
+        lemmas = self._columns[_LEMMA]
+        poses = self._columns[_POS]
+
+        if form is not None:
+            for lex_id in self._iter_chain(_FORM, form):
+                if (lemma is None or self.lemma(lex_id) == lemma) \
+                   and (pos is None or self.pos(lex_id) == pos):
+                    yield lex_id
+            return
+
+        deleted = self._deleted
+        if pos is None and lemma is None:
+            for lex_id in range(len(self._l_features)):
+                if lex_id not in deleted:
+                    yield lex_id
+            return
+
+        # The order of the groups below is given by the first lexeme of
+        #  each group, deleted or not, just like in SegLex.
+        if lemma is None:
+            # All lexemes with the POS, grouped by their lemmas in the
+            #  order the lemmas were first seen with that POS.
+            groups = {}
+            for lex_id in self._iter_chain(_POS, pos, True):
+                lemma_id = lemmas[lex_id]
+                if lemma_id in groups:
+                    groups[lemma_id].append(lex_id)
+                else:
+                    groups[lemma_id] = [lex_id]
+            for group in groups.values():
+                for lex_id in group:
+                    if lex_id not in deleted:
+                        yield lex_id
+        elif pos is None:
+            # All lexemes with the lemma, grouped by their POS tags in the
+            #  order the POS tags were first seen.
+            groups = {}
+            for lex_id in self._iter_chain(_LEMMA, lemma):
+                pos_id = poses[lex_id]
+                if pos_id in groups:
+                    groups[pos_id].append(lex_id)
+                else:
+                    groups[pos_id] = [lex_id]
+            for pos_id in self._pos_order:
+                if pos_id in groups:
+                    yield from groups[pos_id]
+        else:
+            pos_id = self._value_id(pos)
+            for lex_id in self._iter_chain(_LEMMA, lemma):
+                if poses[lex_id] == pos_id:
+                    yield lex_id
+
+    def delete_lexemes(self, lex_ids):
+        lex_ids = set(lex_ids)
+        for lex_id in lex_ids:
+            if not 0 <= lex_id < len(self._l_features):
+                raise IndexError("Invalid lexeme ID {}".format(lex_id))
+            if lex_id in self._deleted:
+                raise IndexError("Lexeme {} has already been deleted".format(lex_id))
+
+        self._deleted.update(lex_ids)
+        for lex_id in lex_ids:
+            self._lexeme_feature_dicts.pop(lex_id, None)
+
+    def compact(self):
+        # Rebuild the lexicon from the remaining lexemes.
+        compacted = ColumnarSegLex()
+        new_ids = [None] * len(self._l_features)
+        for lex_id in self.iter_lexemes():
+            new_id = compacted.add_lexeme(self.form(lex_id), self.lemma(lex_id), self.pos(lex_id))
+            new_ids[lex_id] = new_id
+            compacted._l_features[new_id] = compacted._intern_features(self._feature_dicts[self._l_features[lex_id]])
+            if lex_id in self._lexeme_feature_dicts:
+                compacted._lexeme_feature_dicts[new_id] = self._lexeme_feature_dicts[lex_id]
+
+            for m in self._morpheme_indices(lex_id):
+                morpheme = self._make_morpheme(m)
+                compacted.add_morpheme(new_id, self._values[self._m_annot[m]], morpheme.span, morpheme.features)
+
+        for name in ColumnarSegLex.__slots__:
+            setattr(self, name, getattr(compacted, name))
+        return new_ids
+
+    def form(self, lex_id):
+        if self._deleted:
+            self._check_deleted(lex_id)
+        return self._values[self._columns[_FORM][lex_id]]
+
+    def lemma(self, lex_id):
+        if self._deleted:
+            self._check_deleted(lex_id)
+        return self._values[self._columns[_LEMMA][lex_id]]
+
+    def pos(self, lex_id):
+        if self._deleted:
+            self._check_deleted(lex_id)
+        return self._values[self._columns[_POS][lex_id]]
+
+    def features(self, lex_id):
+        if self._deleted:
+            self._check_deleted(lex_id)
+        features = self._lexeme_feature_dicts.get(lex_id)
+        if features is None:
+            # Give the lexeme its own copy, so that edits don't affect
+            #  other lexemes with the same features.
+            features = _copy_features(self._feature_dicts[self._l_features[lex_id]])
+            self._lexeme_feature_dicts[lex_id] = features
+        return features
+
+    def annot_names(self, lex_id):
+        values = self._values
+        m_annot = self._m_annot
+        return {values[m_annot[m]] for m in self._morpheme_indices(lex_id)}
+
+    def add_morpheme(self, lex_id, annot_name, span, features=None):
+        # Check that the morpheme span actually exists in the lexeme.
+        span = Span(span)
+        if span and (span.start < 0 or span.end > len(self.form(lex_id))):
+            raise ValueError(
+                "Morpheme span position {} is out-of-bounds in lexeme {}".format(
+                    span.start if span.start < 0 else span.end - 1,
+                    self.print_lexeme(lex_id)
+                )
+            )
+
+        self._append_morpheme(lex_id, self._intern(annot_name), span, features)
+
+    def _append_morpheme(self, lex_id, annot_id, span, features):
+        """
+        Add a morpheme with an already checked `span` to lexeme `lex_id`.
+        """
+        m = len(self._m_annot)
+        self._m_annot.append(annot_id)
+        self._m_start.append(span.start)
+        self._m_end.append(span.end)
+        self._m_features.append(self._intern_features(features))
+        self._m_next.append(-1)
+        if not span.is_contiguous:
+            self._m_spans[m] = span
+
+        # Append the morpheme to the chain of the lexeme.
+        last = self._last_morpheme[lex_id]
+        if last == -1:
+            self._first_morpheme[lex_id] = m
+        else:
+            self._m_next[last] = m
+        self._last_morpheme[lex_id] = m
+
+    def morphemes(self, lex_id, annot_name, sort=False, position=None):
+        morphemes = self._layer_morphemes(lex_id, annot_name)
+        if morphemes is None:
+            return []
+
+        if position is not None:
+            if position < 0 or position >= len(self.form(lex_id)):
+                raise ValueError("Invalid position {} in lexeme {}; is out of bounds in the form".format(position, self.print_lexeme(lex_id)))
+
+            morphemes = [morpheme for morpheme in morphemes if position in morpheme.span]
+
+        if sort:
+            morphemes.sort(key=_span_sort_key)
+        return morphemes
+
+    def morpheme(self, lex_id, annot_name, position):
+        if position < 0 or position >= len(self.form(lex_id)):
+            raise ValueError("Invalid position {} in lexeme {}; is out of bounds in the form".format(position, self.print_lexeme(lex_id)))
+
+        for morpheme in self._layer_morphemes(lex_id, annot_name) or ():
+            if position in morpheme.span:
+                return morpheme
+
+        return None
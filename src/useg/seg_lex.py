@@ -1,10 +1,478 @@
-from collections import namedtuple
+from collections import OrderedDict, namedtuple
+from collections.abc import Set
+import heapq
+from itertools import chain
+from operator import itemgetter
+import pickle
+import sys
+import tempfile
 
 from useg import seg_tsv
 
 Lexeme = namedtuple("Lexeme", ["lex_id", "form", "lemma", "pos", "features", "morphemes"])
 Morpheme = namedtuple("Morpheme", ["span", "features"])
 
+class _DeletedLexeme:
+    """
+    A tombstone left in the slot of a deleted lexeme until the lexicon
+    is compacted. Accessing any property of the lexeme raises an
+    IndexError, the same as using an ID that was never assigned.
+    """
+
+    __slots__ = ("lex_id", )
+
+    def __init__(self, lex_id):
+        self.lex_id = lex_id
+
+    def __getattr__(self, name):
+        raise IndexError("Lexeme {} has been deleted".format(self.lex_id))
+
+class Span(Set):
+    """
+    An immutable set of integer positions in a word form, covered by
+    a morph. It behaves like a frozenset of the positions (it supports
+    membership tests, comparison with other sets, hashing etc.), but
+    it is much smaller and iterates over the positions in ascending
+    order.
+
+    Contiguous spans, which are the vast majority, are stored just as
+    their `start` (inclusive) and `end` (exclusive) positions. Other
+    spans additionally store a flat tuple of the bounds of their
+    contiguous runs.
+    """
+
+    __slots__ = ("_start", "_end", "_runs")
+
+    def __init__(self, positions=()):
+        if type(positions) is not list:
+            if isinstance(positions, Span):
+                self._start = positions._start
+                self._end = positions._end
+                self._runs = positions._runs
+                return
+            if isinstance(positions, range) and positions.step == 1:
+                self._set_contiguous(positions.start, positions.stop)
+                return
+            positions = list(positions)
+
+        if not positions:
+            self._set_contiguous(0, 0)
+        elif positions[-1] - positions[0] == len(positions) - 1 and positions == list(range(positions[0], positions[-1] + 1)):
+            # Already sorted and contiguous, which is the common case.
+            self._start = positions[0]
+            self._end = positions[-1] + 1
+            self._runs = None
+        else:
+            positions = sorted(set(positions))
+            runs = [positions[0]]
+            for last, position in zip(positions, positions[1:]):
+                if position != last + 1:
+                    runs.append(last + 1)
+                    runs.append(position)
+            runs.append(positions[-1] + 1)
+
+            self._start = runs[0]
+            self._end = runs[-1]
+            self._runs = tuple(runs) if len(runs) > 2 else None
+
+    def _set_contiguous(self, start, end):
+        if end <= start:
+            # Normalize all empty spans.
+            start = end = 0
+        self._start = start
+        self._end = end
+        self._runs = None
+
+    @classmethod
+    def contiguous(cls, start, end):
+        """
+        Create a span covering positions from `start` (inclusive) to
+        `end` (exclusive).
+        """
+        span = cls.__new__(cls)
+        span._set_contiguous(start, end)
+        return span
+
+    @property
+    def start(self):
+        """
+        The first position of the span.
+        """
+        return self._start
+
+    @property
+    def end(self):
+        """
+        The position just after the last position of the span.
+        """
+        return self._end
+
+    @property
+    def is_contiguous(self):
+        """
+        True if the span has no gaps.
+        """
+        return self._runs is None
+
+    def __contains__(self, position):
+        if self._runs is None:
+            return self._start <= position < self._end
+
+        runs = self._runs
+        for i in range(0, len(runs), 2):
+            if runs[i] <= position < runs[i + 1]:
+                return True
+        return False
+
+    def __iter__(self):
+        if self._runs is None:
+            return iter(range(self._start, self._end))
+
+        runs = self._runs
+        return chain.from_iterable(range(runs[i], runs[i + 1]) for i in range(0, len(runs), 2))
+
+    def __len__(self):
+        if self._runs is None:
+            return self._end - self._start
+
+        runs = self._runs
+        return sum(runs[i + 1] - runs[i] for i in range(0, len(runs), 2))
+
+    def __eq__(self, other):
+        if isinstance(other, Span):
+            return self._start == other._start and self._end == other._end and self._runs == other._runs
+        return Set.__eq__(self, other)
+
+    def __hash__(self):
+        # Must match the hash of an equal frozenset.
+        return hash(frozenset(self))
+
+    def __repr__(self):
+        if self._runs is None:
+            return "Span.contiguous({}, {})".format(self._start, self._end)
+        return "Span({})".format(list(self))
+
+    def __reduce__(self):
+        return (Span, (list(self), ))
+
+def _span_sort_key(morpheme):
+    """
+    Sort morphemes by their positions, in lexicographic order.
+    """
+    span = morpheme.span
+    if isinstance(span, Span):
+        # Spans iterate in sorted order already.
+        return tuple(span)
+    return tuple(sorted(span))
+
+def _split_form(form, morphemes):
+    """
+    Return the simple segmentation of the string `form` by the list of
+    `morphemes` as a list of strings, splitting the form wherever the
+    set of morphemes covering the position changes.
+    """
+    # Find out which morphemes (identified by their index in the
+    #  list) cover each position. This is done locally instead of using
+    #  `SegLex._position_table`, so that saving the whole lexicon doesn't
+    #  fill the position index.
+    covering = [[] for char in form]
+    for i, morpheme in enumerate(morphemes):
+        for position in morpheme.span:
+            covering[position].append(i)
+
+    # Split the form wherever the set of covering morphemes changes.
+    simple_seg = []
+    morph_str = ""
+    last_covering = covering[0] if covering else None
+    for char, covered_by in zip(form, covering):
+        if covered_by == last_covering:
+            morph_str += char
+        else:
+            last_covering = covered_by
+            simple_seg.append(morph_str)
+            morph_str = char
+
+    simple_seg.append(morph_str)
+    return simple_seg
+
+def _record_sort_key(record):
+    """
+    The order of records in saved files.
+    """
+    return (record.lemma, record.pos, record.form, record.simple_seg, len(record.annot))
+
+# The maximum number of position tables `SegLex._position_table` keeps;
+#  the least recently used ones are dropped when there are more.
+_position_index_size = 1024
+
+# The maximum number of sorted runs which `_sort_externally` keeps open
+#  and merges at once.
+_max_merged_runs = 64
+
+def _sort_externally(records, max_memory):
+    """
+    Sort `records` by `_record_sort_key` and return an iterator over
+    the formatted lines, keeping only about `max_memory` bytes of them
+    and their sort keys in memory. Sorted runs of the records are
+    written into temporary files, which are merged when the iterator
+    is consumed.
+
+    At most `_max_merged_runs` runs are merged at once. Whenever that
+    many runs of the same size class pile up, they are merged into a
+    single run of the next class, so the number of open files only
+    grows logarithmically with the number of records.
+
+    The sort is stable, just like `sorted`: runs are consecutive pieces
+    of `records`, each of them is sorted stably, runs are only merged
+    with their neighbours and `heapq.merge` prefers earlier runs when
+    keys are equal.
+    """
+    # The (size class, file) pairs of the runs, from the oldest one.
+    #  The size classes never increase along the list.
+    runs = []
+    buffer = []
+    buffer_size = 0
+
+    try:
+        for record in records:
+            line = seg_tsv.format_record(record, False)
+            key = _record_sort_key(record)
+            buffer.append((key, line))
+            buffer_size += _item_size(key, line)
+
+            if buffer_size >= max_memory:
+                buffer.sort(key=itemgetter(0))
+                runs.append((0, _write_run(buffer)))
+                buffer = []
+                buffer_size = 0
+
+                while len(runs) >= _max_merged_runs and runs[-_max_merged_runs][0] == runs[-1][0]:
+                    size_class = runs[-1][0]
+                    merged = _merge_runs([run for size_class, run in runs[-_max_merged_runs:]])
+                    del runs[-_max_merged_runs:]
+                    runs.append((size_class + 1, _write_run(merged)))
+
+        # Runs of different size classes may still be too many to be
+        #  merged at once, so merge the oldest ones first.
+        runs = [run for size_class, run in runs]
+        while len(runs) >= _max_merged_runs:
+            merged = _merge_runs(runs[:_max_merged_runs])
+            runs[:_max_merged_runs] = [_write_run(merged)]
+    except BaseException:
+        for run in runs:
+            (run[1] if isinstance(run, tuple) else run).close()
+        raise
+
+    buffer.sort(key=itemgetter(0))
+    merged = heapq.merge(*[_read_run(run) for run in runs], buffer, key=itemgetter(0))
+    return map(itemgetter(1), merged)
+
+def _item_size(key, line):
+    """
+    Return the approximate memory taken by the `line` and its sort `key`
+    in the buffer of `_sort_externally`.
+    """
+    lemma, pos, form, simple_seg, annot_len = key
+    return (sys.getsizeof(line) + sys.getsizeof(key) + sys.getsizeof(lemma)
+            + sys.getsizeof(pos) + sys.getsizeof(form) + sys.getsizeof(simple_seg)
+            + sum([sys.getsizeof(morph) for morph in simple_seg]) + 64)
+
+def _merge_runs(runs):
+    """
+    Merge the temporary files `runs` in order into an iterator over their
+    (key, line) pairs, closing them once they are exhausted.
+    """
+    return heapq.merge(*[_read_run(run) for run in runs], key=itemgetter(0))
+
+def _write_run(items):
+    """
+    Write the sorted (key, line) pairs from the iterable `items` into
+    a temporary file. Return the file, rewound to its beginning.
+    """
+    run = tempfile.TemporaryFile()
+    try:
+        for item in items:
+            pickle.dump(item, run, pickle.HIGHEST_PROTOCOL)
+        run.seek(0)
+    except BaseException:
+        run.close()
+        raise
+    return run
+
+def _read_run(run):
+    """
+    Iterate over the (key, line) pairs stored in the temporary file
+    `run` by `_write_run`, closing (and thus deleting) it at the end.
+    """
+    with run:
+        while True:
+            try:
+                yield pickle.load(run)
+            except EOFError:
+                return
+
+def _parse_line_checked(line, interner=None):
+    """
+    Parse `line` using `seg_tsv.parse_line` and check that it can be
+    loaded into a lexicon.
+    """
+    record = seg_tsv.parse_line(line, interner)
+    if "segmentation" in record.annot and "annot_name" not in record.annot:
+        # Unnamed segmentation. Reject it.
+        raise ValueError("Line '{}' has unnamed segmentation".format(line))
+    return record
+
+def _hashable(value):
+    """
+    Convert a JSON-like `value` (such as the features of a lexeme) into
+    a hashable object which compares equal for equal values.
+    """
+    if isinstance(value, dict):
+        return frozenset([(k, v if isinstance(v, str) else _hashable(v)) for k, v in value.items()])
+    if isinstance(value, list):
+        return tuple([v if isinstance(v, str) else _hashable(v) for v in value])
+    return value
+
+def merge_key(form, lemma, pos, features):
+    """
+    Return the key of a lexeme with the given properties, under which
+    `SegLex.load` looks for lexemes to merge segmentations into; see
+    `LexemeMerger`.
+    """
+    return (form, lemma, pos, _hashable(features))
+
+class LexemeMerger:
+    """
+    Decide which lexeme each record read from a file belongs to, as
+    `SegLex.load` does when merging the segmentations of a lexeme, which
+    are saved as separate records. Use it to process files record by
+    record in the same way, without loading them.
+
+    The lexemes are represented by arbitrary handles, added using `add`
+    under their `merge_key`. `is_candidate(handle, annot_name)` must
+    return True if a segmentation named `annot_name` may be added to
+    the lexeme, i.e. if the lexeme is already segmented, but not on
+    that annotation layer. The layers of the lexemes may only grow.
+    """
+
+    __slots__ = ("_is_candidate", "_candidates", "_cursors")
+
+    def __init__(self, is_candidate):
+        self._is_candidate = is_candidate
+        self._candidates = {}
+        self._cursors = {}
+
+    @staticmethod
+    def split_record(record):
+        """
+        Return the lexeme features, the annotation name and the list of
+        morphemes of the SegRecord `record`. The name is None if the
+        record has no segmentation, not even an empty one.
+        """
+        features = {k: v for k, v in record.annot.items() if k not in {"annot_name", "segmentation"}}
+
+        if "segmentation" in record.annot:
+            return features, record.annot["annot_name"], record.annot["segmentation"]
+        else:
+            return features, None, []
+
+    def add(self, key, lexeme):
+        """
+        Add the `lexeme` handle with the `key` given by `merge_key`, after
+        all lexemes added before.
+        """
+        if key in self._candidates:
+            self._candidates[key].append(lexeme)
+        else:
+            self._candidates[key] = [lexeme]
+
+    def target(self, key, annot_name):
+        """
+        Return the handle of the lexeme that a segmentation named
+        `annot_name` of a record with the `key` should be added to, or
+        None if a new lexeme should be created for it.
+
+        The target is the first lexeme with the same `key` which is
+        already segmented, but not on the `annot_name` layer. A record
+        without any segmentation (`annot_name` is None) is never merged
+        with others, because that is how `SegLex.save` writes out
+        unsegmented lexemes.
+
+        The layers of a lexeme only ever grow, so once a lexeme stops
+        being a valid target for `annot_name`, it never becomes one
+        again. Therefore, we remember the position of the first
+        possibly-valid candidate for each (key, annot_name) and never
+        re-examine the ones before it, making the lookup amortized O(1).
+        """
+        if annot_name is None:
+            return None
+
+        candidates = self._candidates.get(key)
+        if candidates is None:
+            return None
+
+        cursor_key = (key, annot_name)
+        cursor = self._cursors.get(cursor_key, 0)
+        while cursor < len(candidates):
+            if self._is_candidate(candidates[cursor], annot_name):
+                # This is another segmentation of an existing lexeme.
+                break
+            cursor += 1
+        self._cursors[cursor_key] = cursor
+
+        if cursor < len(candidates):
+            return candidates[cursor]
+        else:
+            return None
+
+    def clear(self):
+        """
+        Forget all lexemes added so far.
+        """
+        self._candidates.clear()
+        self._cursors.clear()
+
+def _copy_features(value):
+    """
+    Return a deep copy of the JSON-like `value`.
+    """
+    if isinstance(value, dict):
+        return {k: v if isinstance(v, str) else _copy_features(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [v if isinstance(v, str) else _copy_features(v) for v in value]
+    return value
+
+def _bulk_morphemes(form, morphemes, spans):
+    """
+    Convert the morphemes of a row passed to `SegLex.add_lexemes_bulk`
+    to Morpheme objects, checking that they fit into `form`. Contiguous
+    spans are shared through the dict `spans`.
+    """
+    length = len(form)
+    result = []
+    append = result.append
+    for morpheme in morphemes:
+        if len(morpheme) == 3:
+            start, end, features = morpheme
+            span = spans.get((start, end))
+            if span is None:
+                span = Span.contiguous(start, end)
+                spans[start, end] = span
+        else:
+            span, features = morpheme
+            span = Span(span)
+            start, end = span._start, span._end
+
+        if start < end and (start < 0 or end > length):
+            raise ValueError(
+                "Morpheme span position {} is out-of-bounds in form '{}'".format(
+                    start if start < 0 else end - 1,
+                    form
+                )
+            )
+        append(Morpheme(span, {} if features is None else features))
+    return result
+
 class SegLex:
     """
     A lexicon of segmentations.
@@ -12,21 +480,45 @@ class SegLex:
     Lexemes are identified using their IDs. Each lexeme has a string
     form, which can be subdivided into morph(eme)s. Multiple alternative
     subdivisions are possible, each identified by an annotation name.
+
+    The `storage` argument selects how the lexicon is kept in memory.
+    The default, "objects", stores each lexeme and morpheme as a Python
+    object. "columnar" stores them in interned, array-backed columns,
+    which uses a fraction of the memory, but is somewhat slower and
+    creates new morpheme objects on each query; see
+    `useg.seg_columnar.ColumnarSegLex` for details.
     """
 
-    __slots__ = ("_lexemes", "_poses", "_forms")
+    __slots__ = ("_lexemes", "_poses", "_forms", "_position_index")
 
-    def __init__(self):
+    def __new__(cls, storage="objects", *args, **kwargs):
+        if cls is SegLex and storage != "objects":
+            if storage == "columnar":
+                # Imported here, because seg_columnar imports this module.
+                from useg.seg_columnar import ColumnarSegLex
+                cls = ColumnarSegLex
+            else:
+                raise ValueError("Unknown SegLex storage '{}'".format(storage))
+        return super().__new__(cls)
+
+    def __init__(self, storage="objects"):
+        # Lexemes indexed by their IDs. Deleted ones are replaced by
+        #  tombstones until `compact` is called.
         self._lexemes = []
         self._poses = {}
         self._forms = {}
+        # Lists of morphemes covering each position of a form, keyed by
+        #  (lex_id, annot_name). Built lazily by `_position_table` and
+        #  kept only for the recently queried lexemes.
+        self._position_index = OrderedDict()
 
     def load(self, f):
         """
         Load the lexicon from `f`, which is either an open file-like
         object open for reading text or a string filename, and add all
         information contained therein to the internal lexicon of this
-        object.
+        object. Files with the extensions .gz, .xz, .bz2 and .zst are
+        decompressed transparently.
         """
 
         # If f is a filename, we open the file ourselves and therefore
@@ -37,78 +529,102 @@ class SegLex:
         try:
             if isinstance(f, str):
                 close_at_end = True
-                actual_f = open(f, "rt", encoding="utf-8")
+                actual_f = seg_tsv.open_file(f, "rt")
             else:
                 # We assume f is already an open file object.
                 actual_f = f
 
-            for line in actual_f:
-                record = seg_tsv.parse_line(line)
-                features = {k: v for k, v in record.annot.items() if k not in {"annot_name", "segmentation"}}
-
-                if "segmentation" in record.annot:
-                    if "annot_name" not in record.annot:
-                        # Unnamed segmentation. Reject it.
-                        raise ValueError("Line '{}' has unnamed segmentation".format(line))
+            # Share a single copy of each repeated string (lemmas, POS
+            #  tags, feature names and values etc.) between the lexemes.
+            interner = seg_tsv.Interner()
 
-                    annot_name = record.annot["annot_name"]
-                    segmentation = record.annot["segmentation"]
-                else:
-                    segmentation = []
-
-                for existing_lexeme in self.iter_lexemes(record.form, record.lemma, record.pos):
-                    existing_annot_names = self.annot_names(existing_lexeme)
-                    if existing_annot_names \
-                       and annot_name not in existing_annot_names \
-                       and self.features(existing_lexeme) == features:
-                        # This is another segmentation of an existing lexeme.
-                        # Avoid adding the lexeme, just add the segmentation.
-                        lexeme = existing_lexeme
-                        break
-                else:
-                    lexeme = self.add_lexeme(record.form, record.lemma, record.pos, features)
-
-                for segment in segmentation:
-                    span = segment["span"]
-                    del segment["span"]
-                    self.add_morpheme(lexeme, annot_name, span, segment)
+            self._add_records(_parse_line_checked(line, interner) for line in actual_f)
         finally:
             if actual_f is not None and close_at_end:
                 actual_f.close()
 
-    def _simple_seg(self, lex_id, annot_name):
-        simple_seg = []
-        last_morphemes = self.morphemes(lex_id, annot_name, sort=False, position=0)
-        morph_str = ""
-        for i, char in enumerate(self.form(lex_id)):
-            morphemes = self.morphemes(lex_id, annot_name, sort=False, position=i)
+    def _add_records(self, records):
+        """
+        Add the SegRecords from the iterable `records` to the lexicon,
+        merging segmentations of the same lexeme. Used by `load`.
+        """
+        # To save time, only forms that occur more than once are
+        #  indexed in the merger.
+        merger = LexemeMerger(self._is_merge_candidate)
+        indexed_forms = set()
+
+        for record in records:
+            features, annot_name, segmentation = LexemeMerger.split_record(record)
+
+            if self._has_form(record.form):
+                if record.form not in indexed_forms:
+                    indexed_forms.add(record.form)
+                    for lex_id in self.iter_lexemes(form=record.form):
+                        merger.add(self._merge_key(lex_id), lex_id)
+
+                key = merge_key(record.form, record.lemma, record.pos, features)
+                lexeme = merger.target(key, annot_name)
+                if lexeme is None:
+                    lexeme = self.add_lexeme(record.form, record.lemma, record.pos, features)
+                    merger.add(key, lexeme)
+            else:
+                # The form is new, there is nothing to merge with.
+                lexeme = self.add_lexeme(record.form, record.lemma, record.pos, features)
 
-            morpheme_lists_identical = True
+            for segment in segmentation:
+                span = segment["span"]
+                del segment["span"]
+                self.add_morpheme(lexeme, annot_name, span, segment)
 
-            if len(morphemes) != len(last_morphemes):
-                morpheme_lists_identical = False
-            else:
-                # Check the morpheme lists item by item for equality.
-                for morpheme, last_morpheme in zip(morphemes, last_morphemes):
-                    if morpheme is not last_morpheme:
-                        morpheme_lists_identical = False
-                        break
-
-            if morpheme_lists_identical:
-                morph_str += char
-            else:
-                last_morphemes = morphemes
-                simple_seg.append(morph_str)
-                morph_str = char
+    def _has_form(self, form):
+        """
+        Return True if there is a lexeme with the string form `form`.
+        """
+        lexemes = self._lexemes
+        return any(type(lexemes[lex_id]) is not _DeletedLexeme for lex_id in self._forms.get(form, ()))
+
+    def _merge_key(self, lex_id):
+        """
+        Return the key under which `load` looks up lexeme `lex_id` when
+        merging segmentations into it.
+        """
+        lexeme = self._lexemes[lex_id]
+        return merge_key(lexeme.form, lexeme.lemma, lexeme.pos, lexeme.features)
+
+    def _is_merge_candidate(self, lex_id, annot_name):
+        """
+        Return True if `load` may add a segmentation named `annot_name`
+        to lexeme `lex_id`, i.e. if the lexeme is already segmented, but
+        not on that annotation layer.
+        """
+        morphemes = self._lexemes[lex_id].morphemes
+        return bool(morphemes) and annot_name not in morphemes
 
-        simple_seg.append(morph_str)
-        return simple_seg
+    def _lexeme_features(self, lex_id):
+        """
+        Return the features of lexeme `lex_id` for reading only.
+        """
+        return self._lexemes[lex_id].features
+
+    def _layers(self, lex_id):
+        """
+        Return a dict mapping annotation names of lexeme `lex_id` to the
+        lists of their morphemes, in the order they were added. Don't
+        modify it.
+        """
+        return self._lexemes[lex_id].morphemes
+
+    def _simple_seg(self, lex_id, annot_name):
+        return _split_form(self.form(lex_id), self.morphemes(lex_id, annot_name))
 
     def _as_records(self):
         """
         Iterate over the lexicon as a sequence of SegRecords (not sorted).
         """
         for lexeme in self._lexemes:
+            if type(lexeme) is _DeletedLexeme:
+                continue
+
             if not lexeme.morphemes:
                 # Return a lexeme with no records in it, because the
                 #  loop below is not going to execute.
@@ -131,18 +647,33 @@ class SegLex:
 
                 yield seg_tsv.SegRecord(lexeme.form, lexeme.lemma, lexeme.pos, simple_seg, annot)
 
-    def save(self, f):
+    def save(self, f, sort=True, max_memory=None):
         """
         Save the lexicon to `f`, which is either an open file-like
         object open for writing or appending text, or a string filename.
+        Files with the extensions .gz, .xz, .bz2 and .zst are compressed
+        transparently.
+
+        The records are sorted before saving, which normally happens in
+        memory. If `max_memory` is set, only about that many bytes of
+        formatted records are sorted in memory at once and the sorted
+        runs are spilled into temporary files, which are then merged.
+        The output is the same in both cases.
+
+        If `sort` is False, the lexemes are written out in the order they
+        were added to the lexicon, each as soon as it is formatted, which
+        takes no extra memory. `max_memory` is ignored in that case.
         """
         # Sort the lexicon and iterate over it, producing the TSV output.
         # TODO include the keys and values of features in the sorting as
         #  well.
-        records = sorted(
-            self._as_records(),
-            key=lambda r: (r.lemma, r.pos, r.form, r.simple_seg, len(r.annot))
-        )
+        if not sort:
+            lines = (seg_tsv.format_record(record, False) for record in self._as_records())
+        elif max_memory is None:
+            records = sorted(self._as_records(), key=_record_sort_key)
+            lines = (seg_tsv.format_record(record, False) for record in records)
+        else:
+            lines = _sort_externally(self._as_records(), max_memory)
 
         # If f is a filename, we open the file ourselves and therefore
         #  should also close it after writing to it.
@@ -152,13 +683,13 @@ class SegLex:
         try:
             if isinstance(f, str):
                 close_at_end = True
-                actual_f = open(f, "wt", encoding="utf-8", newline="\n")
+                actual_f = seg_tsv.open_file(f, "wt")
             else:
                 # We assume f is already an open file object.
                 actual_f = f
 
-            for record in records:
-                actual_f.write(seg_tsv.format_record(record, False))
+            for line in lines:
+                actual_f.write(line)
 
         finally:
             if actual_f is not None:
@@ -166,6 +697,99 @@ class SegLex:
                 if close_at_end:
                     actual_f.close()
 
+    def save_binary(self, f):
+        """
+        Save the lexicon to `f`, which is either a file-like object open
+        for writing bytes, or a string filename, in the binary format
+        described in `useg.seg_bin`. Such files are much faster to load
+        using `load_binary` than the TSV files.
+
+        Lexemes are saved in the order of their IDs. Forms, lemmas, POS
+        tags and annotation names must be strings.
+        """
+        # Imported here, because seg_bin imports this module.
+        from useg import seg_bin
+
+        if isinstance(f, str):
+            with open(f, "wb") as actual_f:
+                seg_bin.write_binary(self, actual_f)
+        else:
+            seg_bin.write_binary(self, f)
+            f.flush()
+
+    def load_binary(self, f):
+        """
+        Load the lexicon from `f`, which is either a file-like object open
+        for reading bytes, or a string filename, in the binary format
+        written by `save_binary`. The lexemes are added to this lexicon
+        as they are, with new IDs, without merging them into existing
+        lexemes.
+        """
+        from useg import seg_bin
+
+        if isinstance(f, str):
+            with open(f, "rb") as actual_f:
+                data = actual_f.read()
+        else:
+            data = f.read()
+
+        self._add_binary(seg_bin.read_binary(data))
+
+    def _add_binary(self, data):
+        """
+        Add all lexemes of the `useg.seg_bin.BinaryData` `data`.
+        """
+        from useg.seg_bin import LEXEME_FIELDS, MORPHEME_FIELDS
+
+        strings = data.strings
+        lexemes = data.lexemes.tolist()
+        morphemes = data.morphemes.tolist()
+
+        # Decode each distinct features string once. The decoded dict is
+        #  handed out to the first lexeme or morpheme which uses it and
+        #  copied for the others; nothing modifies it before that. Flat
+        #  dicts are copied shallowly, nested ones are decoded again,
+        #  which is faster than copying them deeply.
+        decode_json = seg_tsv.decode_json
+        decoded_features = {}
+        def features_of(string_id):
+            decoded = decoded_features.get(string_id)
+            if decoded is None:
+                value = decode_json(strings[string_id])
+                flat = all(not isinstance(v, (dict, list)) for v in value.values())
+                decoded_features[string_id] = value if flat else False
+                return value
+            if decoded is False:
+                return decode_json(strings[string_id])
+            return dict(decoded)
+
+        # Spans are immutable, so equal ones can be shared.
+        spans = {}
+
+        append_lexeme = self._lexemes.append
+        index_lexeme = self._index_lexeme
+        for i in range(0, len(lexemes), LEXEME_FIELDS):
+            form_id, lemma_id, pos_id, features_id, first_morpheme, morpheme_count = lexemes[i:i + LEXEME_FIELDS]
+            layers = {}
+            first = MORPHEME_FIELDS * first_morpheme
+            for m in range(first, first + MORPHEME_FIELDS * morpheme_count, MORPHEME_FIELDS):
+                annot_id, m_features_id, start, end = morphemes[m:m + MORPHEME_FIELDS]
+                span = spans.get((start, end))
+                if span is None:
+                    span = data.span(start, end)
+                    spans[start, end] = span
+                morpheme = Morpheme(span, features_of(m_features_id))
+
+                annot_name = strings[annot_id]
+                if annot_name in layers:
+                    layers[annot_name].append(morpheme)
+                else:
+                    layers[annot_name] = [morpheme]
+
+            lex_id = len(self._lexemes)
+            form, lemma, pos = strings[form_id], strings[lemma_id], strings[pos_id]
+            append_lexeme(Lexeme(lex_id, form, lemma, pos, features_of(features_id), layers))
+            index_lexeme(lex_id, form, lemma, pos)
 
     def add_lexeme(self, form, lemma, pos, features=None):
         """
@@ -178,8 +802,46 @@ class SegLex:
         lex_id = len(self._lexemes)
         lexeme = Lexeme(lex_id, form, lemma, pos, features, {})
         self._lexemes.append(lexeme)
+        self._index_lexeme(lex_id, form, lemma, pos)
+
+        return lex_id
+
+    def add_lexemes_bulk(self, rows, annot_name):
+        """
+        Create many lexemes together with their segmentation, which is
+        much faster than adding them and their morphemes one by one.
+        Each of the `rows` is a tuple of the form, lemma, POS tag,
+        features (or None) and a list of morphemes to add on annotation
+        layer `annot_name`. A morpheme is either a tuple of its start,
+        end and features, as in `add_contiguous_morpheme`, or a tuple of
+        its span and features, as in `add_morpheme`.
+
+        Returns a list of IDs of the created lexemes. If a row contains
+        an out-of-bounds morpheme, a ValueError is raised and neither
+        it nor the following rows are added.
+        """
+        spans = {}
+        add_bulk_row = self._add_bulk_row
+        return [add_bulk_row(form, lemma, pos, features, annot_name, _bulk_morphemes(form, morphemes, spans))
+                for form, lemma, pos, features, morphemes in rows]
+
+    def _add_bulk_row(self, form, lemma, pos, features, annot_name, morphemes):
+        """
+        Add a lexeme with a list of already checked `morphemes`. Returns
+        the ID of the lexeme.
+        """
+        lex_id = len(self._lexemes)
+        if features is None:
+            features = {}
+        layers = {annot_name: morphemes} if morphemes else {}
+        self._lexemes.append(Lexeme(lex_id, form, lemma, pos, features, layers))
+        self._index_lexeme(lex_id, form, lemma, pos)
+        return lex_id
 
-        # Add the lexeme to the lookup dicts.
+    def _index_lexeme(self, lex_id, form, lemma, pos):
+        """
+        Add the lexeme `lex_id` to the lookup dicts.
+        """
         if pos in self._poses:
             if lemma in self._poses[pos]:
                 self._poses[pos][lemma].append(lex_id)
@@ -193,8 +855,6 @@ class SegLex:
         else:
             self._forms[form] = [lex_id]
 
-        return lex_id
-
     def iter_lexemes(self, form=None, lemma=None, pos=None):
         """
         Find all lexemes with the specified properties. If neither
@@ -203,11 +863,18 @@ class SegLex:
 
         Return an iterator over IDs of matching lexemes.
         """
+        # The lookup dicts still contain deleted lexemes until `compact`
+        #  is called, so they are skipped here. They are checked only
+        #  when they are reached, so that the caller can delete lexemes
+        #  while iterating.
+        lexemes = self._lexemes
+
         if form is not None:
             # Use the `form` dict for lookup.
             if form in self._forms:
                 for lex_id in self._forms[form]:
-                    if (lemma is None or self.lemma(lex_id) == lemma) \
+                    if type(lexemes[lex_id]) is not _DeletedLexeme \
+                       and (lemma is None or self.lemma(lex_id) == lemma) \
                        and (pos is None or self.pos(lex_id) == pos):
                         yield lex_id
 
@@ -216,10 +883,11 @@ class SegLex:
         # `form` is None, so use the `pos` dict for lookup.
 
         if pos is None and lemma is None:
-            # No constraints specified, iterate over the whole lexicon.
-            # TODO when deleting lexemes, what happens to the
-            #  slot in the _lexemes?
-            yield from range(len(self._lexemes))
+            # No constraints specified, iterate over the whole lexicon,
+            #  skipping the slots of deleted lexemes.
+            for lex_id, lexeme in enumerate(lexemes):
+                if type(lexeme) is not _DeletedLexeme:
+                    yield lex_id
             return
 
         # Either POS or lemma is specified. Find all applicable POSes
@@ -235,20 +903,77 @@ class SegLex:
         if lemma is None:
             # Yield all lexemes with the specified POS.
             for lemmas in poses:
-                for lexemes in lemmas.values():
-                    yield from lexemes
+                for lex_ids in lemmas.values():
+                    for lex_id in lex_ids:
+                        if type(lexemes[lex_id]) is not _DeletedLexeme:
+                            yield lex_id
         else:
             # We have a dictionary for the applicable part-of-speech and
             #  a given lemma to search for.
             for lemmas in poses:
                 if lemma in lemmas:
-                    yield from lemmas[lemma]
+                    for lex_id in lemmas[lemma]:
+                        if type(lexemes[lex_id]) is not _DeletedLexeme:
+                            yield lex_id
 
     def delete_lexeme(self, lex_id):
         """
         Deletes the lexeme with the specified ID from the lexicon.
+
+        The lexeme's slot is kept as a tombstone, so that the IDs of
+        other lexemes don't change; call `compact` to reclaim it.
         """
-        raise NotImplementedError()
+        self.delete_lexemes((lex_id, ))
+
+    def delete_lexemes(self, lex_ids):
+        """
+        Delete all lexemes with IDs in the iterable `lex_ids`. If any of
+        them is invalid, none are deleted.
+
+        Each deletion takes constant time: the lexeme is replaced by
+        a tombstone, which lookups skip, and it is only removed from the
+        lookup dicts by `compact`. Lexemes can be deleted while iterating
+        over them using `iter_lexemes()`; the deleted ones are skipped.
+        """
+        lexemes = {}
+        for lex_id in lex_ids:
+            if lex_id < 0:
+                raise IndexError("Invalid lexeme ID {}".format(lex_id))
+            lexeme = self._lexemes[lex_id]
+            if type(lexeme) is _DeletedLexeme:
+                raise IndexError("Lexeme {} has already been deleted".format(lex_id))
+            lexemes[lex_id] = lexeme
+
+        for lex_id, lexeme in lexemes.items():
+            self._lexemes[lex_id] = _DeletedLexeme(lex_id)
+            for annot_name in lexeme.morphemes:
+                self._position_index.pop((lex_id, annot_name), None)
+
+    def compact(self):
+        """
+        Reclaim the memory of deleted lexemes by removing their slots.
+        This changes the IDs of the lexemes after them, so it returns
+        a list mapping the old IDs to the new ones, with None for the
+        deleted lexemes.
+        """
+        new_ids = []
+        lexemes = []
+        for lexeme in self._lexemes:
+            if type(lexeme) is _DeletedLexeme:
+                new_ids.append(None)
+            else:
+                new_ids.append(len(lexemes))
+                lexemes.append(lexeme._replace(lex_id=len(lexemes)))
+
+        self._lexemes = lexemes
+        self._poses = {}
+        self._forms = {}
+        for lexeme in lexemes:
+            self._index_lexeme(lexeme.lex_id, lexeme.form, lexeme.lemma, lexeme.pos)
+        self._position_index = OrderedDict(((new_ids[lex_id], annot_name), table)
+                                           for (lex_id, annot_name), table in self._position_index.items())
+
+        return new_ids
 
     def form(self, lex_id):
         """
@@ -307,7 +1032,7 @@ class SegLex:
         annotation `features` is saved together with the newly-created
         morpheme.
         """
-        self.add_morpheme(lex_id, annot_name, list(range(start, end)), features)
+        self.add_morpheme(lex_id, annot_name, range(start, end), features)
 
     def add_morpheme(self, lex_id, annot_name, span, features=None):
         """
@@ -318,15 +1043,14 @@ class SegLex:
         """
 
         # Check that the morpheme span actually exists in the lexeme.
-        span = frozenset(span)
-        for pos in span:
-            if pos < 0 or pos >= len(self.form(lex_id)):
-                raise ValueError(
-                    "Morpheme span position {} is out-of-bounds in lexeme {}".format(
-                        pos,
-                        self.print_lexeme(lex_id)
-                    )
+        span = Span(span)
+        if span and (span.start < 0 or span.end > len(self.form(lex_id))):
+            raise ValueError(
+                "Morpheme span position {} is out-of-bounds in lexeme {}".format(
+                    span.start if span.start < 0 else span.end - 1,
+                    self.print_lexeme(lex_id)
                 )
+            )
 
         if features is None:
             features = {}
@@ -339,6 +1063,12 @@ class SegLex:
         else:
             self._lexemes[lex_id].morphemes[annot_name].append(morpheme)
 
+        # Keep the position index up to date, if it was already built.
+        table = self._position_index.get((lex_id, annot_name))
+        if table is not None:
+            for pos in span:
+                table[pos].append(morpheme)
+
     def add_morphemes_from_list(self, lex_id, annot_name, morphemes):
         """
         If `morphemes` is a list of morph strings which, when
@@ -385,7 +1115,7 @@ class SegLex:
             # Return a copy to prevent accidental mangling.
             morphemes = self._lexemes[lex_id].morphemes[annot_name]
             if sort:
-                return sorted(morphemes, key=lambda morpheme: tuple(sorted(morpheme.span)))
+                return sorted(morphemes, key=_span_sort_key)
             else:
                 return list(morphemes)
         else:
@@ -393,13 +1123,10 @@ class SegLex:
             if position < 0 or position >= len(self.form(lex_id)):
                 raise ValueError("Invalid position {} in lexeme {}; is out of bounds in the form".format(position, self.print_lexeme(lex_id)))
 
-            m = []
-            for morpheme in self._lexemes[lex_id].morphemes[annot_name]:
-                if position in morpheme.span:
-                    m.append(morpheme)
+            m = list(self._position_table(lex_id, annot_name)[position])
 
             if sort:
-                return sorted(m, key=lambda morpheme: tuple(sorted(morpheme.span)))
+                return sorted(m, key=_span_sort_key)
             else:
                 return m
 
@@ -414,19 +1141,46 @@ class SegLex:
             raise ValueError("Invalid position {} in lexeme {}; is out of bounds in the form".format(position, self.print_lexeme(lex_id)))
 
         if annot_name in self._lexemes[lex_id].morphemes:
-            for morpheme in self._lexemes[lex_id].morphemes[annot_name]:
-                if position in morpheme.span:
-                    return morpheme
+            morphemes = self._position_table(lex_id, annot_name)[position]
+            if morphemes:
+                return morphemes[0]
 
         return None
 
+    def _position_table(self, lex_id, annot_name):
+        """
+        Return a list with an item for each position of the form of
+        lexeme `lex_id`, containing the list of morphemes on annotation
+        layer `annot_name` which cover that position, in the order they
+        were added. The table is built on the first call and then kept
+        up to date by `add_morpheme`, until it is one of the least
+        recently used when there are more than `_position_index_size`
+        of them; don't modify it.
+        """
+        key = (lex_id, annot_name)
+        position_index = self._position_index
+        table = position_index.get(key)
+        if table is None:
+            table = [[] for char in self.form(lex_id)]
+            for morpheme in self._lexemes[lex_id].morphemes.get(annot_name, ()):
+                for position in morpheme.span:
+                    table[position].append(morpheme)
+            position_index[key] = table
+            if len(position_index) > _position_index_size:
+                position_index.popitem(last=False)
+        else:
+            position_index.move_to_end(key)
+        return table
+
     @staticmethod
     def morpheme_to_string(morpheme, form):
         """
         Return the string form of the morph of morpheme `morpheme` as
         found in lexeme with word form `form`.
         """
-        if morpheme.span:
+        if isinstance(morpheme.span, Span) and morpheme.span.is_contiguous:
+            return form[morpheme.span.start:morpheme.span.end]
+        elif morpheme.span:
             span = sorted(morpheme.span)
 
             last_idx = span[0]
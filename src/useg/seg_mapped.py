@@ -0,0 +1,252 @@
+from bisect import bisect_left, bisect_right
+import mmap
+
+from useg import seg_bin, seg_tsv
+from useg.seg_bin import LEXEME_FIELDS, MORPHEME_FIELDS
+from useg.seg_lex import SegLex, Morpheme, _span_sort_key, _split_form
+
+class MappedSegLex(SegLex):
+    """
+    A read-only lexicon, which answers queries directly from a binary
+    file written by `SegLex.save_binary`, memory-mapped into the process.
+    Opening it takes almost no time regardless of the size of the file,
+    only the pages actually queried are read from disk, and all
+    processes which map the same file share a single copy of it in
+    memory.
+
+    The API is the same as that of SegLex, with these differences:
+     - All methods which modify the lexicon raise a TypeError.
+     - Strings, features and morphemes are decoded from the file on each
+       query, so the returned objects are new every time and changes to
+       them are not stored.
+
+    Close the lexicon using `close` or by using it as a context manager
+    to unmap the file.
+    """
+
+    __slots__ = (
+        "_mmap", "_views", "_strings",
+        "_lex", "_morphs", "_runs",
+        "_by_form", "_by_pos", "_pos_index", "_lemma_index",
+    )
+
+    def __init__(self, filename):
+        with open(filename, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        sections = seg_bin.read_sections(self._mmap)
+        for name in ("strings", "lexemes", "morphs", "runs", "byform", "bypos", "posidx", "lemmaidx"):
+            if name not in sections:
+                raise ValueError("Binary USeg file '{}' is missing the {} section".format(filename, name))
+
+        self._strings = seg_bin.StringTable(sections["strings"])
+        self._lex = sections["lexemes"].cast("I")
+        self._morphs = sections["morphs"].cast("I")
+        self._runs = sections["runs"].cast("I")
+        self._by_form = sections["byform"].cast("I")
+        self._by_pos = sections["bypos"].cast("I")
+        self._lemma_index = sections["lemmaidx"].cast("I")
+        self._views = list(sections.values()) + [self._lex, self._morphs, self._runs, self._by_form, self._by_pos, self._lemma_index]
+
+        # There are only a few POS tags, so their index is read whole.
+        #  It maps string IDs of POS tags to (start, end) in `_by_pos`,
+        #  in the order the POS tags first occur.
+        pos_index = sections["posidx"].cast("I").tolist()
+        self._pos_index = {pos_index[i]: (pos_index[i + 1], pos_index[i + 2]) for i in range(0, len(pos_index), 3)}
+
+    def close(self):
+        """
+        Unmap the file. The lexicon can't be used afterwards.
+        """
+        if self._mmap.closed:
+            return
+        self._strings.release()
+        for view in self._views:
+            view.release()
+        self._views = []
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("MappedSegLex is read-only")
+
+    load = _read_only
+    load_binary = _read_only
+    add_lexeme = _read_only
+    add_lexemes_bulk = _read_only
+    delete_lexeme = _read_only
+    delete_lexemes = _read_only
+    compact = _read_only
+    add_morpheme = _read_only
+
+    def _lexeme_count(self):
+        return len(self._lex) // LEXEME_FIELDS
+
+    def _morpheme_range(self, lex_id):
+        """
+        Return the range of indices of the morphemes of lexeme `lex_id`
+        in the morphs section.
+        """
+        first = self._lex[lex_id * LEXEME_FIELDS + 4]
+        count = self._lex[lex_id * LEXEME_FIELDS + 5]
+        return range(first, first + count)
+
+    def _make_morpheme(self, m):
+        """
+        Create a Morpheme object for the morpheme with index `m`.
+        """
+        morphs = self._morphs
+        offset = m * MORPHEME_FIELDS
+        span = seg_bin.make_span(self._runs, morphs[offset + 2], morphs[offset + 3])
+        return Morpheme(span, seg_tsv.decode_json(self._strings[morphs[offset + 1]]))
+
+    def _layer_morphemes(self, lex_id, annot_name):
+        """
+        Return the list of morphemes of lexeme `lex_id` on layer
+        `annot_name`, in the order they were added.
+        """
+        morpheme_range = self._morpheme_range(lex_id)
+        annot_id = self._strings.find(annot_name)
+        if annot_id is None:
+            return []
+
+        morphs = self._morphs
+        return [self._make_morpheme(m) for m in morpheme_range if morphs[m * MORPHEME_FIELDS] == annot_id]
+
+    def _lexeme_features(self, lex_id):
+        return self.features(lex_id)
+
+    def _layers(self, lex_id):
+        strings = self._strings
+        morphs = self._morphs
+        layers = {}
+        for m in self._morpheme_range(lex_id):
+            annot_name = strings[morphs[m * MORPHEME_FIELDS]]
+            if annot_name in layers:
+                layers[annot_name].append(self._make_morpheme(m))
+            else:
+                layers[annot_name] = [self._make_morpheme(m)]
+        return layers
+
+    def _as_records(self):
+        for lex_id in range(self._lexeme_count()):
+            form = self.form(lex_id)
+            lemma = self.lemma(lex_id)
+            pos = self.pos(lex_id)
+            features = self.features(lex_id)
+
+            layers = self._layers(lex_id)
+            if not layers:
+                yield seg_tsv.SegRecord(form, lemma, pos, [], features)
+
+            for annot_name in sorted(layers.keys()):
+                morphemes = layers[annot_name]
+                annot = features.copy()
+                annot["annot_name"] = annot_name
+                annot["segmentation"] = [{**morpheme.features, "span": morpheme.span}
+                                         for morpheme in sorted(morphemes, key=_span_sort_key)]
+
+                yield seg_tsv.SegRecord(form, lemma, pos, _split_form(form, morphemes), annot)
+
+    def _lemma_group(self, pos_id, lemma_id):
+        """
+        Return the range of `_by_pos` containing lexemes with the POS and
+        lemma with the string IDs `pos_id` and `lemma_id`.
+        """
+        index = self._lemma_index
+        key = lambda i: (index[i * 4], index[i * 4 + 1])
+        i = bisect_left(range(len(index) // 4), (pos_id, lemma_id), key=key)
+        if i < len(index) // 4 and key(i) == (pos_id, lemma_id):
+            return range(index[i * 4 + 2], index[i * 4 + 3])
+        return range(0)
+
+    def iter_lexemes(self, form=None, lemma=None, pos=None):
+        # Lexemes are returned in the same order as SegLex returns them.
+        strings = self._strings
+        lex = self._lex
+
+        if form is not None:
+            form_id = strings.find(form)
+            lemma_id = strings.find(lemma) if lemma is not None else None
+            pos_id = strings.find(pos) if pos is not None else None
+            if form_id is None or (lemma is not None and lemma_id is None) \
+               or (pos is not None and pos_id is None):
+                return
+
+            key = lambda lex_id: lex[lex_id * LEXEME_FIELDS]
+            start = bisect_left(self._by_form, form_id, key=key)
+            end = bisect_right(self._by_form, form_id, lo=start, key=key)
+            for lex_id in self._by_form[start:end]:
+                if (lemma_id is None or lex[lex_id * LEXEME_FIELDS + 1] == lemma_id) \
+                   and (pos_id is None or lex[lex_id * LEXEME_FIELDS + 2] == pos_id):
+                    yield lex_id
+            return
+
+        if pos is None and lemma is None:
+            yield from range(self._lexeme_count())
+            return
+
+        if pos is None:
+            pos_ids = self._pos_index.keys()
+        else:
+            pos_id = strings.find(pos)
+            if pos_id not in self._pos_index:
+                return
+            pos_ids = (pos_id, )
+
+        if lemma is None:
+            for pos_id in pos_ids:
+                start, end = self._pos_index[pos_id]
+                yield from self._by_pos[start:end]
+        else:
+            lemma_id = strings.find(lemma)
+            if lemma_id is None:
+                return
+            for pos_id in pos_ids:
+                group = self._lemma_group(pos_id, lemma_id)
+                yield from self._by_pos[group.start:group.stop]
+
+    def form(self, lex_id):
+        return self._strings[self._lex[lex_id * LEXEME_FIELDS]]
+
+    def lemma(self, lex_id):
+        return self._strings[self._lex[lex_id * LEXEME_FIELDS + 1]]
+
+    def pos(self, lex_id):
+        return self._strings[self._lex[lex_id * LEXEME_FIELDS + 2]]
+
+    def features(self, lex_id):
+        return seg_tsv.decode_json(self._strings[self._lex[lex_id * LEXEME_FIELDS + 3]])
+
+    def annot_names(self, lex_id):
+        strings = self._strings
+        morphs = self._morphs
+        return {strings[morphs[m * MORPHEME_FIELDS]] for m in self._morpheme_range(lex_id)}
+
+    def morphemes(self, lex_id, annot_name, sort=False, position=None):
+        morphemes = self._layer_morphemes(lex_id, annot_name)
+
+        if position is not None and morphemes:
+            if position < 0 or position >= len(self.form(lex_id)):
+                raise ValueError("Invalid position {} in lexeme {}; is out of bounds in the form".format(position, self.print_lexeme(lex_id)))
+
+            morphemes = [morpheme for morpheme in morphemes if position in morpheme.span]
+
+        if sort:
+            morphemes.sort(key=_span_sort_key)
+        return morphemes
+
+    def morpheme(self, lex_id, annot_name, position):
+        if position < 0 or position >= len(self.form(lex_id)):
+            raise ValueError("Invalid position {} in lexeme {}; is out of bounds in the form".format(position, self.print_lexeme(lex_id)))
+
+        for morpheme in self._layer_morphemes(lex_id, annot_name):
+            if position in morpheme.span:
+                return morpheme
+
+        return None
@@ -0,0 +1,430 @@
+import json
+import sqlite3
+
+from useg import seg_tsv
+from useg.seg_lex import SegLex, Morpheme, Span, _span_sort_key, _split_form, merge_key
+
+_schema = """
+CREATE TABLE IF NOT EXISTS lexemes (
+    id INTEGER PRIMARY KEY,
+    form TEXT NOT NULL,
+    lemma TEXT NOT NULL,
+    pos TEXT NOT NULL,
+    features TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS lexemes_form ON lexemes (form);
+CREATE INDEX IF NOT EXISTS lexemes_lemma ON lexemes (lemma, pos);
+CREATE INDEX IF NOT EXISTS lexemes_pos ON lexemes (pos, lemma);
+
+-- POS tags in the order they were first used, which is the order
+--  `iter_lexemes` returns lexemes with different POS tags in.
+CREATE TABLE IF NOT EXISTS poses (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS layers (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+-- Spans are stored as their start and end; discontiguous ones also
+--  as a JSON list of all their positions.
+CREATE TABLE IF NOT EXISTS morphemes (
+    id INTEGER PRIMARY KEY,
+    lexeme INTEGER NOT NULL REFERENCES lexemes (id),
+    layer INTEGER NOT NULL REFERENCES layers (id),
+    start INTEGER NOT NULL,
+    end INTEGER NOT NULL,
+    positions TEXT,
+    features TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS morphemes_lexeme ON morphemes (lexeme, layer);
+
+-- The features of morphemes, one row per key, with JSON-encoded values.
+CREATE TABLE IF NOT EXISTS morpheme_features (
+    morpheme INTEGER NOT NULL REFERENCES morphemes (id),
+    key TEXT NOT NULL,
+    value TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS morpheme_features_key ON morpheme_features (key, value);
+CREATE INDEX IF NOT EXISTS morpheme_features_morpheme ON morpheme_features (morpheme);
+"""
+
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+class SqliteSegLex(SegLex):
+    """
+    A variant of SegLex stored in an SQLite database at `path`, which
+    lets you work with lexicons that don't fit into memory and keeps
+    them between runs. Pass ":memory:" as the path for a temporary
+    in-memory database. The database is created if it doesn't exist.
+
+    The API is the same as that of SegLex, with these differences:
+     - Features and morphemes are read from the database on each query,
+       so the returned objects are new every time and changes to them
+       are not stored.
+     - Changes are written in batched transactions, committed after
+       every `batch_size` changes and by `commit` and `close`. Close the
+       lexicon (or use it as a context manager) to commit the rest.
+     - Forms, lemmas, POS tags and annotation names must be strings.
+     - Deleted lexemes are removed from the database right away, so
+       `iter_lexemes` orders the rest as SegLex does after `compact`.
+
+    In addition, `iter_lexemes_with_morpheme` finds lexemes by the
+    features of their morphemes, using an index.
+    """
+
+    __slots__ = ("_db", "_batch_size", "_pending", "_next_id", "_layer_ids", "_pos_names", "_last_lexeme")
+
+    def __init__(self, path, batch_size=10000):
+        self._db = sqlite3.connect(path)
+        self._db.executescript(_schema)
+        self._batch_size = batch_size
+        self._pending = 0
+
+        self._next_id = self._db.execute("SELECT COALESCE(MAX(id) + 1, 0) FROM lexemes").fetchone()[0]
+        # There are few layers and POS tags, so they are cached here.
+        self._layer_ids = dict(self._db.execute("SELECT name, id FROM layers"))
+        self._pos_names = {name for (name, ) in self._db.execute("SELECT name FROM poses")}
+        # The ID and form of the last added lexeme, whose morphemes are
+        #  usually added next.
+        self._last_lexeme = (None, None)
+
+    def commit(self):
+        """
+        Commit all pending changes to the database.
+        """
+        self._db.commit()
+        self._pending = 0
+
+    def close(self):
+        """
+        Commit all pending changes and close the database.
+        """
+        self.commit()
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _changed(self, count=1):
+        """
+        Record `count` changes and commit them if there are enough.
+        """
+        self._pending += count
+        if self._pending >= self._batch_size:
+            self.commit()
+
+    def _query(self, sql, *params):
+        return self._db.execute(sql, params)
+
+    def _check_lexeme(self, lex_id):
+        """
+        Raise IndexError if there is no lexeme `lex_id`.
+        """
+        if self._query("SELECT 1 FROM lexemes WHERE id = ?", lex_id).fetchone() is None:
+            raise IndexError("Lexeme {} not found".format(lex_id))
+
+    def _column(self, lex_id, column):
+        row = self._query("SELECT {} FROM lexemes WHERE id = ?".format(column), lex_id).fetchone()
+        if row is None:
+            raise IndexError("Lexeme {} not found".format(lex_id))
+        return row[0]
+
+    def _add_records(self, records):
+        super()._add_records(records)
+        self.commit()
+
+    def _add_binary(self, data):
+        from useg.seg_bin import LEXEME_FIELDS, MORPHEME_FIELDS
+
+        strings = data.strings
+        lexemes = data.lexemes
+        morphemes = data.morphemes
+        for i in range(0, len(lexemes), LEXEME_FIELDS):
+            form_id, lemma_id, pos_id, features_id, first_morpheme, morpheme_count = lexemes[i:i + LEXEME_FIELDS]
+            lex_id = self.add_lexeme(strings[form_id], strings[lemma_id], strings[pos_id], seg_tsv.decode_json(strings[features_id]))
+
+            first = MORPHEME_FIELDS * first_morpheme
+            for m in range(first, first + MORPHEME_FIELDS * morpheme_count, MORPHEME_FIELDS):
+                annot_id, m_features_id, start, end = morphemes[m:m + MORPHEME_FIELDS]
+                self.add_morpheme(lex_id, strings[annot_id], data.span(start, end), seg_tsv.decode_json(strings[m_features_id]))
+        self.commit()
+
+    def _has_form(self, form):
+        return self._query("SELECT 1 FROM lexemes WHERE form = ? LIMIT 1", form).fetchone() is not None
+
+    def _merge_key(self, lex_id):
+        form, lemma, pos, features = self._query("SELECT form, lemma, pos, features FROM lexemes WHERE id = ?", lex_id).fetchone()
+        return merge_key(form, lemma, pos, seg_tsv.decode_json(features))
+
+    def _is_merge_candidate(self, lex_id, annot_name):
+        layer_id = self._layer_ids.get(annot_name, -1)
+        row = self._query(
+            "SELECT EXISTS (SELECT 1 FROM morphemes WHERE lexeme = ?), "
+            "NOT EXISTS (SELECT 1 FROM morphemes WHERE lexeme = ? AND layer = ?)",
+            lex_id, lex_id, layer_id
+        ).fetchone()
+        return bool(row[0] and row[1])
+
+    def _lexeme_features(self, lex_id):
+        return self.features(lex_id)
+
+    def _make_morpheme(self, start, end, positions, features):
+        if positions is None:
+            span = Span.contiguous(start, end)
+        else:
+            span = Span(json.loads(positions))
+        return Morpheme(span, seg_tsv.decode_json(features))
+
+    def _layers(self, lex_id):
+        layers = {}
+        for annot_name, start, end, positions, features in self._query(
+            "SELECT layers.name, start, end, positions, features FROM morphemes "
+            "JOIN layers ON layers.id = morphemes.layer WHERE lexeme = ? ORDER BY morphemes.id",
+            lex_id
+        ):
+            morpheme = self._make_morpheme(start, end, positions, features)
+            if annot_name in layers:
+                layers[annot_name].append(morpheme)
+            else:
+                layers[annot_name] = [morpheme]
+        return layers
+
+    def _as_records(self):
+        for lex_id, form, lemma, pos, features in self._db.execute("SELECT id, form, lemma, pos, features FROM lexemes ORDER BY id"):
+            features = seg_tsv.decode_json(features)
+
+            layers = self._layers(lex_id)
+            if not layers:
+                yield seg_tsv.SegRecord(form, lemma, pos, [], features)
+
+            for annot_name in sorted(layers.keys()):
+                morphemes = layers[annot_name]
+                annot = features.copy()
+                annot["annot_name"] = annot_name
+                annot["segmentation"] = [{**morpheme.features, "span": morpheme.span}
+                                         for morpheme in sorted(morphemes, key=_span_sort_key)]
+
+                yield seg_tsv.SegRecord(form, lemma, pos, _split_form(form, morphemes), annot)
+
+    def add_lexeme(self, form, lemma, pos, features=None):
+        if features is None:
+            features = {}
+
+        lex_id = self._next_id
+        self._query(
+            "INSERT INTO lexemes (id, form, lemma, pos, features) VALUES (?, ?, ?, ?, ?)",
+            lex_id, form, lemma, pos, _encoder.encode(features)
+        )
+        self._next_id += 1
+        self._last_lexeme = (lex_id, form)
+
+        if pos not in self._pos_names:
+            self._query("INSERT INTO poses (name) VALUES (?)", pos)
+            self._pos_names.add(pos)
+
+        self._changed()
+        return lex_id
+
+    def _add_bulk_row(self, form, lemma, pos, features, annot_name, morphemes):
+        lex_id = self.add_lexeme(form, lemma, pos, features)
+        for span, m_features in morphemes:
+            self.add_morpheme(lex_id, annot_name, span, m_features)
+        return lex_id
+
+    def iter_lexemes(self, form=None, lemma=None, pos=None):
+        # Lexemes are returned in the same order as SegLex returns them.
+        #  The results are fetched whole, so that the lexicon can be
+        #  modified during the iteration.
+        if form is not None:
+            conditions = ["form = ?"]
+            params = [form]
+            if lemma is not None:
+                conditions.append("lemma = ?")
+                params.append(lemma)
+            if pos is not None:
+                conditions.append("pos = ?")
+                params.append(pos)
+            rows = self._query("SELECT id FROM lexemes WHERE {} ORDER BY id".format(" AND ".join(conditions)), *params)
+        elif pos is None and lemma is None:
+            rows = self._query("SELECT id FROM lexemes ORDER BY id")
+        elif lemma is None:
+            # Group the lexemes by their lemmas, in the order the lemmas
+            #  were first seen with the POS.
+            rows = self._query(
+                "SELECT id FROM lexemes WHERE pos = ? ORDER BY MIN(id) OVER (PARTITION BY lemma), id",
+                pos
+            )
+        elif pos is None:
+            # Group the lexemes by their POS tags, in the order the POS
+            #  tags were first seen.
+            rows = self._query(
+                "SELECT lexemes.id FROM lexemes JOIN poses ON poses.name = lexemes.pos "
+                "WHERE lemma = ? ORDER BY poses.id, lexemes.id",
+                lemma
+            )
+        else:
+            rows = self._query("SELECT id FROM lexemes WHERE lemma = ? AND pos = ? ORDER BY id", lemma, pos)
+
+        for (lex_id, ) in rows.fetchall():
+            yield lex_id
+
+    def iter_lexemes_with_morpheme(self, key, value, annot_name=None):
+        """
+        Iterate over IDs of lexemes which have a morpheme with the
+        feature `key` set to `value`, optionally only on annotation
+        layer `annot_name`.
+        """
+        sql = "SELECT DISTINCT morphemes.lexeme FROM morpheme_features " \
+              "JOIN morphemes ON morphemes.id = morpheme_features.morpheme " \
+              "WHERE key = ? AND value = ?"
+        params = [key, _encoder.encode(value)]
+        if annot_name is not None:
+            if annot_name not in self._layer_ids:
+                return
+            sql += " AND layer = ?"
+            params.append(self._layer_ids[annot_name])
+
+        for (lex_id, ) in self._query(sql + " ORDER BY morphemes.lexeme", *params).fetchall():
+            yield lex_id
+
+    def delete_lexemes(self, lex_ids):
+        lex_ids = [(lex_id, ) for lex_id in set(lex_ids)]
+        for (lex_id, ) in lex_ids:
+            self._check_lexeme(lex_id)
+
+        self._db.executemany(
+            "DELETE FROM morpheme_features WHERE morpheme IN (SELECT id FROM morphemes WHERE lexeme = ?)",
+            lex_ids
+        )
+        self._db.executemany("DELETE FROM morphemes WHERE lexeme = ?", lex_ids)
+        self._db.executemany("DELETE FROM lexemes WHERE id = ?", lex_ids)
+        if self._last_lexeme[0] in {lex_id for (lex_id, ) in lex_ids}:
+            self._last_lexeme = (None, None)
+        self._changed(len(lex_ids))
+
+    def compact(self):
+        # Renumber the lexemes in their current order. The IDs are made
+        #  negative first, so that they don't collide while updating.
+        new_ids = [None] * self._next_id
+        for new_id, (lex_id, ) in enumerate(self._query("SELECT id FROM lexemes ORDER BY id").fetchall()):
+            new_ids[lex_id] = new_id
+        # All of it happens in a single transaction, so that a failure
+        #  doesn't leave the IDs half-renumbered.
+        self.commit()
+        try:
+            for sql in (
+                "BEGIN",
+                "CREATE TEMP TABLE id_map (old INTEGER PRIMARY KEY, new INTEGER NOT NULL)",
+                "INSERT INTO id_map SELECT id, -1 - (ROW_NUMBER() OVER (ORDER BY id) - 1) FROM lexemes",
+                "UPDATE lexemes SET id = (SELECT new FROM id_map WHERE old = lexemes.id)",
+                "UPDATE morphemes SET lexeme = (SELECT new FROM id_map WHERE old = morphemes.lexeme)",
+                "UPDATE lexemes SET id = -1 - id",
+                "UPDATE morphemes SET lexeme = -1 - lexeme",
+                "DROP TABLE id_map",
+                "DELETE FROM poses",
+                "INSERT INTO poses (name) SELECT pos FROM lexemes GROUP BY pos ORDER BY MIN(id)",
+            ):
+                self._db.execute(sql)
+            self._db.commit()
+        except BaseException:
+            self._db.rollback()
+            raise
+        self._db.execute("VACUUM")
+
+        self._next_id = sum(new_id is not None for new_id in new_ids)
+        self._pos_names = {name for (name, ) in self._db.execute("SELECT name FROM poses")}
+        self._last_lexeme = (None, None)
+        return new_ids
+
+    def form(self, lex_id):
+        return self._column(lex_id, "form")
+
+    def lemma(self, lex_id):
+        return self._column(lex_id, "lemma")
+
+    def pos(self, lex_id):
+        return self._column(lex_id, "pos")
+
+    def features(self, lex_id):
+        return seg_tsv.decode_json(self._column(lex_id, "features"))
+
+    def annot_names(self, lex_id):
+        self._check_lexeme(lex_id)
+        return {name for (name, ) in self._query(
+            "SELECT DISTINCT layers.name FROM morphemes JOIN layers ON layers.id = morphemes.layer WHERE lexeme = ?",
+            lex_id
+        )}
+
+    def add_morpheme(self, lex_id, annot_name, span, features=None):
+        if features is None:
+            features = {}
+
+        # Check that the morpheme span actually exists in the lexeme.
+        span = Span(span)
+        form = self._last_lexeme[1] if lex_id == self._last_lexeme[0] else self.form(lex_id)
+        if span and (span.start < 0 or span.end > len(form)):
+            raise ValueError(
+                "Morpheme span position {} is out-of-bounds in lexeme {}".format(
+                    span.start if span.start < 0 else span.end - 1,
+                    self.print_lexeme(lex_id)
+                )
+            )
+
+        layer_id = self._layer_ids.get(annot_name)
+        if layer_id is None:
+            layer_id = self._query("INSERT INTO layers (name) VALUES (?)", annot_name).lastrowid
+            self._layer_ids[annot_name] = layer_id
+
+        positions = None if span.is_contiguous else json.dumps(list(span))
+        m = self._query(
+            "INSERT INTO morphemes (lexeme, layer, start, end, positions, features) VALUES (?, ?, ?, ?, ?, ?)",
+            lex_id, layer_id, span.start, span.end, positions, _encoder.encode(features)
+        ).lastrowid
+        self._db.executemany(
+            "INSERT INTO morpheme_features (morpheme, key, value) VALUES (?, ?, ?)",
+            [(m, key, _encoder.encode(value)) for key, value in features.items()]
+        )
+        self._changed()
+
+    def _layer_morphemes(self, lex_id, annot_name):
+        """
+        Return the list of morphemes of lexeme `lex_id` on layer
+        `annot_name`, in the order they were added.
+        """
+        self._check_lexeme(lex_id)
+        layer_id = self._layer_ids.get(annot_name)
+        if layer_id is None:
+            return []
+        return [self._make_morpheme(*row) for row in self._query(
+            "SELECT start, end, positions, features FROM morphemes WHERE lexeme = ? AND layer = ? ORDER BY id",
+            lex_id, layer_id
+        )]
+
+    def morphemes(self, lex_id, annot_name, sort=False, position=None):
+        morphemes = self._layer_morphemes(lex_id, annot_name)
+
+        if position is not None and morphemes:
+            if position < 0 or position >= len(self.form(lex_id)):
+                raise ValueError("Invalid position {} in lexeme {}; is out of bounds in the form".format(position, self.print_lexeme(lex_id)))
+
+            morphemes = [morpheme for morpheme in morphemes if position in morpheme.span]
+
+        if sort:
+            morphemes.sort(key=_span_sort_key)
+        return morphemes
+
+    def morpheme(self, lex_id, annot_name, position):
+        if position < 0 or position >= len(self.form(lex_id)):
+            raise ValueError("Invalid position {} in lexeme {}; is out of bounds in the form".format(position, self.print_lexeme(lex_id)))
+
+        for morpheme in self._layer_morphemes(lex_id, annot_name):
+            if position in morpheme.span:
+                return morpheme
+
+        return None
@@ -1,12 +1,321 @@
+import bz2
 from collections import namedtuple
+from collections.abc import Set
+import gzip
+import io
 import json
+import lzma
+import os
+import queue
+import re
+import threading
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 SegRecord = namedtuple("SegRecord", ["form", "lemma", "pos", "simple_seg", "annot"])
 
-def parse_line(line):
+# Compression formats recognized by the extension of file names.
+_compressions = {
+    ".gz": "gzip",
+    ".xz": "xz",
+    ".bz2": "bzip2",
+    ".zst": "zstd",
+}
+
+def compression_of(filename):
+    """
+    Return the name of the compression format used by file `filename`
+    ("gzip", "xz", "bzip2" or "zstd"), according to its extension, or
+    None for uncompressed files.
+    """
+    return _compressions.get(os.path.splitext(filename)[1].lower())
+
+class _ThreadedReader(io.RawIOBase):
+    """
+    A raw binary stream, which reads `stream` in a background thread.
+    The compression modules release the GIL while decompressing, so
+    reading a compressed file through this runs the decompression in
+    parallel with the processing of the data.
+    """
+
+    _chunk_size = 1 << 20
+
+    def __init__(self, stream):
+        super().__init__()
+        self._stream = stream
+        # Decompressed chunks, an empty one at the end of the file, or
+        #  an exception raised when reading.
+        self._chunks = queue.Queue(4)
+        self._chunk = b""
+        self._offset = 0
+        self._eof = False
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._read_chunks, daemon=True)
+        self._thread.start()
+
+    def _read_chunks(self):
+        try:
+            while not self._stopping.is_set():
+                chunk = self._stream.read(self._chunk_size)
+                self._put(chunk)
+                if not chunk:
+                    return
+        except BaseException as exc:
+            self._put(exc)
+
+    def _put(self, item):
+        while not self._stopping.is_set():
+            try:
+                self._chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        if self._offset >= len(self._chunk):
+            if self._eof:
+                return 0
+            chunk = self._chunks.get()
+            if isinstance(chunk, BaseException):
+                self._eof = True
+                raise chunk
+            if not chunk:
+                self._eof = True
+                return 0
+            self._chunk = chunk
+            self._offset = 0
+
+        size = min(len(b), len(self._chunk) - self._offset)
+        b[:size] = self._chunk[self._offset:self._offset + size]
+        self._offset += size
+        return size
+
+    def close(self):
+        if not self.closed:
+            self._stopping.set()
+            self._thread.join()
+            self._stream.close()
+        super().close()
+
+def _open_compressed(filename, compression, mode):
+    """
+    Open the `compression`-compressed file `filename` as a binary
+    stream in `mode` ("rb" or "wb").
+    """
+    if compression == "gzip":
+        # Use the default level of the gzip utility; the maximum one is
+        #  much slower and saves little.
+        return gzip.open(filename, mode, compresslevel=6)
+    elif compression == "xz":
+        return lzma.open(filename, mode)
+    elif compression == "bzip2":
+        return bz2.open(filename, mode)
+    elif compression == "zstd":
+        if zstandard is None:
+            raise ImportError("The zstandard package is required to work with file '{}'".format(filename))
+        f = open(filename, mode)
+        try:
+            if mode == "rb":
+                return zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=True, closefd=True)
+            else:
+                # Compress using all available cores.
+                return zstandard.ZstdCompressor(threads=-1).stream_writer(f, closefd=True)
+        except BaseException:
+            f.close()
+            raise
+    else:
+        raise ValueError("Unknown compression '{}'".format(compression))
+
+def open_file(filename, mode="rt"):
+    """
+    Open the Universal-Segmentations-formatted file `filename` for
+    reading (`mode` "rt") or writing ("wt") UTF-8 text. Files with the
+    extensions .gz, .xz, .bz2 and .zst are transparently (de)compressed;
+    the last one requires the zstandard package.
+    """
+    if mode not in {"rt", "wt"}:
+        raise ValueError("Unsupported mode '{}'".format(mode))
+
+    compression = compression_of(filename)
+    if compression is None:
+        if mode == "rt":
+            return open(filename, "rt", encoding="utf-8")
+        else:
+            return open(filename, "wt", encoding="utf-8", newline="\n")
+
+    if mode == "rt":
+        stream = _open_compressed(filename, compression, "rb")
+        return io.TextIOWrapper(io.BufferedReader(_ThreadedReader(stream)), encoding="utf-8")
+    else:
+        stream = _open_compressed(filename, compression, "wb")
+        return io.TextIOWrapper(stream, encoding="utf-8", newline="\n")
+
+# orjson silently converts integers which don't fit into 64 bits to
+#  floats. Such numbers have at least 19 digits; leave every string
+#  with a run of digits that long to the standard library.
+_long_number_re = re.compile("[0-9]{19}")
+
+def _orjson_loads(s):
+    if _long_number_re.search(s):
+        return json.loads(s)
+
+    try:
+        return orjson.loads(s)
+    except ValueError:
+        # orjson is stricter than the standard library in some edge
+        #  cases (NaN, unpaired surrogates). Let the standard library
+        #  decide, so that both backends accept and reject the same
+        #  inputs.
+        return json.loads(s)
+
+# ujson accepts raw control characters inside strings, which the
+#  standard library and orjson reject.
+_control_char_re = re.compile("[\x00-\x1f]")
+
+def _ujson_loads(s):
+    if _control_char_re.search(s):
+        return json.loads(s)
+
+    try:
+        return ujson.loads(s)
+    except ValueError:
+        # See _orjson_loads.
+        return json.loads(s)
+
+_json_loaders = {
+    "stdlib": json.loads,
+    "orjson": _orjson_loads if orjson is not None else None,
+    "ujson": _ujson_loads if ujson is not None else None,
+}
+
+_json_backend = None
+_json_loads = None
+
+def set_json_backend(backend="auto"):
+    """
+    Select the library used for decoding the JSON annotations. The
+    `backend` is one of "stdlib", "orjson", "ujson" (which must be
+    installed when requested explicitly) or "auto", which picks the
+    fastest one available.
+
+    All backends return identical results for valid input and the
+    standard library and orjson also reject the same invalid input.
+    ujson is more lenient in some cases, e.g. it accepts numbers with
+    leading zeros, which is why "auto" only uses it when orjson is not
+    installed. Forcing a specific backend is useful for verifying that.
+    """
+    global _json_backend, _json_loads
+
+    if backend == "auto":
+        # ujson is about as fast as orjson with the check for long
+        #  numbers, but accepts some malformed input, see above.
+        for candidate in ("orjson", "ujson", "stdlib"):
+            if _json_loaders[candidate] is not None:
+                backend = candidate
+                break
+
+    if backend not in _json_loaders:
+        raise ValueError("Unknown JSON backend '{}'".format(backend))
+    if _json_loaders[backend] is None:
+        raise ImportError("JSON backend '{}' requested, but the library is not installed".format(backend))
+
+    _json_backend = backend
+    _json_loads = _json_loaders[backend]
+
+def json_backend():
+    """
+    Return the name of the JSON backend currently in use.
+    """
+    return _json_backend
+
+set_json_backend()
+
+def decode_json(s):
+    """
+    Decode the JSON string `s` using the backend selected by
+    `set_json_backend`.
+    """
+    return _json_loads(s)
+
+_json_containers = (dict, list)
+
+class Interner:
+    """
+    A pool of canonical string objects. Parsed lines repeat the same
+    lemmas, POS tags, annotation names and feature keys and values over
+    and over, but each of them is parsed into a new string object.
+    Replacing them with the canonical object from the pool lets all
+    records share a single copy of each string.
+
+    The pool itself takes memory as well, so it is best used only while
+    reading a file and dropped afterwards; the strings stay shared.
+    """
+
+    __slots__ = ("_pool", )
+
+    def __init__(self):
+        self._pool = {}
+
+    def __len__(self):
+        return len(self._pool)
+
+    def intern(self, string):
+        """
+        Return the canonical object for `string`.
+        """
+        return self._pool.setdefault(string, string)
+
+    def intern_json(self, value):
+        """
+        Return a copy of the JSON-like `value` with all strings in it,
+        including dict keys, replaced by their canonical objects.
+        """
+        pool = self._pool
+        intern_json = self.intern_json
+        # Only containers are recursed into; numbers, such as the many
+        #  positions in morph spans, are returned as they are.
+        if isinstance(value, dict):
+            return {
+                pool.setdefault(k, k) if type(k) is str else k:
+                    pool.setdefault(v, v) if type(v) is str
+                    else intern_json(v) if type(v) in _json_containers
+                    else v
+                for k, v in value.items()
+            }
+        if isinstance(value, list):
+            return [
+                pool.setdefault(v, v) if type(v) is str
+                else intern_json(v) if type(v) in _json_containers
+                else v
+                for v in value
+            ]
+        if type(value) is str:
+            return pool.setdefault(value, value)
+        return value
+
+def parse_line(line, interner=None):
     """
     Parse an Universal-Segmentations-formatted `line` and return
     a direct object representation of its contents as a namedtuple.
+
+    If `interner` (an Interner object) is given, all strings in the
+    record are replaced by their canonical objects from it.
     """
     line = line.rstrip("\n")
     fields = line.split("\t", maxsplit=4)
@@ -15,7 +324,17 @@ def parse_line(line):
         raise ValueError("Invalid line '{}'".format(line))
 
     simple_seg = fields[3].split(" + ")
-    annot = json.loads(fields[4])
+    annot = _json_loads(fields[4])
+
+    if interner is not None:
+        pool = interner._pool
+        return SegRecord(
+            pool.setdefault(fields[0], fields[0]),
+            pool.setdefault(fields[1], fields[1]),
+            pool.setdefault(fields[2], fields[2]),
+            [pool.setdefault(morph, morph) for morph in simple_seg],
+            interner.intern_json(annot)
+        )
 
     return SegRecord(
         fields[0],
@@ -25,16 +344,110 @@ def parse_line(line):
         annot
     )
 
+class LazySegRecord:
+    """
+    A record of a single Universal-Segmentations-formatted line, with
+    the same fields as SegRecord. The simple segmentation and the JSON
+    annotation are only parsed when they are first accessed, so that
+    scans which only need e.g. the forms or lemmas don't pay for
+    decoding them. The parsed values are cached in the record.
+    """
+
+    __slots__ = ("form", "lemma", "pos", "_simple_seg", "_simple_seg_str", "_annot", "_annot_str")
+
+    def __init__(self, form, lemma, pos, simple_seg_str, annot_str):
+        self.form = form
+        self.lemma = lemma
+        self.pos = pos
+        self._simple_seg = None
+        self._simple_seg_str = simple_seg_str
+        self._annot = None
+        self._annot_str = annot_str
+
+    @property
+    def simple_seg(self):
+        if self._simple_seg_str is not None:
+            self._simple_seg = self._simple_seg_str.split(" + ")
+            self._simple_seg_str = None
+        return self._simple_seg
+
+    @property
+    def annot(self):
+        if self._annot_str is not None:
+            self._annot = _json_loads(self._annot_str)
+            self._annot_str = None
+        return self._annot
+
+    def to_record(self):
+        """
+        Return the contents of this record as a (fully parsed) SegRecord.
+        """
+        return SegRecord(self.form, self.lemma, self.pos, self.simple_seg, self.annot)
+
+    def __repr__(self):
+        return "LazySegRecord(form={!r}, lemma={!r}, pos={!r})".format(self.form, self.lemma, self.pos)
+
+def parse_line_lazy(line):
+    """
+    Parse an Universal-Segmentations-formatted `line` like `parse_line`,
+    but return a LazySegRecord, which postpones decoding the simple
+    segmentation and the annotation until they are needed.
+    """
+    line = line.rstrip("\n")
+    fields = line.split("\t", maxsplit=4)
+
+    if len(fields) != 5:
+        raise ValueError("Invalid line '{}'".format(line))
+
+    return LazySegRecord(*fields)
+
+def iter_records(f, lazy=False):
+    """
+    Iterate over the Universal-Segmentations-formatted lines of `f`,
+    which is either an open file-like object open for reading text or
+    a string filename, yielding a SegRecord for each of them. Compressed
+    files are supported, see `open_file`.
+
+    The records are parsed lazily one by one, so the file can be of
+    any size; nothing is kept in memory after it has been yielded.
+
+    If `lazy` is True, yield LazySegRecords instead, which only decode
+    the segmentation and annotation columns on demand.
+    """
+    parse = parse_line_lazy if lazy else parse_line
+
+    if isinstance(f, str):
+        # If f is a filename, we open the file ourselves and therefore
+        #  should also close it after reading from it.
+        with open_file(f, "rt") as actual_f:
+            for line in actual_f:
+                yield parse(line)
+    else:
+        # We assume f is already an open file object.
+        for line in f:
+            yield parse(line)
+
 class SpanEncoder(json.JSONEncoder):
     """
     Properly serialize morph spans, which are represented using
-    frozensets, as ordered lists.
+    seg_lex.Span objects or frozensets, as ordered lists.
     """
     def default(self, o):
-        if isinstance(o, frozenset):
+        if isinstance(o, Set):
             return list(sorted(o))
         return json.JSONEncoder.default(self, o)
 
+# Reuse a single encoder instead of letting json.dumps create a new one
+#  for each record. Encoding stays with the standard library regardless
+#  of the JSON backend: neither orjson nor ujson can reproduce its
+#  separators and float formatting, which are a part of our file format.
+_annot_encoder = SpanEncoder(
+    ensure_ascii=False,
+    allow_nan=False,
+    indent=None,
+    sort_keys=True
+)
+
 def format_record(record, full_and_concatenative):
     """
     Serialize the SegRecord namedtuple `record` into its TSV format and
@@ -54,12 +467,5 @@ def format_record(record, full_and_concatenative):
         record.lemma,
         record.pos,
         " + ".join(record.simple_seg),
-        json.dumps(
-            record.annot,
-            ensure_ascii=False,
-            allow_nan=False,
-            indent=None,
-            sort_keys=True,
-            cls=SpanEncoder
-        )
+        _annot_encoder.encode(record.annot)
     )
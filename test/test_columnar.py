@@ -0,0 +1,116 @@
+from io import StringIO
+import unittest
+
+from useg import SegLex
+from useg.seg_columnar import ColumnarSegLex
+
+sample_file = """counter	counter	ADJ	counter	{"annot_name": "annot1", "segmentation": [{"span": [0, 1, 2, 3, 4, 5, 6], "type": "root"}]}
+counterexample	counterexample	NOUN		{}
+counterexamples	counterexample	NOUN	counter + example + s	{"annot_name": "annot1", "segmentation": [{"morpheme": "contra", "span": [0, 1, 2, 3, 4, 5, 6], "type": "prefix"}, {"morpheme": "example", "span": [7, 8, 9, 10, 11, 12, 13], "type": "root"}, {"morpheme": "PL", "span": [14], "type": "suffix"}]}
+counterexamples	counterexample	NOUN	counterexample + s	{"annot_name": "annot2", "segmentation": [{"span": [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13], "type": "root"}, {"span": [14], "type": "suffix"}]}
+example	example	NOUN	ex + ample	{"annot_name": "annot1", "freq": 1, "segmentation": [{"span": [0, 1]}, {"span": [2, 3, 4, 5, 6]}]}
+example	example	NOUN	ex + ample	{"annot_name": "annot1", "freq": true, "segmentation": [{"span": [0, 1]}, {"span": [2, 3, 4, 5, 6]}]}
+example	example	VERB	e + x + ampl + e	{"annot_name": "annot1", "segmentation": [{"span": [0, 6], "type": "circumfix"}, {"span": [1]}, {"span": [2, 3, 4, 5]}]}
+"""
+
+class TestColumnar(unittest.TestCase):
+    def load_both(self):
+        lexicons = []
+        for storage in ("objects", "columnar"):
+            lexicon = SegLex(storage=storage)
+            lexicon.load(StringIO(sample_file))
+            lexicons.append(lexicon)
+        return lexicons
+
+    def test_storage_selection(self):
+        self.assertIsInstance(SegLex(storage="columnar"), ColumnarSegLex)
+        self.assertNotIsInstance(SegLex(), ColumnarSegLex)
+        with self.assertRaises(ValueError):
+            SegLex(storage="nonexistent")
+
+    def test_round_trip(self):
+        lexicon = SegLex(storage="columnar")
+        lexicon.load(StringIO(sample_file))
+
+        str_io = StringIO()
+        lexicon.save(str_io)
+        self.assertEqual(sample_file, str_io.getvalue())
+
+    def test_same_as_objects(self):
+        objects, columnar = self.load_both()
+        self.assert_same(objects, columnar)
+
+    def test_same_as_objects_after_delete(self):
+        objects, columnar = self.load_both()
+        for lexicon in (objects, columnar):
+            lexicon.delete_lexemes([0, 2, 3])
+        self.assert_same(objects, columnar)
+
+        self.assertEqual(objects.compact(), columnar.compact())
+        self.assert_same(objects, columnar)
+
+        str_io = StringIO()
+        columnar.save(str_io)
+        lines = sample_file.splitlines(keepends=True)
+        self.assertEqual(lines[1:2] + lines[5:], str_io.getvalue().splitlines(keepends=True))
+
+    def assert_same(self, objects, columnar):
+        self.assertEqual(list(objects.iter_lexemes()), list(columnar.iter_lexemes()))
+        for form in (None, "example", "counterexamples", "nonexistent"):
+            for lemma in (None, "example", "counterexample", "counter", "nonexistent"):
+                for pos in (None, "NOUN", "VERB", "ADJ", "nonexistent"):
+                    with self.subTest(form=form, lemma=lemma, pos=pos):
+                        self.assertEqual(list(objects.iter_lexemes(form=form, lemma=lemma, pos=pos)),
+                                         list(columnar.iter_lexemes(form=form, lemma=lemma, pos=pos)))
+
+        for lex_id in objects.iter_lexemes():
+            with self.subTest(lex_id=lex_id):
+                self.assertEqual(objects.form(lex_id), columnar.form(lex_id))
+                self.assertEqual(objects.lemma(lex_id), columnar.lemma(lex_id))
+                self.assertEqual(objects.pos(lex_id), columnar.pos(lex_id))
+                self.assertEqual(repr(objects.features(lex_id)), repr(columnar.features(lex_id)))
+                self.assertEqual(objects.annot_names(lex_id), columnar.annot_names(lex_id))
+
+                for annot_name in ("annot1", "annot2", "nonexistent"):
+                    self.assertEqual(objects.morphemes(lex_id, annot_name), columnar.morphemes(lex_id, annot_name))
+                    self.assertEqual(objects.morphemes(lex_id, annot_name, sort=True),
+                                     columnar.morphemes(lex_id, annot_name, sort=True))
+                    for position in range(len(objects.form(lex_id))):
+                        self.assertEqual(objects.morphemes(lex_id, annot_name, position=position),
+                                         columnar.morphemes(lex_id, annot_name, position=position))
+                        self.assertEqual(objects.morpheme(lex_id, annot_name, position),
+                                         columnar.morpheme(lex_id, annot_name, position))
+                        self.assertEqual(objects.morph(lex_id, annot_name, position),
+                                         columnar.morph(lex_id, annot_name, position))
+
+    def test_adding(self):
+        lexicon = SegLex(storage="columnar")
+        lex_id_1 = lexicon.add_lexeme("examples", "example", "NOUN", {"number": "pl"})
+        lex_id_2 = lexicon.add_lexeme("example", "example", "NOUN")
+        lexicon.add_contiguous_morpheme(lex_id_1, "annot1", 0, 7, {"type": "root"})
+        lexicon.add_morphemes_from_list(lex_id_2, "annot1", ["ex", "ample"])
+        # Morphemes may be added to earlier lexemes too.
+        lexicon.add_contiguous_morpheme(lex_id_1, "annot1", 7, 8, {"type": "suffix"})
+
+        self.assertEqual(["example", "s"], lexicon._simple_seg(lex_id_1, "annot1"))
+        self.assertEqual(["ex", "ample"], lexicon._simple_seg(lex_id_2, "annot1"))
+        self.assertEqual({"type": "suffix"}, lexicon.morpheme(lex_id_1, "annot1", 7).features)
+        self.assertEqual([lex_id_1, lex_id_2], list(lexicon.iter_lexemes(lemma="example")))
+
+        with self.assertRaises(ValueError):
+            lexicon.add_contiguous_morpheme(lex_id_2, "annot1", 5, 8)
+
+    def test_features_not_shared(self):
+        lexicon = SegLex(storage="columnar")
+        features = {"number": "pl"}
+        lex_id_1 = lexicon.add_lexeme("examples", "example", "NOUN", features)
+        lex_id_2 = lexicon.add_lexeme("instances", "instance", "NOUN", features)
+
+        # The lexicon keeps its own copy.
+        features["number"] = "sg"
+        self.assertEqual({"number": "pl"}, lexicon.features(lex_id_1))
+
+        # Edits are kept, but don't affect other lexemes.
+        lexicon.features(lex_id_1)["case"] = "nom"
+        self.assertEqual({"number": "pl", "case": "nom"}, lexicon.features(lex_id_1))
+        self.assertEqual({"number": "pl"}, lexicon.features(lex_id_2))
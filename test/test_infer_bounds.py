@@ -1,6 +1,8 @@
+import os
+import tempfile
 import unittest
 
-from useg.infer_bounds import infer_bounds
+from useg.infer_bounds import AlignmentCache, CostModel, infer_bounds, infer_bounds_batch, infer_bounds_many, infer_bounds_top_k
 
 class TestInferBounds(unittest.TestCase):
     def test_simple(self):
@@ -46,3 +48,163 @@ class TestInferBounds(unittest.TestCase):
 
     def test_missing_center(self):
         self.assertEqual([0, 3, 3, 6], infer_bounds(["abc", "xxx", "def"], "abcdef")[0])
+
+    def test_batch(self):
+        pairs = [
+            (["a"], "a"),
+            (["ab", "aa"], "abaa"),
+            (["acc", "dcc"], "abcdef"),
+            (["abcx", "xdef"], "abcdef"),
+            (["xabc", "def"], "abcdef"),
+            (["abc", "def"], "xabcdef"),
+            (["abc", "def"], "abcdefx"),
+            (["xxx", "abc"], "abc"),
+            (["abc", "xxx", "def"], "abcdef"),
+            (["pes", "vést"], "psovod"),
+            (["Über", "-", "gang"], "übergänge"),
+        ]
+        expected = [infer_bounds(morphs, form) for morphs, form in pairs]
+        self.assertEqual(expected, infer_bounds_batch(pairs))
+        self.assertEqual(expected, infer_bounds_batch(pairs, batch_size=3))
+
+    def test_exact_match(self):
+        self.assertEqual(([0, 3, 7], 0.0), infer_bounds(["pes", "vést"], "pesvést"))
+        self.assertEqual([([0, 3, 7], 0.0)], infer_bounds_batch([(["pes", "vést"], "pesvést")]))
+
+    def test_band(self):
+        pairs = [
+            (["abc", "xxx", "def"], "abcdef"),
+            (["abc", "def"], "xxxxabcdef"),
+            (["xabc", "def"], "abcdef"),
+            (["pes", "vést"], "psovod"),
+            (["counter", "example", "s"], "kountrexamples"),
+            (["ne", "pře", "hled", "n", "ost"], "nepřehlednosti"),
+        ]
+        for morphs, form in pairs:
+            expected = infer_bounds(morphs, form)
+            for band in (0, 1, 3, 100):
+                with self.subTest(morphs=morphs, form=form, band=band):
+                    self.assertEqual(expected, infer_bounds(morphs, form, band=band))
+
+    def test_cost_model(self):
+        model = CostModel()
+        self.assertEqual(0.0, model.subst("a", "a"))
+        self.assertEqual(0.1, model.subst("a", "á"))
+        self.assertEqual(0.5, model.subst("a", "e"))
+        self.assertEqual(1.5, model.subst("a", "b"))
+        self.assertEqual(0.3, model.insert("a"))
+        self.assertEqual(0.1, model.insert("-"))
+        self.assertEqual(1.0, model.delete("b"))
+        self.assertEqual([[0.0, 0.5], [1.5, 1.5]], model.subst_costs("ab", "ae").tolist())
+        self.assertEqual([0.3, 1.0, 0.1], model.insert_costs("ab-").tolist())
+
+        # Pairs outside of the alphabet are cached.
+        model.subst("अ", "आ")
+        model.subst("अ", "आ")
+        self.assertEqual(1, model.cache_info().hits)
+
+    def test_register_alphabet(self):
+        # Unknown characters are substituted for each other rather than
+        #  deleted and inserted, unless they are known to be vowels.
+        model = CostModel()
+        self.assertEqual(([0, 2, 3], 1.5), infer_bounds(["बआ", "क"], "बबक", cost_model=model))
+
+        model.add_alphabet(vowels="अआइ", consonants="बक")
+        self.assertEqual("vowel", model.category("आ"))
+        self.assertEqual(0.3, model.delete("आ"))
+        self.assertEqual(([0, 1, 3], 1.3), infer_bounds(["बआ", "क"], "बबक", cost_model=model))
+        self.assertEqual([([0, 1, 3], 1.3)], infer_bounds_batch([(["बआ", "क"], "बबक")], cost_model=model))
+
+    def test_many(self):
+        pairs = [(["pes", "vést"], "psovod"), (["abc", "def"], "abcdef"), ([], "a"), (["pes", "vést"], "psovod")]
+        expected = [infer_bounds(morphs, form) for morphs, form in pairs[:2]]
+        for workers in (None, 2):
+            with self.subTest(workers=workers):
+                results = infer_bounds_many(pairs, workers=workers, chunksize=1)
+                self.assertEqual(expected, results[:2])
+                self.assertIsInstance(results[2], Exception)
+                self.assertEqual(expected[0], results[3])
+
+        # Repeated pairs get their own bounds.
+        results[0][0].append(7)
+        self.assertEqual(expected[0], results[3])
+
+        cache = AlignmentCache()
+        infer_bounds_many(pairs[:2], cache=cache)
+        self.assertEqual(expected, infer_bounds_many(pairs[:2], cache=cache))
+        self.assertEqual((2, 2), (cache.hits, cache.misses))
+
+    def test_top_k(self):
+        alignments = infer_bounds_top_k(["pes", "vést"], "psovod", k=3)
+        self.assertEqual(3, len(alignments))
+        self.assertEqual(infer_bounds(["pes", "vést"], "psovod"), (alignments[0].bounds, alignments[0].cost))
+        self.assertEqual(sorted(a.cost for a in alignments), [a.cost for a in alignments])
+        self.assertEqual(3, len({tuple(a.bounds) for a in alignments}))
+        self.assertEqual([[("delete", "e", None)], [("insert", None, "o"), ("subst", "é", "o"), ("delete", "s", None), ("subst", "t", "d")]], alignments[0].edits)
+
+        # An exact match is still found, along with its alternatives.
+        alignments = infer_bounds_top_k(["ab", "ab"], "abab", k=2)
+        self.assertEqual(([0, 2, 4], 0.0, [[], []]), alignments[0])
+        self.assertGreater(alignments[1].cost, 0.0)
+
+        # There are only so many ways to segment a single character.
+        self.assertEqual([[0, 1], [0, 0], [1, 1]], [a.bounds for a in infer_bounds_top_k(["a"], "a", k=5)])
+
+        with self.assertRaises(ValueError):
+            infer_bounds_top_k(["a"], "a", k=0)
+
+    def test_many_top_k(self):
+        pairs = [(["pes", "vést"], "psovod"), ([], "a"), (["pes", "vést"], "psovod")]
+        expected = infer_bounds_top_k(["pes", "vést"], "psovod", k=2)
+        cache = AlignmentCache()
+        for workers in (None, 2):
+            with self.subTest(workers=workers):
+                results = infer_bounds_many(pairs, workers=workers, chunksize=1, cache=cache, k=2)
+                self.assertEqual(expected, results[0])
+                self.assertIsInstance(results[1], Exception)
+                self.assertEqual(expected, results[2])
+
+        # The second run is answered from the cache, which keeps the
+        #  top-k results apart from the plain ones.
+        self.assertEqual(2, cache.hits)
+        self.assertEqual(expected, cache.top_k(["pes", "vést"], "psovod", k=2))
+        self.assertEqual(infer_bounds(["pes", "vést"], "psovod"), cache(["pes", "vést"], "psovod"))
+        self.assertEqual(3, cache.hits)
+
+        # The returned alignments may be modified.
+        results[0][0].bounds.append(7)
+        results[0][0].edits[0].clear()
+        self.assertEqual(expected, cache.top_k(["pes", "vést"], "psovod", k=2))
+
+    def test_cache(self):
+        cache = AlignmentCache(maxsize=2)
+        self.assertEqual(infer_bounds(["pes", "vést"], "psovod"), cache(["pes", "vést"], "psovod"))
+        self.assertEqual(infer_bounds(["pes", "vést"], "psovod"), cache(("pes", "vést"), "psovod"))
+        self.assertEqual((1, 1), (cache.hits, cache.misses))
+
+        # The returned bounds may be modified.
+        cache(["abc", "def"], "abcdef")[0].append(7)
+        self.assertEqual([0, 3, 6], cache(["abc", "def"], "abcdef")[0])
+
+        # The least recently used result is evicted.
+        cache(["a"], "a")
+        self.assertEqual(2, len(cache))
+        cache(["pes", "vést"], "psovod")
+        self.assertEqual((2, 4), (cache.hits, cache.misses))
+
+    def test_cache_persistence(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "alignments.pickle")
+            cache = AlignmentCache(path=path)
+            cache(["pes", "vést"], "psovod")
+            cache.save()
+
+            cache = AlignmentCache(path=path)
+            self.assertEqual(1, len(cache))
+            self.assertEqual(infer_bounds(["pes", "vést"], "psovod"), cache(["pes", "vést"], "psovod"))
+            self.assertEqual((1, 0), (cache.hits, cache.misses))
+
+            # Results computed with a different alphabet are ignored.
+            model = CostModel()
+            model.add_alphabet(vowels="अआइ")
+            self.assertEqual(0, len(AlignmentCache(cost_model=model, path=path)))
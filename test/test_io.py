@@ -1,4 +1,6 @@
 from io import StringIO
+import os
+import tempfile
 import unittest
 from unittest.mock import patch, mock_open
 
@@ -36,6 +38,14 @@ examples	example	NOUN	example + s	{"annot_name": "annot1", "segmentation": [{"mo
 exemplar	exemplar	ADJ	exempl + ar	{"annot_name": "annot1", "segmentation": [{"morpheme": "example", "span": [0, 1, 2, 3, 4, 5], "type": "root"}]}
 """
 
+sample_file_merge = """example	example	NOUN		{"number": "sg"}
+example	example	NOUN	e + xample	{"annot_name": "annot2", "number": "sg", "segmentation": [{"span": [0]}, {"span": [1, 2, 3, 4, 5, 6]}]}
+example	example	NOUN	ex + ample	{"annot_name": "annot1", "number": "sg", "segmentation": [{"span": [0, 1]}, {"span": [2, 3, 4, 5, 6]}]}
+example	example	NOUN	exam + ple	{"annot_name": "annot1", "number": "sg", "segmentation": [{"span": [0, 1, 2, 3]}, {"span": [4, 5, 6]}]}
+example	example	NOUN	exampl + e	{"annot_name": "annot2", "number": "sg", "segmentation": [{"span": [0, 1, 2, 3, 4, 5]}, {"span": [6]}]}
+example	example	NOUN	exampl + e	{"annot_name": "annot1", "number": "pl", "segmentation": [{"span": [0, 1, 2, 3, 4, 5]}, {"span": [6]}]}
+"""
+
 class TestIO(unittest.TestCase):
     def test_load_empty(self):
         # Test loading an empty lexicon.
@@ -114,6 +124,96 @@ class TestIO(unittest.TestCase):
         self.assertEqual(2, len(list(seg_lex.iter_lexemes(form="counterexample"))))
         self.assertEqual(1, len(list(seg_lex.iter_lexemes(form="exemplar"))))
 
+    def test_load_merge_segmentations(self):
+        # Test that alternative segmentations of a single lexeme are
+        #  merged together, but homonyms are kept apart.
+        str_io = StringIO(initial_value=sample_file_merge)
+        seg_lex = SegLex()
+        seg_lex.load(str_io)
+
+        self.assertEqual(4, len(list(seg_lex.iter_lexemes())))
+
+        lexemes = list(seg_lex.iter_lexemes(form="example"))
+        self.assertEqual(4, len(lexemes))
+        # The unsegmented lexeme is not merged with anything.
+        self.assertEqual(set(), seg_lex.annot_names(lexemes[0]))
+        self.assertEqual({"annot1", "annot2"}, seg_lex.annot_names(lexemes[1]))
+        self.assertEqual(["e", "xample"], seg_lex._simple_seg(lexemes[1], "annot2"))
+        self.assertEqual(["ex", "ample"], seg_lex._simple_seg(lexemes[1], "annot1"))
+        self.assertEqual({"annot1", "annot2"}, seg_lex.annot_names(lexemes[2]))
+        self.assertEqual({"number": "sg"}, seg_lex.features(lexemes[2]))
+        self.assertEqual({"annot1"}, seg_lex.annot_names(lexemes[3]))
+        self.assertEqual({"number": "pl"}, seg_lex.features(lexemes[3]))
+
+    def test_round_trip_merge(self):
+        str_io_src = StringIO(initial_value=sample_file_merge)
+        str_io_tgt = StringIO()
+
+        seg_lex = SegLex()
+        seg_lex.load(str_io_src)
+        seg_lex.save(str_io_tgt)
+
+        str_io_tgt.seek(0)
+        content = str_io_tgt.read()
+
+        self.assertEqual(sample_file_merge, content)
+
+    def test_save_bounded_memory(self):
+        seg_lex = SegLex()
+        seg_lex.load(StringIO(initial_value=sample_file))
+        seg_lex.load(StringIO(initial_value=sample_file_morphemes))
+        # Records with equal sort keys must stay in insertion order.
+        for number in ("sg", "pl", "du"):
+            seg_lex.add_lexeme("example", "example", "NOUN", {"number": number})
+
+        str_io_expected = StringIO()
+        seg_lex.save(str_io_expected)
+
+        for max_memory in (1, 500, 10**9):
+            with self.subTest(max_memory=max_memory):
+                str_io = StringIO()
+                seg_lex.save(str_io, max_memory=max_memory)
+                self.assertEqual(str_io_expected.getvalue(), str_io.getvalue())
+
+    def test_save_many_runs(self):
+        seg_lex = SegLex()
+        for i in range(3000):
+            # Many equal keys, whose order must be kept across the runs.
+            lex_id = seg_lex.add_lexeme("example", "example{}".format(i % 7), "NOUN", {"i": i})
+            seg_lex.add_morphemes_from_list(lex_id, "annot1", ["ex", "ample"])
+
+        str_io_expected = StringIO()
+        seg_lex.save(str_io_expected)
+
+        # Each record gets a run of its own, many more than can be open.
+        for max_merged_runs in (4, 64):
+            with self.subTest(max_merged_runs=max_merged_runs), patch("useg.seg_lex._max_merged_runs", max_merged_runs):
+                str_io = StringIO()
+                seg_lex.save(str_io, max_memory=1)
+                self.assertEqual(str_io_expected.getvalue(), str_io.getvalue())
+
+    def test_save_unsorted(self):
+        seg_lex = SegLex()
+        lex_id_1 = seg_lex.add_lexeme("examples", "example", "NOUN")
+        lex_id_2 = seg_lex.add_lexeme("counterexample", "counterexample", "NOUN")
+        seg_lex.add_morphemes_from_list(lex_id_1, "annot2", ["example", "s"])
+        seg_lex.add_morphemes_from_list(lex_id_1, "annot1", ["ex", "ample", "s"])
+        seg_lex.add_morphemes_from_list(lex_id_2, "annot1", ["counter", "example"])
+
+        str_io = StringIO()
+        seg_lex.save(str_io, sort=False)
+        lines = str_io.getvalue().splitlines(keepends=True)
+
+        # The lexemes are in insertion order, their layers sorted by name.
+        self.assertEqual(["examples\texample\tNOUN\tex + ample + s\t",
+                          "examples\texample\tNOUN\texample + s\t",
+                          "counterexample\tcounterexample\tNOUN\tcounter + example\t"],
+                         [line[:line.rindex("\t") + 1] for line in lines])
+
+        str_io_sorted = StringIO()
+        seg_lex.save(str_io_sorted)
+        self.assertEqual(sorted(lines), sorted(str_io_sorted.getvalue().splitlines(keepends=True)))
+
     def test_save_morphemes(self):
         # Test saving lexemes with concatenative segmentation.
         # And with morpheme features.
@@ -151,7 +251,7 @@ class TestIO(unittest.TestCase):
         seg_lex = SegLex()
 
         open_mock = mock_open(read_data=sample_file)
-        with patch("useg.seg_lex.open", open_mock, create=True):
+        with patch("useg.seg_tsv.open", open_mock, create=True):
             seg_lex.load("test-example.useg")
 
         open_mock.assert_called_once_with("test-example.useg", "rt", encoding="utf-8")
@@ -174,7 +274,7 @@ class TestIO(unittest.TestCase):
         seg_lex.add_lexeme("exemplar", "exemplar", "ADJ")
 
         open_mock = mock_open()
-        with patch("useg.seg_lex.open", open_mock, create=True):
+        with patch("useg.seg_tsv.open", open_mock, create=True):
             seg_lex.save("test-example.useg")
 
         open_mock.assert_called_once_with("test-example.useg", "wt", encoding="utf-8", newline='\n')
@@ -186,6 +286,21 @@ class TestIO(unittest.TestCase):
 
         self.assertEqual(6, handle.write.call_count)
 
+    def test_round_trip_compressed(self):
+        seg_lex = SegLex()
+        seg_lex.load(StringIO(initial_value=sample_file))
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, "example.useg.xz")
+            seg_lex.save(filename)
+
+            seg_lex = SegLex()
+            seg_lex.load(filename)
+
+        str_io = StringIO()
+        seg_lex.save(str_io)
+        self.assertEqual(sample_file, str_io.getvalue())
+
     def test_round_trip(self):
         str_io_src = StringIO(initial_value=sample_file)
         str_io_tgt = StringIO()
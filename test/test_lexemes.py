@@ -99,6 +99,97 @@ class TestLexemes(unittest.TestCase):
         self.assertEqual([],
                          list(lexicon.iter_lexemes(pos="VERB")))
 
+    def test_delete(self):
+        for storage in ("objects", "columnar"):
+            with self.subTest(storage=storage):
+                lexicon = SegLex(storage=storage)
+                lex_id_1 = lexicon.add_lexeme("example", "example", "NOUN")
+                lex_id_2 = lexicon.add_lexeme("examples", "example", "NOUN", {"number": "pl"})
+                lex_id_3 = lexicon.add_lexeme("exemplar", "exemplar", "ADJ")
+                lexicon.add_morphemes_from_list(lex_id_2, "annot1", ["example", "s"])
+
+                lexicon.delete_lexeme(lex_id_2)
+                self.assertEqual([lex_id_1, lex_id_3], list(lexicon.iter_lexemes()))
+                self.assertEqual([], list(lexicon.iter_lexemes(form="examples")))
+                self.assertEqual([lex_id_1], list(lexicon.iter_lexemes(lemma="example")))
+                self.assertEqual([lex_id_1], list(lexicon.iter_lexemes(pos="NOUN")))
+                with self.assertRaises(IndexError):
+                    lexicon.form(lex_id_2)
+                with self.assertRaises(IndexError):
+                    lexicon.morphemes(lex_id_2, "annot1")
+                with self.assertRaises(IndexError):
+                    lexicon.delete_lexeme(lex_id_2)
+
+                # Deleting while iterating over the whole lexicon.
+                for lex_id in lexicon.iter_lexemes():
+                    lexicon.delete_lexemes([lex_id_1, lex_id_3])
+                    break
+                self.assertEqual([], list(lexicon.iter_lexemes()))
+
+                # New lexemes don't reuse the IDs.
+                self.assertEqual(lex_id_3 + 1, lexicon.add_lexeme("examples", "example", "NOUN"))
+                self.assertEqual([lex_id_3 + 1], list(lexicon.iter_lexemes(lemma="example")))
+
+                # Loaded segmentations are not merged into deleted lexemes.
+                lexicon.load(StringIO('examples\texample\tNOUN\texample + s\t{"annot_name": "annot2", "number": "pl", "segmentation": [{"span": [0, 1, 2, 3, 4, 5, 6]}, {"span": [7]}]}\n'))
+                self.assertEqual([lex_id_3 + 1, lex_id_3 + 2], list(lexicon.iter_lexemes(form="examples")))
+                self.assertEqual(["annot2"], list(lexicon.annot_names(lex_id_3 + 2)))
+
+    def test_compact(self):
+        for storage in ("objects", "columnar"):
+            with self.subTest(storage=storage):
+                lexicon = SegLex(storage=storage)
+                lex_id_1 = lexicon.add_lexeme("example", "example", "NOUN")
+                lex_id_2 = lexicon.add_lexeme("examples", "example", "NOUN", {"number": "pl"})
+                lex_id_3 = lexicon.add_lexeme("exemplar", "exemplar", "ADJ")
+                lexicon.add_morphemes_from_list(lex_id_3, "annot1", ["exempl", "ar"])
+                lexicon.delete_lexeme(lex_id_1)
+
+                new_ids = lexicon.compact()
+                self.assertEqual([None, 0, 1], new_ids)
+                self.assertEqual([0, 1], list(lexicon.iter_lexemes()))
+                self.assertEqual([0], list(lexicon.iter_lexemes(lemma="example")))
+                self.assertEqual({"number": "pl"}, lexicon.features(new_ids[lex_id_2]))
+                self.assertEqual("ar", lexicon.morph(new_ids[lex_id_3], "annot1", 7))
+                self.assertEqual(2, lexicon.add_lexeme("example", "example", "NOUN"))
+
+    def test_add_lexemes_bulk(self):
+        rows = [
+            ("counterexamples", "counterexample", "NOUN", {"number": "pl"},
+             [(0, 7, {"type": "prefix"}), (7, 14, {"type": "root"}), (14, 15, None)]),
+            ("example", "example", "NOUN", None, []),
+            ("example", "example", "VERB", None, [([0, 6], {"type": "circumfix"}), (1, 6, None)]),
+        ]
+
+        for storage in ("objects", "columnar"):
+            with self.subTest(storage=storage):
+                expected = SegLex(storage=storage)
+                for form, lemma, pos, features, morphemes in rows:
+                    lex_id = expected.add_lexeme(form, lemma, pos, features)
+                    for morpheme in morphemes:
+                        if len(morpheme) == 3:
+                            expected.add_contiguous_morpheme(lex_id, "annot1", *morpheme)
+                        else:
+                            expected.add_morpheme(lex_id, "annot1", *morpheme)
+
+                lexicon = SegLex(storage=storage)
+                self.assertEqual([0, 1, 2], lexicon.add_lexemes_bulk(iter(rows), "annot1"))
+                for lex_id in range(3):
+                    self.assertEqual(expected.features(lex_id), lexicon.features(lex_id))
+                    self.assertEqual(expected.annot_names(lex_id), lexicon.annot_names(lex_id))
+                    self.assertEqual(expected.morphemes(lex_id, "annot1"), lexicon.morphemes(lex_id, "annot1"))
+                self.assertEqual([2], list(lexicon.iter_lexemes(pos="VERB")))
+
+                expected_io, bulk_io = StringIO(), StringIO()
+                expected.save(expected_io)
+                lexicon.save(bulk_io)
+                self.assertEqual(expected_io.getvalue(), bulk_io.getvalue())
+
+                # Rows up to the invalid one are added.
+                with self.assertRaises(ValueError):
+                    lexicon.add_lexemes_bulk([("ex", "ex", "X", None, []), ("ex", "ex", "X", None, [(1, 3, None)])], "annot1")
+                self.assertEqual([3], list(lexicon.iter_lexemes(form="ex")))
+
     def test_forbidden_features_annot_name(self):
         seg_lex = SegLex()
         seg_lex.add_lexeme("example", "example", "NOUN", {"annot_name": "fail"})
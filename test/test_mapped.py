@@ -0,0 +1,84 @@
+from io import StringIO
+import os
+import tempfile
+import unittest
+
+from useg import SegLex
+from useg.seg_mapped import MappedSegLex
+
+sample_file = """counter	counter	ADJ	counter	{"annot_name": "annot1", "segmentation": [{"span": [0, 1, 2, 3, 4, 5, 6], "type": "root"}]}
+counterexample	counterexample	NOUN		{}
+counterexamples	counterexample	NOUN	counter + example + s	{"annot_name": "annot1", "segmentation": [{"morpheme": "contra", "span": [0, 1, 2, 3, 4, 5, 6], "type": "prefix"}, {"morpheme": "example", "span": [7, 8, 9, 10, 11, 12, 13], "type": "root"}, {"morpheme": "PL", "span": [14], "type": "suffix"}]}
+counterexamples	counterexample	NOUN	counterexample + s	{"annot_name": "annot2", "segmentation": [{"span": [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13], "type": "root"}, {"span": [14], "type": "suffix"}]}
+example	example	NOUN	ex + ample	{"annot_name": "annot1", "freq": 1, "segmentation": [{"span": [0, 1]}, {"span": [2, 3, 4, 5, 6]}]}
+example	example	NOUN	ex + ample	{"annot_name": "annot1", "freq": true, "segmentation": [{"span": [0, 1]}, {"span": [2, 3, 4, 5, 6]}]}
+example	example	VERB	e + x + ampl + e	{"annot_name": "annot1", "segmentation": [{"span": [0, 6], "type": "circumfix"}, {"span": [1]}, {"span": [2, 3, 4, 5]}]}
+"""
+
+class TestMapped(unittest.TestCase):
+    def setUp(self):
+        self.lexicon = SegLex()
+        self.lexicon.load(StringIO(sample_file))
+
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmpdir.name, "example.usegb")
+        self.lexicon.save_binary(self.filename)
+        self.mapped = MappedSegLex(self.filename)
+
+    def tearDown(self):
+        self.mapped.close()
+        self.tmpdir.cleanup()
+
+    def test_same_as_loaded(self):
+        objects, mapped = self.lexicon, self.mapped
+
+        self.assertEqual(list(objects.iter_lexemes()), list(mapped.iter_lexemes()))
+        for form in (None, "example", "counterexamples", "nonexistent"):
+            for lemma in (None, "example", "counterexample", "counter", "nonexistent"):
+                for pos in (None, "NOUN", "VERB", "ADJ", "nonexistent"):
+                    with self.subTest(form=form, lemma=lemma, pos=pos):
+                        self.assertEqual(list(objects.iter_lexemes(form=form, lemma=lemma, pos=pos)),
+                                         list(mapped.iter_lexemes(form=form, lemma=lemma, pos=pos)))
+
+        for lex_id in objects.iter_lexemes():
+            with self.subTest(lex_id=lex_id):
+                self.assertEqual(objects.form(lex_id), mapped.form(lex_id))
+                self.assertEqual(objects.lemma(lex_id), mapped.lemma(lex_id))
+                self.assertEqual(objects.pos(lex_id), mapped.pos(lex_id))
+                self.assertEqual(repr(objects.features(lex_id)), repr(mapped.features(lex_id)))
+                self.assertEqual(objects.annot_names(lex_id), mapped.annot_names(lex_id))
+
+                for annot_name in ("annot1", "annot2", "nonexistent"):
+                    self.assertEqual(objects.morphemes(lex_id, annot_name), mapped.morphemes(lex_id, annot_name))
+                    self.assertEqual(objects.morphemes(lex_id, annot_name, sort=True),
+                                     mapped.morphemes(lex_id, annot_name, sort=True))
+                    for position in range(len(objects.form(lex_id))):
+                        self.assertEqual(objects.morph(lex_id, annot_name, position),
+                                         mapped.morph(lex_id, annot_name, position))
+
+    def test_save(self):
+        str_io = StringIO()
+        self.mapped.save(str_io)
+        self.assertEqual(sample_file, str_io.getvalue())
+
+    def test_read_only(self):
+        with self.assertRaises(TypeError):
+            self.mapped.add_lexeme("form", "lemma", "NOUN")
+        with self.assertRaises(TypeError):
+            self.mapped.add_contiguous_morpheme(0, "annot1", 0, 1)
+        with self.assertRaises(TypeError):
+            self.mapped.load(StringIO(sample_file))
+
+        # Returned features are copies.
+        lex_id = next(self.mapped.iter_lexemes(form="example"))
+        self.mapped.features(lex_id)["freq"] = 2
+        self.assertEqual(self.mapped.features(lex_id), {"freq": 1})
+
+    def test_context_manager(self):
+        with MappedSegLex(self.filename) as mapped:
+            self.assertEqual(mapped.form(0), "counter")
+        with self.assertRaises(ValueError):
+            mapped.form(0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,7 @@
 import unittest
+from unittest.mock import patch
 from useg import SegLex
-from useg.seg_lex import Morpheme
+from useg.seg_lex import Morpheme, Span
 
 class TestMorphemes(unittest.TestCase):
     def test_listing_single_morpheme(self):
@@ -60,3 +61,101 @@ class TestMorphemes(unittest.TestCase):
         lexicon.add_contiguous_morpheme(lex_id, "Test segmentation", 0, 4)
 
         self.assertEqual(["exam", "pl", "e"], lexicon._simple_seg(lex_id, "Test segmentation"))
+
+    def test_position_query_after_adding(self):
+        # Querying a position and then adding more morphemes must not
+        #  return stale results.
+        lexicon = SegLex()
+        lex_id = lexicon.add_lexeme("example", "example", "NOUN")
+        lexicon.add_contiguous_morpheme(lex_id, "Test segmentation", 0, 4, {"type": "root"})
+
+        self.assertEqual(1, len(lexicon.morphemes(lex_id, "Test segmentation", position=2)))
+        self.assertIsNone(lexicon.morpheme(lex_id, "Test segmentation", 5))
+
+        lexicon.add_contiguous_morpheme(lex_id, "Test segmentation", 2, 7, {"type": "suffix"})
+
+        self.assertEqual([{"type": "root"}, {"type": "suffix"}],
+                         [m.features for m in lexicon.morphemes(lex_id, "Test segmentation", position=2)])
+        self.assertEqual({"type": "suffix"}, lexicon.morpheme(lex_id, "Test segmentation", 5).features)
+        self.assertEqual("ample", lexicon.morph(lex_id, "Test segmentation", 5))
+        self.assertEqual(["ex", "am", "ple"], lexicon._simple_seg(lex_id, "Test segmentation"))
+        self.assertEqual([], lexicon.morphemes(lex_id, "Other segmentation", position=2))
+
+    def test_position_index_size(self):
+        # Querying every lexeme by position keeps only a bounded number
+        #  of position tables, and dropped ones are rebuilt when needed.
+        lexicon = SegLex()
+        lex_ids = [lexicon.add_lexeme("ab", "ab", "NOUN") for i in range(10)]
+        for lex_id in lex_ids:
+            lexicon.add_contiguous_morpheme(lex_id, "Test segmentation", 0, 1)
+
+        with patch("useg.seg_lex._position_index_size", 4):
+            for lex_id in lex_ids:
+                self.assertEqual("a", lexicon.morph(lex_id, "Test segmentation", 0))
+            self.assertEqual(4, len(lexicon._position_index))
+
+            lexicon.add_contiguous_morpheme(lex_ids[0], "Test segmentation", 1, 2)
+            lexicon.add_contiguous_morpheme(lex_ids[-1], "Test segmentation", 1, 2)
+            for lex_id in (lex_ids[0], lex_ids[-1]):
+                self.assertEqual("b", lexicon.morph(lex_id, "Test segmentation", 1))
+            self.assertIsNone(lexicon.morpheme(lex_ids[1], "Test segmentation", 1))
+            self.assertEqual(4, len(lexicon._position_index))
+
+    def test_discontiguous_morpheme(self):
+        lexicon = SegLex()
+        lex_id = lexicon.add_lexeme("gemacht", "machen", "VERB")
+        lexicon.add_morpheme(lex_id, "Test segmentation", [6, 0, 1], {"type": "circumfix"})
+        lexicon.add_contiguous_morpheme(lex_id, "Test segmentation", 2, 6, {"type": "root"})
+
+        self.assertEqual("ge + t", lexicon.morph(lex_id, "Test segmentation", 0))
+        self.assertEqual("mach", lexicon.morph(lex_id, "Test segmentation", 3))
+        self.assertEqual([{"type": "circumfix"}, {"type": "root"}],
+                         [m.features for m in lexicon.morphemes(lex_id, "Test segmentation", sort=True)])
+
+        with self.assertRaises(ValueError):
+            lexicon.add_morpheme(lex_id, "Test segmentation", [5, 7])
+        with self.assertRaises(ValueError):
+            lexicon.add_contiguous_morpheme(lex_id, "Test segmentation", -1, 2)
+
+class TestSpan(unittest.TestCase):
+    def test_contiguous(self):
+        span = Span([2, 3, 4])
+
+        self.assertTrue(span.is_contiguous)
+        self.assertEqual((2, 5), (span.start, span.end))
+        self.assertEqual(span, Span.contiguous(2, 5))
+        self.assertEqual(span, Span(range(2, 5)))
+        self.assertEqual(3, len(span))
+        self.assertEqual([2, 3, 4], list(span))
+        self.assertIn(2, span)
+        self.assertNotIn(5, span)
+
+    def test_discontiguous(self):
+        span = Span([7, 0, 1, 1, 5])
+
+        self.assertFalse(span.is_contiguous)
+        self.assertEqual((0, 8), (span.start, span.end))
+        self.assertEqual(4, len(span))
+        self.assertEqual([0, 1, 5, 7], list(span))
+        self.assertIn(5, span)
+        self.assertNotIn(2, span)
+        self.assertNotIn(8, span)
+
+    def test_empty(self):
+        self.assertEqual(0, len(Span()))
+        self.assertEqual(Span(), Span.contiguous(3, 3))
+        self.assertEqual([], list(Span([])))
+
+    def test_set_compatibility(self):
+        for positions in ([], [0], [1, 2, 3], [0, 2, 3, 6]):
+            with self.subTest(positions=positions):
+                span = Span(positions)
+                self.assertEqual(frozenset(positions), span)
+                self.assertEqual(span, frozenset(positions))
+                self.assertEqual(hash(frozenset(positions)), hash(span))
+                self.assertEqual(span, Span(reversed(positions)))
+                self.assertIn(span, {frozenset(positions)})
+
+        self.assertNotEqual(Span([0, 1]), Span([0, 2]))
+        self.assertNotEqual(Span([0, 1]), {0, 1, 2})
+        self.assertLess(Span([1, 2]), {0, 1, 2})
@@ -0,0 +1,101 @@
+from io import BytesIO, StringIO
+import os
+import tempfile
+import unittest
+
+from useg import SegLex
+
+sample_file = """counter	counter	ADJ	counter	{"annot_name": "annot1", "morpho_tags": ["sg", "nom"], "segmentation": [{"span": [0, 1, 2, 3, 4, 5, 6], "type": "root"}]}
+counterexample	counterexample	NOUN		{}
+counterexamples	counterexample	NOUN	counter + example + s	{"annot_name": "annot1", "segmentation": [{"morpheme": "contra", "span": [0, 1, 2, 3, 4, 5, 6], "type": "prefix"}, {"morpheme": "example", "span": [7, 8, 9, 10, 11, 12, 13], "type": "root"}, {"morpheme": "PL", "span": [14], "type": "suffix"}]}
+counterexamples	counterexample	NOUN	counterexample + s	{"annot_name": "annot2", "segmentation": [{"span": [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13], "type": "root"}, {"span": [14], "type": "suffix"}]}
+example	example	NOUN	ex + ample	{"annot_name": "annot1", "freq": 1, "segmentation": [{"span": [0, 1]}, {"span": [2, 3, 4, 5, 6]}]}
+example	example	NOUN	ex + ample	{"annot_name": "annot1", "freq": true, "segmentation": [{"span": [0, 1]}, {"span": [2, 3, 4, 5, 6]}]}
+example	example	VERB	e + x + ampl + e	{"annot_name": "annot1", "segmentation": [{"span": [0, 6], "type": "circumfix"}, {"span": [1]}, {"span": [2, 3, 4, 5]}]}
+žluťoučký	žluťoučký	ADJ	žluť + oučk + ý	{"annot_name": "annot1", "segmentation": [{"span": [0, 1, 2, 3]}, {"span": [4, 5, 6, 7]}, {"span": [8]}]}
+"""
+
+class TestBinary(unittest.TestCase):
+    def round_trip(self, storage):
+        lexicon = SegLex(storage=storage)
+        lexicon.load(StringIO(sample_file))
+        binary = BytesIO()
+        lexicon.save_binary(binary)
+
+        binary.seek(0)
+        lexicon = SegLex(storage=storage)
+        lexicon.load_binary(binary)
+        return lexicon
+
+    def test_round_trip(self):
+        for storage in ("objects", "columnar"):
+            with self.subTest(storage=storage):
+                lexicon = self.round_trip(storage)
+                str_io = StringIO()
+                lexicon.save(str_io)
+                self.assertEqual(sample_file, str_io.getvalue())
+
+    def test_same_lexemes(self):
+        original = SegLex()
+        original.load(StringIO(sample_file))
+        lexicon = self.round_trip("objects")
+
+        self.assertEqual(list(original.iter_lexemes()), list(lexicon.iter_lexemes()))
+        self.assertEqual(list(original.iter_lexemes(lemma="example", pos="NOUN")),
+                         list(lexicon.iter_lexemes(lemma="example", pos="NOUN")))
+        for lex_id in original.iter_lexemes():
+            with self.subTest(lex_id=lex_id):
+                self.assertEqual(original.form(lex_id), lexicon.form(lex_id))
+                self.assertEqual(repr(original.features(lex_id)), repr(lexicon.features(lex_id)))
+                for annot_name in original.annot_names(lex_id):
+                    self.assertEqual(original.morphemes(lex_id, annot_name), lexicon.morphemes(lex_id, annot_name))
+
+        # The circumfix keeps its gap.
+        lex_id = next(lexicon.iter_lexemes(pos="VERB"))
+        self.assertEqual(lexicon.morphemes(lex_id, "annot1")[0].span, {0, 6})
+
+    def test_features_not_shared(self):
+        lexicon = self.round_trip("objects")
+        first = next(lexicon.iter_lexemes(form="counterexample"))
+        second = next(lexicon.iter_lexemes(pos="VERB"))
+        self.assertEqual(lexicon.features(first), lexicon.features(second))
+        self.assertIsNot(lexicon.features(first), lexicon.features(second))
+
+        lex_id = next(lexicon.iter_lexemes(form="counterexamples"))
+        morphemes = lexicon.morphemes(lex_id, "annot1") + lexicon.morphemes(lex_id, "annot2")
+        for i, morpheme in enumerate(morphemes):
+            for other in morphemes[i + 1:]:
+                self.assertIsNot(morpheme.features, other.features)
+
+        # Nested features are not shared either.
+        adjective = next(lexicon.iter_lexemes(form="counter"))
+        morpheme = lexicon.morphemes(adjective, "annot1")[0]
+        lexicon.features(adjective)["morpho_tags"].append("extra")
+        self.assertEqual(morpheme.features, {"type": "root"})
+
+    def test_file(self):
+        lexicon = SegLex()
+        lexicon.load(StringIO(sample_file))
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, "example.usegb")
+            lexicon.save_binary(filename)
+            with open(filename, "rb") as f:
+                self.assertEqual(f.read(8), b"USEGBIN\0")
+
+            lexicon = SegLex()
+            lexicon.load_binary(filename)
+
+        self.assertEqual(len(list(lexicon.iter_lexemes())), 7)
+
+    def test_invalid(self):
+        lexicon = SegLex()
+        with self.assertRaises(ValueError):
+            lexicon.load_binary(BytesIO(b"not a binary lexicon"))
+
+        lexicon.add_lexeme("form", "lemma", 1)
+        with self.assertRaises(ValueError):
+            lexicon.save_binary(BytesIO())
+
+if __name__ == '__main__':
+    unittest.main()
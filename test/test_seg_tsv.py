@@ -0,0 +1,227 @@
+from io import StringIO
+import os
+import tempfile
+import unittest
+
+from useg import seg_tsv
+
+sample_file = """example	example	NOUN		{}
+example	example	NOUN	ex + ample	{"annot_name": "annot1", "segmentation": [{"span": [0, 1]}, {"span": [2, 3, 4, 5, 6]}]}
+examples	example	NOUN	example + s	{"annot_name": "annot1", "segmentation": [{"morpheme": "example", "span": [0, 1, 2, 3, 4, 5, 6], "type": "root"}, {"morpheme": "PL", "span": [7], "type": "suffix"}]}
+"""
+
+class TestIterRecords(unittest.TestCase):
+    def test_iter_file_object(self):
+        records = list(seg_tsv.iter_records(StringIO(sample_file)))
+
+        self.assertEqual(3, len(records))
+        self.assertEqual(["example", "example", "examples"], [r.form for r in records])
+        self.assertEqual({}, records[0].annot)
+        self.assertEqual(["ex", "ample"], records[1].simple_seg)
+        self.assertEqual("annot1", records[2].annot["annot_name"])
+        self.assertEqual([7], records[2].annot["segmentation"][1]["span"])
+
+    def test_iter_file_name(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, "example.useg")
+            with open(filename, "wt", encoding="utf-8") as f:
+                f.write(sample_file)
+
+            records = list(seg_tsv.iter_records(filename))
+
+        self.assertEqual(3, len(records))
+        self.assertEqual(sample_file, "".join(seg_tsv.format_record(r, False) for r in records))
+
+    def test_iter_is_lazy(self):
+        str_io = StringIO(sample_file)
+        records = seg_tsv.iter_records(str_io)
+
+        self.assertEqual("example", next(records).form)
+        # Only the first line has been consumed so far.
+        self.assertEqual(sample_file.split("\n", 1)[1], str_io.read())
+
+    def test_iter_invalid(self):
+        with self.assertRaises(ValueError):
+            list(seg_tsv.iter_records(StringIO("example\texample\tNOUN\n")))
+
+class TestCompression(unittest.TestCase):
+    # Magic bytes at the beginning of each compressed format.
+    magic = {
+        ".gz": b"\x1f\x8b",
+        ".xz": b"\xfd7zXZ",
+        ".bz2": b"BZh",
+        ".zst": b"\x28\xb5\x2f\xfd",
+    }
+
+    def test_compression_of(self):
+        self.assertEqual("gzip", seg_tsv.compression_of("example.useg.gz"))
+        self.assertEqual("xz", seg_tsv.compression_of("/tmp/example.useg.XZ"))
+        self.assertEqual("zstd", seg_tsv.compression_of("example.zst"))
+        self.assertIsNone(seg_tsv.compression_of("example.useg"))
+        self.assertIsNone(seg_tsv.compression_of("example.gz.useg"))
+
+    def test_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for extension, magic in self.magic.items():
+                if extension == ".zst" and seg_tsv.zstandard is None:
+                    continue
+
+                with self.subTest(extension=extension):
+                    filename = os.path.join(tmpdir, "example.useg" + extension)
+                    with seg_tsv.open_file(filename, "wt") as f:
+                        f.write(sample_file)
+
+                    with open(filename, "rb") as f:
+                        self.assertEqual(magic, f.read(len(magic)))
+
+                    with seg_tsv.open_file(filename, "rt") as f:
+                        self.assertEqual(sample_file, f.read())
+
+                    records = list(seg_tsv.iter_records(filename))
+                    self.assertEqual(sample_file, "".join(seg_tsv.format_record(r, False) for r in records))
+
+    def test_large_file(self):
+        # Spans multiple chunks of the background reader.
+        content = sample_file * 20000
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, "example.useg.gz")
+            with seg_tsv.open_file(filename, "wt") as f:
+                f.write(content)
+
+            with seg_tsv.open_file(filename, "rt") as f:
+                self.assertEqual(content, f.read())
+
+            # Stop reading in the middle of the file.
+            with seg_tsv.open_file(filename, "rt") as f:
+                self.assertEqual(sample_file.split("\n")[0] + "\n", f.readline())
+
+    def test_corrupt_file(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, "example.useg.gz")
+            with open(filename, "wb") as f:
+                f.write(b"\x1f\x8b not really gzip")
+
+            with self.assertRaises(OSError):
+                list(seg_tsv.iter_records(filename))
+
+class TestLazyRecords(unittest.TestCase):
+    def test_lazy_fields(self):
+        records = list(seg_tsv.iter_records(StringIO(sample_file), lazy=True))
+        eager_records = list(seg_tsv.iter_records(StringIO(sample_file)))
+
+        self.assertEqual(3, len(records))
+        for record, eager_record in zip(records, eager_records):
+            self.assertIsInstance(record, seg_tsv.LazySegRecord)
+            self.assertEqual(eager_record, record.to_record())
+            self.assertEqual(eager_record.form, record.form)
+            self.assertEqual(eager_record.lemma, record.lemma)
+            self.assertEqual(eager_record.pos, record.pos)
+            self.assertEqual(eager_record.simple_seg, record.simple_seg)
+            self.assertEqual(eager_record.annot, record.annot)
+
+    def test_lazy_decoding(self):
+        # Invalid JSON is only detected once the annotation is accessed.
+        record = seg_tsv.parse_line_lazy("example\texample\tNOUN\t\t{invalid\n")
+        self.assertEqual("example", record.form)
+        self.assertEqual("NOUN", record.pos)
+
+        with self.assertRaises(ValueError):
+            record.annot
+
+    def test_lazy_caching(self):
+        record = seg_tsv.parse_line_lazy(sample_file.split("\n")[1])
+
+        self.assertIs(record.annot, record.annot)
+        self.assertIs(record.simple_seg, record.simple_seg)
+
+        # Changes to the decoded annotation are kept.
+        record.annot["annot_name"] = "annot2"
+        self.assertEqual("annot2", record.annot["annot_name"])
+
+    def test_lazy_format(self):
+        records = seg_tsv.iter_records(StringIO(sample_file), lazy=True)
+        self.assertEqual(sample_file, "".join(seg_tsv.format_record(r, False) for r in records))
+
+class TestInterning(unittest.TestCase):
+    def test_interned_equal(self):
+        interner = seg_tsv.Interner()
+        for line in sample_file.splitlines():
+            self.assertEqual(seg_tsv.parse_line(line), seg_tsv.parse_line(line, interner))
+
+    def test_interned_shared(self):
+        interner = seg_tsv.Interner()
+        lines = sample_file.splitlines()
+        record_1 = seg_tsv.parse_line(lines[1], interner)
+        record_2 = seg_tsv.parse_line(lines[2], interner)
+
+        self.assertIs(record_1.lemma, record_2.lemma)
+        self.assertIs(record_1.pos, record_2.pos)
+        self.assertIs(record_1.annot["annot_name"], record_2.annot["annot_name"])
+
+        keys_1 = sorted(record_1.annot["segmentation"][0].keys())
+        keys_2 = sorted(record_2.annot["segmentation"][0].keys())
+        self.assertIs(keys_1[0], keys_2[1])
+
+        self.assertIs(interner.intern("".join(["ann", "ot1"])), record_1.annot["annot_name"])
+
+class TestJsonBackends(unittest.TestCase):
+    edge_cases = [
+        '{"nan": NaN, "inf": -Infinity}',
+        '{"big": 123456789012345678901234567890}',
+        '{"surrogate": "\\ud800", "escapes": "\\u0000\\t\\"\\\\/"}',
+        '{"float": [1e16, 1e-05, 0.1, -0.0], "nested": {"b": [], "a": {}}}',
+        '{"annot_name": "Ёжгурт", "segmentation": [{"span": [0, 1], "type": "root"}]}',
+    ]
+
+    def tearDown(self):
+        seg_tsv.set_json_backend("auto")
+
+    def available_backends(self):
+        backends = []
+        for backend in ("stdlib", "orjson", "ujson"):
+            try:
+                seg_tsv.set_json_backend(backend)
+            except ImportError:
+                continue
+            backends.append(backend)
+        return backends
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            seg_tsv.set_json_backend("nonexistent")
+
+    def test_auto_prefers_strict(self):
+        seg_tsv.set_json_backend("auto")
+        if seg_tsv._json_loaders["orjson"] is not None:
+            self.assertEqual("orjson", seg_tsv.json_backend())
+
+    def test_force_stdlib(self):
+        seg_tsv.set_json_backend("stdlib")
+        self.assertEqual("stdlib", seg_tsv.json_backend())
+
+    def test_backends_equivalent(self):
+        seg_tsv.set_json_backend("stdlib")
+        expected = [seg_tsv.parse_line(line) for line in sample_file.splitlines()]
+        expected_edge = [repr(seg_tsv.parse_line("a\ta\tX\t\t{}".format(case))) for case in self.edge_cases]
+
+        for backend in self.available_backends():
+            with self.subTest(backend=backend):
+                seg_tsv.set_json_backend(backend)
+                self.assertEqual(expected, [seg_tsv.parse_line(line) for line in sample_file.splitlines()])
+                # Compare the reprs, because NaN != NaN.
+                self.assertEqual(expected_edge, [repr(seg_tsv.parse_line("a\ta\tX\t\t{}".format(case))) for case in self.edge_cases])
+
+                with self.assertRaises(ValueError):
+                    seg_tsv.parse_line("a\ta\tX\t\t{invalid")
+                # Raw control characters are not allowed in strings.
+                with self.assertRaises(ValueError):
+                    seg_tsv.parse_line("a\ta\tX\t\t{\"a\": \"\x01\"}")
+                with self.assertRaises(ValueError):
+                    seg_tsv.parse_line("a\ta\tX\t\t{\"a\": \"b\tc\"}")
+
+    def test_format_round_trip(self):
+        for backend in self.available_backends():
+            with self.subTest(backend=backend):
+                seg_tsv.set_json_backend(backend)
+                records = seg_tsv.iter_records(StringIO(sample_file))
+                self.assertEqual(sample_file, "".join(seg_tsv.format_record(r, False) for r in records))
@@ -0,0 +1,133 @@
+from io import StringIO
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from useg import SegLex
+from useg.seg_sqlite import SqliteSegLex
+
+sample_file = """counter	counter	ADJ	counter	{"annot_name": "annot1", "segmentation": [{"span": [0, 1, 2, 3, 4, 5, 6], "type": "root"}]}
+counterexample	counterexample	NOUN		{}
+counterexamples	counterexample	NOUN	counter + example + s	{"annot_name": "annot1", "segmentation": [{"morpheme": "contra", "span": [0, 1, 2, 3, 4, 5, 6], "type": "prefix"}, {"morpheme": "example", "span": [7, 8, 9, 10, 11, 12, 13], "type": "root"}, {"morpheme": "PL", "span": [14], "type": "suffix"}]}
+counterexamples	counterexample	NOUN	counterexample + s	{"annot_name": "annot2", "segmentation": [{"span": [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13], "type": "root"}, {"span": [14], "type": "suffix"}]}
+example	example	NOUN	ex + ample	{"annot_name": "annot1", "freq": 1, "segmentation": [{"span": [0, 1]}, {"span": [2, 3, 4, 5, 6]}]}
+example	example	NOUN	ex + ample	{"annot_name": "annot1", "freq": true, "segmentation": [{"span": [0, 1]}, {"span": [2, 3, 4, 5, 6]}]}
+example	example	VERB	e + x + ampl + e	{"annot_name": "annot1", "segmentation": [{"span": [0, 6], "type": "circumfix"}, {"span": [1]}, {"span": [2, 3, 4, 5]}]}
+"""
+
+class TestSqlite(unittest.TestCase):
+    def load_both(self):
+        objects = SegLex()
+        objects.load(StringIO(sample_file))
+        sqlite = SqliteSegLex(":memory:", batch_size=3)
+        sqlite.load(StringIO(sample_file))
+        return objects, sqlite
+
+    def test_round_trip(self):
+        objects, sqlite = self.load_both()
+        str_io = StringIO()
+        sqlite.save(str_io)
+        self.assertEqual(sample_file, str_io.getvalue())
+
+    def test_same_as_objects(self):
+        objects, sqlite = self.load_both()
+
+        self.assertEqual(list(objects.iter_lexemes()), list(sqlite.iter_lexemes()))
+        for form in (None, "example", "counterexamples", "nonexistent"):
+            for lemma in (None, "example", "counterexample", "counter", "nonexistent"):
+                for pos in (None, "NOUN", "VERB", "ADJ", "nonexistent"):
+                    with self.subTest(form=form, lemma=lemma, pos=pos):
+                        self.assertEqual(list(objects.iter_lexemes(form=form, lemma=lemma, pos=pos)),
+                                         list(sqlite.iter_lexemes(form=form, lemma=lemma, pos=pos)))
+
+        for lex_id in objects.iter_lexemes():
+            with self.subTest(lex_id=lex_id):
+                self.assertEqual(objects.form(lex_id), sqlite.form(lex_id))
+                self.assertEqual(objects.lemma(lex_id), sqlite.lemma(lex_id))
+                self.assertEqual(objects.pos(lex_id), sqlite.pos(lex_id))
+                self.assertEqual(repr(objects.features(lex_id)), repr(sqlite.features(lex_id)))
+                self.assertEqual(objects.annot_names(lex_id), sqlite.annot_names(lex_id))
+
+                for annot_name in ("annot1", "annot2", "nonexistent"):
+                    self.assertEqual(objects.morphemes(lex_id, annot_name), sqlite.morphemes(lex_id, annot_name))
+                    self.assertEqual(objects.morphemes(lex_id, annot_name, sort=True),
+                                     sqlite.morphemes(lex_id, annot_name, sort=True))
+                    for position in range(len(objects.form(lex_id))):
+                        self.assertEqual(objects.morph(lex_id, annot_name, position),
+                                         sqlite.morph(lex_id, annot_name, position))
+
+    def test_morpheme_features(self):
+        objects, sqlite = self.load_both()
+        self.assertEqual([0, 2], list(sqlite.iter_lexemes_with_morpheme("type", "root")))
+        self.assertEqual([5], list(sqlite.iter_lexemes_with_morpheme("type", "circumfix")))
+        self.assertEqual([2], list(sqlite.iter_lexemes_with_morpheme("type", "root", annot_name="annot2")))
+        self.assertEqual([], list(sqlite.iter_lexemes_with_morpheme("type", "root", annot_name="nonexistent")))
+
+    def test_delete(self):
+        objects, sqlite = self.load_both()
+        for lexicon in (objects, sqlite):
+            lexicon.delete_lexemes([0, 3])
+        with self.assertRaises(IndexError):
+            sqlite.form(0)
+        with self.assertRaises(IndexError):
+            sqlite.delete_lexeme(3)
+        self.assertEqual([], list(sqlite.iter_lexemes(pos="ADJ")))
+        self.assertEqual([2], list(sqlite.iter_lexemes_with_morpheme("type", "root")))
+
+        self.assertEqual(objects.compact(), sqlite.compact())
+        self.assertEqual(list(objects.iter_lexemes()), list(sqlite.iter_lexemes()))
+        self.assertEqual(list(objects.iter_lexemes(lemma="example")), list(sqlite.iter_lexemes(lemma="example")))
+        self.assertEqual(objects.morphemes(1, "annot1"), sqlite.morphemes(1, "annot1"))
+
+        objects_io, sqlite_io = StringIO(), StringIO()
+        objects.save(objects_io)
+        sqlite.save(sqlite_io)
+        self.assertEqual(objects_io.getvalue(), sqlite_io.getvalue())
+
+    def test_compact_failure(self):
+        objects, sqlite = self.load_both()
+        sqlite.delete_lexeme(0)
+        expected = list(sqlite.iter_lexemes())
+
+        # A failure while renumbering rolls all of it back.
+        sqlite._db.execute("CREATE TRIGGER fail BEFORE UPDATE ON morphemes BEGIN SELECT RAISE(ABORT, 'fail'); END")
+        with self.assertRaises(sqlite3.IntegrityError):
+            sqlite.compact()
+        self.assertEqual(expected, list(sqlite.iter_lexemes()))
+        self.assertEqual("counterexamples", sqlite.form(2))
+
+        sqlite._db.execute("DROP TRIGGER fail")
+        objects.delete_lexeme(0)
+        self.assertEqual(objects.compact(), sqlite.compact())
+        self.assertEqual("counterexamples", sqlite.form(1))
+
+    def test_add_lexemes_bulk(self):
+        lexicon = SqliteSegLex(":memory:")
+        lexicon.add_lexemes_bulk([("examples", "example", "NOUN", None, [(0, 7, {"type": "root"}), ([7], None)])], "annot1")
+        self.assertEqual([0], list(lexicon.iter_lexemes_with_morpheme("type", "root")))
+        self.assertEqual("s", lexicon.morph(0, "annot1", 7))
+
+    def test_persistence(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, "example.sqlite")
+            with SqliteSegLex(filename) as lexicon:
+                lex_id = lexicon.add_lexeme("counterexamples", "counterexample", "NOUN", {"number": "pl"})
+                lexicon.add_morphemes_from_list(lex_id, "annot1", ["counter", "example", "s"])
+
+            with SqliteSegLex(filename) as lexicon:
+                self.assertEqual([lex_id], list(lexicon.iter_lexemes(lemma="counterexample")))
+                self.assertEqual({"number": "pl"}, lexicon.features(lex_id))
+                self.assertEqual("example", lexicon.morph(lex_id, "annot1", 8))
+                self.assertEqual(lex_id + 1, lexicon.add_lexeme("example", "example", "NOUN"))
+
+    def test_invalid(self):
+        lexicon = SqliteSegLex(":memory:")
+        lex_id = lexicon.add_lexeme("ex", "ex", "NOUN")
+        with self.assertRaises(ValueError):
+            lexicon.add_contiguous_morpheme(lex_id, "annot1", 0, 3)
+        with self.assertRaises(IndexError):
+            lexicon.form(lex_id + 1)
+
+if __name__ == '__main__':
+    unittest.main()
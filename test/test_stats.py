@@ -0,0 +1,95 @@
+from io import StringIO
+import os
+import tempfile
+import unittest
+
+from useg import SegLex, seg_tsv
+import stats
+
+sample_file = """counter	counter	ADJ	counter	{"annot_name": "annot1", "segmentation": [{"span": [0, 1, 2, 3, 4, 5, 6], "type": "root"}]}
+counterexample	counterexample	NOUN		{}
+counterexamples	counterexample	NOUN	counter + example + s	{"annot_name": "annot1", "segmentation": [{"morpheme": "contra", "span": [0, 1, 2, 3, 4, 5, 6], "type": "prefix"}, {"morpheme": "example", "span": [7, 8, 9, 10, 11, 12, 13], "type": "root"}, {"morpheme": "PL", "span": [14], "type": "suffix"}]}
+counterexamples	counterexample	NOUN	counterexample + s	{"annot_name": "annot2", "segmentation": [{"span": [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13], "type": "root"}, {"span": [14], "type": "suffix"}]}
+example	example	NOUN	ex + ample	{"annot_name": "annot1", "freq": 1, "segmentation": [{"span": [0, 1]}, {"span": [2, 3, 4, 5, 6]}]}
+example	example	NOUN	ex + ample	{"annot_name": "annot1", "freq": true, "segmentation": [{"span": [0, 1]}, {"span": [2, 3, 4, 5, 6]}]}
+example	example	NOUN	ex + ample	{"annot_name": "annot1", "freq": 1, "segmentation": [{"span": [0, 1]}, {"span": [2, 3, 4, 5, 6]}]}
+example	example	VERB	e + x + ampl + e	{"annot_name": "annot1", "segmentation": [{"span": [0, 6], "type": "circumfix"}, {"span": [1]}, {"span": [2, 3, 4, 5]}]}
+"""
+
+def records(lines):
+    return seg_tsv.iter_records(StringIO("".join(lines)))
+
+class TestStats(unittest.TestCase):
+    def test_lexemes(self):
+        lines = sample_file.splitlines(keepends=True)
+        lexicon = SegLex()
+        lexicon.load(StringIO(sample_file))
+
+        new_lexemes = [is_new for record, is_new in stats.iter_lexeme_records(records(lines), assume_sorted=True)]
+        self.assertEqual([True, True, True, False, True, True, True, True], new_lexemes)
+        self.assertEqual(len(list(lexicon.iter_lexemes())), sum(new_lexemes))
+
+        # Segmentations of the same lexeme need not be adjacent.
+        lines = lines[3:] + lines[:3]
+        with self.assertRaises(stats._Unsorted):
+            list(stats.iter_lexeme_records(records(lines), assume_sorted=True))
+        self.assertEqual(sum(new_lexemes), sum(is_new for record, is_new in stats.iter_lexeme_records(records(lines))))
+
+    def test_process_file(self):
+        lines = sample_file.splitlines(keepends=True)
+        expected = stats.process_records("sample", records(lines))
+        self.assertEqual("sample", expected[0])
+        self.assertEqual("0 kW", expected[1])
+        # 6 segmented lexemes with 7 segmentations into 15 morphs.
+        self.assertEqual(("17", "67", "33", "0"), expected[2:6])
+        self.assertEqual(15 / 7, expected[6])
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, "sample.useg")
+            with open(filename, "wt", encoding="utf-8") as f:
+                f.writelines(lines[::-1])
+            # The resource is named after the directory.
+            self.assertEqual((os.path.basename(tmpdir), ) + expected[1:], stats.process_file(filename))
+
+    def test_approx_types(self):
+        exact = stats.TypeTokenStats()
+        approx = stats.TypeTokenStats(approx_error=0.01)
+        for record in records(sample_file.splitlines(keepends=True)):
+            for string in (record.form, record.lemma, record.pos):
+                exact.record(string)
+                approx.record(string)
+        # Small counts are estimated exactly.
+        self.assertEqual(exact.type_count(), approx.type_count())
+        self.assertEqual(exact.token_count(), approx.token_count())
+
+        for error in (0.1, 0.01):
+            with self.subTest(error=error):
+                exact = stats.TypeTokenStats()
+                approx = stats.TypeTokenStats(approx_error=error)
+                for i in range(50000):
+                    string = "example{}".format(i % 30000)
+                    exact.record(string)
+                    approx.record(string)
+                self.assertEqual(30000, exact.type_count())
+                # Allow for three times the standard error.
+                self.assertLess(abs(approx.type_count() - 30000), 3 * error * 30000)
+
+        # Between 2.5 and 5 times the number of registers, where the raw
+        #  estimate is biased by about 2 %, the mean of several sketches
+        #  must be within two of its standard errors.
+        self.assertEqual(0, len(stats.HyperLogLog(0.01)))
+        estimates = []
+        for seed in range(4):
+            sketch = stats.HyperLogLog(0.01)
+            for i in range(45000):
+                sketch.add("example{}-{}".format(seed, i))
+            estimates.append(len(sketch))
+        self.assertLess(abs(sum(estimates) / len(estimates) - 45000), 2 * 0.01 / 2 * 45000)
+
+        with self.assertRaises(ValueError):
+            stats.HyperLogLog(0.0)
+        with self.assertRaises(ValueError):
+            stats.HyperLogLog(0.0001)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+
+"""
+Compare the time it takes to build a lexicon by adding lexemes and
+morphemes one by one, as the converters used to do, with adding them
+using `SegLex.add_lexemes_bulk`. The lexemes and their segmentation
+are taken from a USeg file. Run with the src/ directory in PYTHONPATH.
+"""
+
+import argparse
+import gc
+import time
+
+from useg import SegLex, seg_tsv
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        allow_abbrev=False,
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("seg_lex", help="The USeg file to take the lexemes from")
+    parser.add_argument("--repeat", type=int, default=5, help="How many times to repeat each measurement; the fastest run is reported.")
+    return parser.parse_args()
+
+def read_rows(filename):
+    """
+    Read the file into rows for `SegLex.add_lexemes_bulk`, all on the
+    same annotation layer. The features are shared between the runs,
+    which is fine, because the lexicon doesn't modify them.
+    """
+    rows = []
+    for record in seg_tsv.iter_records(filename):
+        features = {k: v for k, v in record.annot.items() if k not in {"annot_name", "segmentation"}}
+        morphemes = []
+        for morpheme in record.annot.get("segmentation", []):
+            span = morpheme["span"]
+            m_features = {k: v for k, v in morpheme.items() if k != "span"}
+            if span and span[-1] - span[0] == len(span) - 1:
+                morphemes.append((span[0], span[-1] + 1, m_features))
+            else:
+                morphemes.append((span, m_features))
+        rows.append((record.form, record.lemma, record.pos, features, morphemes))
+    return rows
+
+def add_one_by_one(lexicon, rows, annot_name):
+    for form, lemma, pos, features, morphemes in rows:
+        lex_id = lexicon.add_lexeme(form, lemma, pos, features)
+        for morpheme in morphemes:
+            if len(morpheme) == 3:
+                lexicon.add_contiguous_morpheme(lex_id, annot_name, *morpheme)
+            else:
+                lexicon.add_morpheme(lex_id, annot_name, *morpheme)
+
+def add_bulk(lexicon, rows, annot_name):
+    lexicon.add_lexemes_bulk(rows, annot_name)
+
+def measure(fn, rows, storage, repeat):
+    """
+    Return the shortest time in seconds it took `fn` to add `rows` to
+    an empty lexicon with the given `storage`.
+    """
+    best = None
+    for i in range(repeat):
+        lexicon = SegLex(storage=storage)
+        gc.collect()
+        start = time.perf_counter()
+        fn(lexicon, rows, "annot")
+        duration = time.perf_counter() - start
+        del lexicon
+        if best is None or duration < best:
+            best = duration
+    return best
+
+def main(args):
+    rows = read_rows(args.seg_lex)
+    print("{} lexemes, {} morphemes".format(len(rows), sum(len(row[4]) for row in rows)))
+
+    for storage in ("objects", "columnar"):
+        one_by_one = measure(add_one_by_one, rows, storage, args.repeat)
+        bulk = measure(add_bulk, rows, storage, args.repeat)
+        print("{:10}one by one {:6.2f} s, bulk {:6.2f} s ({:.1f}× faster)".format(
+            storage + ":", one_by_one, bulk, one_by_one / bulk
+        ))
+
+if __name__ == "__main__":
+    main(parse_args())
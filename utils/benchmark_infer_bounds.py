@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+
+"""
+Compare the speed of `infer_bounds`, run once per pair, with the
+batched `infer_bounds_batch` and check that both give the same results.
+The (morphs, form) pairs are taken from the segmentation in a USeg
+file, using the underlying morphemes where they are annotated, so the
+words have realistic lengths. Run with the src/ directory in PYTHONPATH.
+"""
+
+import argparse
+import time
+
+from useg import seg_tsv
+from useg.infer_bounds import infer_bounds, infer_bounds_batch
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        allow_abbrev=False,
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("seg_lex", help="The USeg file to take the segmentations from")
+    parser.add_argument("--limit", type=int, default=20000, help="The maximum number of pairs to align.")
+    parser.add_argument("--batch-size", type=int, default=256, help="The batch size to use for the batched alignment.")
+    return parser.parse_args()
+
+def read_pairs(filename, limit):
+    pairs = []
+    for record in seg_tsv.iter_records(filename):
+        if len(pairs) >= limit:
+            break
+
+        morphs = []
+        for morph, morpheme in zip(record.simple_seg, record.annot.get("segmentation", [])):
+            morphs.append(morpheme.get("morpheme") or morph)
+        if morphs and all(morphs):
+            pairs.append((morphs, record.form))
+    return pairs
+
+def main(args):
+    pairs = read_pairs(args.seg_lex, args.limit)
+    print("{} pairs, {:.1f} characters per form on average".format(len(pairs), sum(len(form) for morphs, form in pairs) / len(pairs)))
+
+    start = time.perf_counter()
+    expected = [infer_bounds(morphs, form) for morphs, form in pairs]
+    single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = infer_bounds_batch(pairs, batch_size=args.batch_size)
+    batched = time.perf_counter() - start
+
+    print("infer_bounds:       {:8.2f} s".format(single))
+    print("infer_bounds_batch: {:8.2f} s ({:.1f}× faster)".format(batched, single / batched))
+
+    differing = sum(result != expected_result for result, expected_result in zip(results, expected))
+    if differing:
+        print("{} results differ!".format(differing))
+
+if __name__ == "__main__":
+    main(parse_args())
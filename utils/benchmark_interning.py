@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+"""
+Measure how much memory string interning saves when reading a USeg
+file, and how it changes the time taken, both for plain parsed records
+and for loaded lexicons.
+Run with the src/ directory in PYTHONPATH.
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+
+from useg import SegLex, seg_tsv
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        allow_abbrev=False,
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("seg_lex", help="The USeg file to read")
+    parser.add_argument("--repeat", type=int, default=5, help="The number of timed runs; the fastest one is reported")
+    return parser.parse_args()
+
+def measure(fn, repeat):
+    """
+    Run `fn` and return the memory taken by its result (in MiB) and the
+    shortest time it took in `repeat` runs (in seconds). The time is
+    measured in separate runs, because tracing memory allocations slows
+    everything down.
+    """
+    duration = float("inf")
+    for i in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        result = fn()
+        duration = min(duration, time.perf_counter() - start)
+        del result
+
+    gc.collect()
+    tracemalloc.start()
+    result = fn()
+    memory = tracemalloc.get_traced_memory()[0] / 2**20
+    tracemalloc.stop()
+    del result
+
+    return memory, duration
+
+def read_records(filename, interner):
+    with open(filename, "rt", encoding="utf-8") as f:
+        return [seg_tsv.parse_line(line, interner) for line in f]
+
+def load_lexicon(filename, storage, interner):
+    lexicon = SegLex(storage=storage)
+    if interner:
+        lexicon.load(filename)
+    else:
+        # The same as SegLex.load, but without interning, for comparison.
+        with seg_tsv.open_file(filename, "rt") as f:
+            lexicon._add_records(seg_tsv.parse_line(line) for line in f)
+    return lexicon
+
+def print_result(name, memory, duration):
+    print("{:34}{:8.1f} MiB{:8.2f} s".format(name + ":", memory, duration))
+
+def print_comparison(plain_memory, plain_time, interned_memory, interned_time):
+    if plain_memory > 0 and plain_time > 0:
+        print("Interning saves {:.0%} of memory and changes the time by {:+.0%}.".format(
+            1.0 - interned_memory / plain_memory,
+            interned_time / plain_time - 1.0
+        ))
+
+def main(args):
+    plain_memory, plain_time = measure(lambda: read_records(args.seg_lex, None), args.repeat)
+    interned_memory, interned_time = measure(lambda: read_records(args.seg_lex, seg_tsv.Interner()), args.repeat)
+
+    print_result("Records", plain_memory, plain_time)
+    print_result("Interned records", interned_memory, interned_time)
+    print_comparison(plain_memory, plain_time, interned_memory, interned_time)
+
+    # SegLex.load always interns.
+    for storage in ("objects", "columnar"):
+        plain_memory, plain_time = measure(lambda: load_lexicon(args.seg_lex, storage, False), args.repeat)
+        interned_memory, interned_time = measure(lambda: load_lexicon(args.seg_lex, storage, True), args.repeat)
+
+        print_result("SegLex ({}, not interned)".format(storage), plain_memory, plain_time)
+        print_result("SegLex ({})".format(storage), interned_memory, interned_time)
+        print_comparison(plain_memory, plain_time, interned_memory, interned_time)
+
+if __name__ == "__main__":
+    main(parse_args())
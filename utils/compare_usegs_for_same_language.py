@@ -2,6 +2,8 @@
 
 import sys
 
+from useg import seg_tsv
+
 segmentations = [{}]  # unused zeroth item, to avoid zero label
 allforms = {}
 
@@ -13,10 +15,11 @@ for index in range(1,number_of_input_files):
     print(f"#Input file {index}: {filename}")
     segmentations.append({})
     
-    for line in open(filename):
-        (form, lemma, pos, segm, rest) = line.split("\t")
-        allforms[form] = 1
-        segmentations[index][form] = segm
+    with seg_tsv.open_file(filename) as f:
+        for line in f:
+            (form, lemma, pos, segm, rest) = line.split("\t")
+            allforms[form] = 1
+            segmentations[index][form] = segm
 
 
 for form in sorted(allforms):